@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+"""Measure how long importing cwl-tes takes, per module.
+
+Runs ``python -X importtime -c "import MODULE"`` in fresh interpreters
+(Python 3.7 or later) and reports, for each imported module, the median
+over the runs of its cumulative import time in milliseconds, slowest
+first.  The heavy optional subsystems are listed separately so that an
+eager import of one of them shows up at a glance.
+
+    python benchmarks/importtime.py [-n RUNS] [--top N] [--json FILE] [MODULE]
+
+``--json`` writes the per-module timings, so runs can be compared over
+time.
+"""
+from __future__ import absolute_import, print_function
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that a plain run should not need to import.
+OPTIONAL = ["cwltool.provenance", "prov", "cwltool.cwlrdf", "cwltool.pack",
+            "cwltool.subgraph", "galaxy", "cwltool.docker",
+            "cwltool.singularity", "psutil", "distutils", "jwt"]
+
+
+def import_times(module):  # type: (str) -> dict
+    """Cumulative import time in microseconds of every module imported."""
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        [ROOT] + [p for p in [env.get("PYTHONPATH")] if p])
+    stderr = subprocess.Popen(
+        [sys.executable, "-X", "importtime", "-c", "import " + module],
+        stderr=subprocess.PIPE, env=env).communicate()[1].decode("utf-8")
+    times = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if cumulative.strip().isdigit():
+            times[name.strip()] = int(cumulative)
+    if module not in times:
+        raise SystemExit("could not import %s:\n%s" % (module, stderr))
+    return times
+
+
+def main():  # type: () -> int
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("module", nargs="?", default="cwl_tes.main")
+    parser.add_argument("-n", "--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=25)
+    parser.add_argument("--json", metavar="FILE",
+                        help="write the median times per module to FILE")
+    args = parser.parse_args()
+
+    runs = [import_times(args.module) for _ in range(args.runs)]
+    medians = {}
+    for name in runs[0]:
+        samples = sorted(run[name] for run in runs if name in run)
+        medians[name] = samples[len(samples) // 2] / 1000.0
+
+    print("%-45s %10s" % ("module", "ms"))
+    for name in sorted(medians, key=medians.get, reverse=True)[:args.top]:
+        print("%-45s %10.1f" % (name, medians[name]))
+    print()
+    print("optional subsystems imported by %s:" % args.module)
+    for name in OPTIONAL:
+        print("  %-43s %10s" % (
+            name, "%.1f" % medians[name] if name in medians else "-"))
+
+    if args.json:
+        with open(args.json, "w") as handle:
+            json.dump({"module": args.module, "runs": args.runs,
+                       "python": sys.version.split()[0],
+                       "milliseconds": medians}, handle, indent=4,
+                      sort_keys=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+"""Measure how fast jobs are built for the elements of a scatter.
+
+Loads a workflow that scatters a CommandLineTool (with baseCommand,
+arguments, File inputs with secondaryFiles, an array and a union input
+and a ResourceRequirement) over a File array, then draws the jobs from the
+workflow without running them.  Prints the jobs built per second, the
+median of the runs, and the copy.deepcopy calls made per job.
+
+    python benchmarks/job_construction.py [-n ELEMENTS] [-r RUNS] [--json FILE]
+"""
+from __future__ import absolute_import, print_function
+
+import argparse
+import copy
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cwltool import workflow  # noqa: E402  # pylint: disable=unused-import
+from cwltool.context import LoadingContext, RuntimeContext  # noqa: E402
+from cwltool.job import JobBase  # noqa: E402
+from cwltool.load_tool import load_tool  # noqa: E402
+from cwltool.loghandler import _logger  # noqa: E402
+
+TOOL = """cwlVersion: v1.0
+class: CommandLineTool
+requirements:
+  ResourceRequirement: {coresMin: 2, ramMin: 2048}
+baseCommand: [aligner, run]
+arguments:
+  - --fast
+  - {prefix: --threads, valueFrom: "2", position: 3}
+inputs:
+  ref: {type: File, inputBinding: {position: 1}}
+  reads: {type: File, secondaryFiles: [.bai], inputBinding: {position: 2}}
+  sample: {type: string, inputBinding: {prefix: --sample}}
+  opts: {type: "string[]", inputBinding: {prefix: -o, itemSeparator: ","}}
+  level: {type: ["null", int, string], inputBinding: {prefix: -l}}
+outputs:
+  out: {type: stdout}
+stdout: out.txt
+"""
+
+WORKFLOW = """cwlVersion: v1.0
+class: Workflow
+requirements:
+  ScatterFeatureRequirement: {}
+inputs:
+  ref: File
+  reads: File[]
+  opts: string[]
+outputs:
+  out: {type: "File[]", outputSource: align/out}
+steps:
+  align:
+    run: tool.cwl
+    scatter: reads
+    in:
+      ref: ref
+      reads: reads
+      opts: opts
+      sample: {default: sample}
+      level: {default: 3}
+    out: [out]
+"""
+
+
+def build_jobs(tool, job_order, runtimeContext):
+    # type: (workflow.Workflow, dict, RuntimeContext) -> int
+    count = 0
+    for job in tool.job(job_order, lambda out, status: None, runtimeContext):
+        if job is None:
+            break
+        if isinstance(job, JobBase):
+            count += 1
+    return count
+
+
+def main():  # type: () -> int
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-n", "--elements", type=int, default=2000,
+                        help="number of scatter elements")
+    parser.add_argument("-r", "--runs", type=int, default=3)
+    parser.add_argument("--json", metavar="FILE",
+                        help="write the results to FILE")
+    args = parser.parse_args()
+    _logger.setLevel(logging.WARNING)
+
+    directory = tempfile.mkdtemp()
+    try:
+        with open(os.path.join(directory, "tool.cwl"), "w") as handle:
+            handle.write(TOOL)
+        with open(os.path.join(directory, "workflow.cwl"), "w") as handle:
+            handle.write(WORKFLOW)
+        reads = []
+        for i in range(min(args.elements, 100)):
+            for name in ("reads_%d.bam" % i, "reads_%d.bam.bai" % i):
+                with open(os.path.join(directory, name), "w") as handle:
+                    handle.write(name)
+        for i in range(args.elements):
+            location = "file://" + os.path.join(directory, "reads_%d.bam" % (i % 100))
+            reads.append({"class": "File", "location": location,
+                          "secondaryFiles": [{"class": "File",
+                                              "location": location + ".bai"}]})
+        with open(os.path.join(directory, "ref.fa"), "w") as handle:
+            handle.write("ref")
+        job_order = {
+            "ref": {"class": "File",
+                    "location": "file://" + os.path.join(directory, "ref.fa")},
+            "reads": reads,
+            "opts": ["a", "b", "c"]}
+
+        tool = load_tool(os.path.join(directory, "workflow.cwl"),
+                         LoadingContext({"disable_js_validation": True}))
+        runtimeContext = RuntimeContext({
+            "use_container": False, "outdir": directory,
+            "tmpdir": directory, "stagedir": directory})
+
+        rates = []
+        for _ in range(args.runs):
+            job_copy = copy.deepcopy(job_order)
+            start = time.time()
+            built = build_jobs(tool, job_copy, runtimeContext)
+            elapsed = time.time() - start
+            if built != args.elements:
+                raise SystemExit("built %d jobs for %d elements"
+                                 % (built, args.elements))
+            rates.append(built / elapsed)
+
+        # one more run, counting the copies (which slows it down)
+        deepcopy = copy.deepcopy
+        calls = [0]
+
+        def counting_deepcopy(x, memo=None, _nil=[]):  # noqa: B006
+            if memo is None:
+                calls[0] += 1
+            return deepcopy(x, memo, _nil)
+
+        job_copy = copy.deepcopy(job_order)
+        copy.deepcopy = counting_deepcopy
+        try:
+            build_jobs(tool, job_copy, runtimeContext)
+        finally:
+            copy.deepcopy = deepcopy
+    finally:
+        shutil.rmtree(directory)
+
+    rate = sorted(rates)[len(rates) // 2]
+    per_job = float(calls[0]) / args.elements
+    print("%d elements: %.0f jobs/s, %.1f deepcopy calls per job"
+          % (args.elements, rate, per_job))
+    if args.json:
+        with open(args.json, "w") as handle:
+            json.dump({"elements": args.elements, "runs": args.runs,
+                       "python": sys.version.split()[0],
+                       "jobs_per_second": rate,
+                       "deepcopy_calls_per_job": per_job},
+                      handle, indent=4, sort_keys=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
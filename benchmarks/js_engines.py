@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+"""Compare the per-expression latency of the Javascript engines.
+
+Evaluates a few typical CWL expressions with each available engine (the
+Node.js process and, when installed, the in-process quickjs and
+py_mini_racer engines) and prints the mean, median and 99th percentile
+latency in microseconds.
+
+    python benchmarks/js_engines.py [-n ITERATIONS]
+"""
+from __future__ import absolute_import, print_function
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cwltool import sandboxjs  # noqa: E402
+from cwltool.expression import do_eval  # noqa: E402
+
+REQUIREMENTS = [{
+    "class": "InlineJavascriptRequirement",
+    "expressionLib": ["function stem(f) { return f.nameroot; }"]}]
+
+INPUTS = {
+    "reads": [{"class": "File", "basename": "sample_%d.fastq" % i,
+               "nameroot": "sample_%d" % i, "nameext": ".fastq",
+               "size": 1024 * i} for i in range(50)],
+    "threads": 4,
+    "prefix": "out"}
+
+EXPRESSIONS = [
+    ("arithmetic", "$(inputs.threads * 2)"),
+    ("string", "$(inputs.prefix + '.bam')"),
+    ("function body", "${ return inputs.reads.map(stem).join(','); }"),
+    ("expressionLib", "$(stem(inputs.reads[0]))"),
+]
+
+
+def measure(expression, iterations):  # type: (str, int) -> list
+    timings = []
+    for _ in range(iterations):
+        start = time.time()
+        do_eval(expression, INPUTS, REQUIREMENTS, "/outdir", "/tmp",
+                {"cores": 1, "ram": 1024})
+        timings.append(time.time() - start)
+    return sorted(timings)
+
+
+def main():  # type: () -> int
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-n", "--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    for engine in sandboxjs.JS_ENGINES:
+        try:
+            sandboxjs.set_js_engine(engine)
+            do_eval("$(1)", {}, REQUIREMENTS, None, None, {})
+        except Exception as err:  # pylint: disable=broad-except
+            print("%-10s unavailable: %s" % (engine, err))
+            continue
+        for name, expression in EXPRESSIONS:
+            timings = measure(expression, args.iterations)
+            print("%-10s %-14s mean %9.1f us  p50 %9.1f us  p99 %9.1f us" % (
+                engine, name,
+                1e6 * sum(timings) / len(timings),
+                1e6 * timings[len(timings) // 2],
+                1e6 * timings[int(len(timings) * 0.99) - 1]))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -13,11 +13,14 @@ from typing import List, Text  # noqa F401 # pylint: disable=unused-import
 from six import PY2
 from six.moves import urllib
 from schema_salad.ref_resolver import uri_file_path
-from typing import Tuple, Optional
+from typing import Dict, Tuple, Optional
 
 from cwltool.stdfsaccess import StdFsAccess
 from cwltool.loghandler import _logger
 
+# CWL classes of the MLSD "type" facts
+FTP_CLASSES = {"file": "File", "dir": "Directory"}
+
 
 def abspath(src, basedir):  # type: (Text, Text) -> Text
     """http(s):, file:, ftp:, and plain path aware absolute path"""
@@ -215,6 +218,24 @@ class FtpFsAccess(StdFsAccess):
                     for item in ftp.nlst(path)]
         return super(FtpFsAccess, self).listdir(fn)
 
+    def listdir_classes(self, fn):  # type: (Text) -> Dict[Text, Optional[Text]]
+        ftp = self._connect(fn)
+        if ftp:
+            path = self._parse_url(fn)[3]
+            try:
+                classes = {}  # type: Dict[Text, Optional[Text]]
+                for name, facts in ftp.mlsd(path, facts=["type"]):
+                    kind = facts.get("type", "").lower()
+                    if kind not in ("cdir", "pdir"):
+                        classes[name] = FTP_CLASSES.get(kind)
+                return classes
+            except (AttributeError, ftplib.error_perm):
+                # no MLSD (Python 2 or the server): names only
+                return dict.fromkeys(
+                    item.rstrip("/").rsplit("/", 1)[-1]
+                    for item in ftp.nlst(path))
+        return super(FtpFsAccess, self).listdir_classes(fn)
+
     def join(self, path, *paths):  # type: (Text, *Text) -> Text
         if path.startswith('ftp:'):
             result = path
@@ -8,12 +8,10 @@ import signal
 import sys
 import logging
 import ftplib
-import jwt
 import uuid
 from typing import MutableMapping, MutableSequence
 from typing_extensions import Text
 
-import pkg_resources
 from six.moves import urllib
 from six import itervalues, StringIO
 
@@ -26,11 +24,14 @@ from cwltool.context import LoadingContext, RuntimeContext
 from cwltool.process import scandeps, shortname
 from cwltool.executors import (MultithreadedJobExecutor, SingleJobExecutor,
                                JobExecutor)
+from cwltool.argparser import limit_value, tag_value
 from cwltool.resolver import ga4gh_tool_registries
 from cwltool.pathmapper import visit_class
+from cwltool.stdfsaccess import ListingCache
 from cwltool.process import Process
 
-from .tes import make_tes_tool, TESPathMapper
+from .tes import (make_tes_tool, TESPathMapper, TESTaskBatch,
+                  TESFusedTask)
 from .__init__ import __version__
 from .ftp import FtpFsAccess
 
@@ -48,6 +49,7 @@ DEFAULT_TOKEN_PUBLIC_KEY = os.environ.get('TOKEN_PUBLIC_KEY', '')
 def versionstring():
     return "cwl_tes 2 with cwltool unknown"
     """Determine our version."""
+    import pkg_resources
     pkg = pkg_resources.require("cwltool")
     if pkg:
         cwltool_ver = pkg[0].version
@@ -123,6 +125,7 @@ def main(args=None):
         return 1
 
     if parsed_args.token:
+        import jwt
         try:
             jwt.decode(
                 parsed_args.token,
@@ -175,6 +178,8 @@ def main(args=None):
         CachingFtpFsAccess, insecure=parsed_args.insecure)
     runtime_context.path_mapper = functools.partial(
         TESPathMapper, fs_access=ftp_fs_access)
+    runtime_context.make_job_batch = TESTaskBatch
+    runtime_context.make_fused_job = TESFusedTask
     job_executor = MultithreadedJobExecutor() if parsed_args.parallel \
         else SingleJobExecutor()
     job_executor.max_ram = job_executor.max_cores = float("inf")
@@ -349,37 +354,56 @@ def find_defaults(item, operation):
                 find_defaults(entry, operation)
 
 
-def discover_secondary_files(inputs, job_order, discovered=None):
+def discover_secondary_files(inputs, job_order, discovered=None,
+                             fs_access=None):
     """
     Find secondaryFiles in the schema and transfer to the job_order.
 
+    With an fs_access, optional secondaryFiles that do not exist are left
+    out; their existence is checked with one listing per directory.
+
     Adapted from:
     https://github.com/curoverse/arvados/blob/2b0b06579199967eca3d44d955ad64195d2db3c3/sdk/cwl/arvados_cwl/runner.py#L166
     """
+    listings = ListingCache(fs_access) if fs_access is not None else None
     for typedef in inputs:
         if shortname(typedef["id"]) in job_order \
                 and typedef.get("secondaryFiles"):
             set_secondary(typedef, job_order[shortname(typedef["id"])],
-                          discovered)
+                          discovered, listings)
 
 
-def set_secondary(typedef, fileobj, discovered):
+def set_secondary(typedef, fileobj, discovered, listings=None):
     """
     Pull over missing secondaryFiles to the job object entry.
 
     Adapted from:
     https://github.com/curoverse/arvados/blob/2b0b06579199967eca3d44d955ad64195d2db3c3/sdk/cwl/arvados_cwl/runner.py#L67
     """
+    # expand the patterns for all the primaries before checking anything
+    candidates = [(primary, [
+        (substitute(primary["location"], sf["pattern"]),
+         sf.get("required") is False)
+        for sf in typedef["secondaryFiles"]])
+        for primary in primary_files(fileobj)]
+    for primary, secondaries in candidates:
+        primary["secondaryFiles"] = cmap(
+            [{"location": location, "class": "File"}
+             for location, optional in secondaries
+             if listings is None or not optional
+             or listings.exists(location)])
+        if discovered is not None:
+            discovered[primary["location"]] = primary["secondaryFiles"]
+
+
+def primary_files(fileobj):
+    """List the Files of an input value that have no secondaryFiles yet."""
     if isinstance(fileobj, MutableMapping) and fileobj.get("class") == "File":
-        if "secondaryFiles" not in fileobj:
-            fileobj["secondaryFiles"] = cmap(
-                [{"location": substitute(fileobj["location"], sf["pattern"]),
-                  "class": "File"} for sf in typedef["secondaryFiles"]])
-            if discovered is not None:
-                discovered[fileobj["location"]] = fileobj["secondaryFiles"]
-    elif isinstance(fileobj, MutableSequence):
-        for entry in fileobj:
-            set_secondary(typedef, entry, discovered)
+        return [fileobj] if "secondaryFiles" not in fileobj else []
+    if isinstance(fileobj, MutableSequence):
+        return [primary for entry in fileobj
+                for primary in primary_files(entry)]
+    return []
 
 
 def upload_job_order_ftp(process, job_order, remote_storage_url, ftp_access):
@@ -390,7 +414,8 @@ def upload_job_order_ftp(process, job_order, remote_storage_url, ftp_access):
     Adapted from:
     https://github.com/curoverse/arvados/blob/2b0b06579199967eca3d44d955ad64195d2db3c3/sdk/cwl/arvados_cwl/runner.py#L266
     """
-    discover_secondary_files(process.tool["inputs"], job_order)
+    discover_secondary_files(process.tool["inputs"], job_order,
+                             fs_access=ftp_access)
     upload_dependencies_ftp(process.doc_loader, job_order,
                             job_order.get("id", "#"), False,
                             remote_storage_url, ftp_access)
@@ -510,6 +535,32 @@ def arg_parser():  # type: () -> argparse.ArgumentParser
         "giving an error, default 20s.",
         type=float,
         default=20)
+    parser.add_argument(
+        "--js-workers",
+        help="Number of Javascript engine processes to start before running "
+        "the workflow. Engine processes are kept and shared between jobs in "
+        "any case.",
+        type=int,
+        default=0)
+    parser.add_argument(
+        "--js-engine-cache",
+        help="File in which to remember the Node.js engine found on this "
+        "system, to skip looking for it on later runs.",
+        type=Text,
+        default=None)
+    parser.add_argument(
+        "--js-engine",
+        help="How to evaluate Javascript expressions: with a Node.js process "
+        "(default), or inside cwl-tes with the quickjs or py_mini_racer "
+        "module.",
+        choices=("node", "quickjs", "mini_racer"),
+        default="node")
+    parser.add_argument(
+        "--profile-expressions",
+        help="Time the evaluation of every expression and write a JSON "
+        "report to this file at exit.",
+        type=Text,
+        default=None)
 
     exgroup = parser.add_mutually_exclusive_group()
     exgroup.add_argument(
@@ -570,6 +621,11 @@ def arg_parser():  # type: () -> argparse.ArgumentParser
         help="Skip loading of schemas",
         default=False,
         dest="skip_schemas")
+    parser.add_argument(
+        "--document-cache", metavar="DIR", type=Text,
+        help="Directory in which to keep loaded and validated CWL "
+        "documents, so they are not parsed and validated again while their "
+        "files are unchanged.")
 
     exgroup = parser.add_mutually_exclusive_group()
     exgroup.add_argument(
@@ -598,6 +654,9 @@ def arg_parser():  # type: () -> argparse.ArgumentParser
                         type=Text,
                         help="File of options to pass to jshint."
                         "This includes the added option \"includewarnings\". ")
+    parser.add_argument("--js-hint-cache", metavar="DIR", type=Text,
+                        help="Directory in which to keep jshint results, "
+                        "so unchanged expressions are not checked again.")
 
     parser.add_argument(
         "--tool-help",
@@ -655,6 +714,15 @@ def arg_parser():  # type: () -> argparse.ArgumentParser
         dest="ga4gh_tool_registries",
         default=[])
 
+    parser.add_argument(
+        "--scatter-spill-threshold",
+        type=int,
+        default=None,
+        help="Number of scatter results kept in memory per step before the "
+        "rest are spilled to a temporary file, default is to keep them all "
+        "in memory.",
+        dest="scatter_spill_threshold")
+
     parser.add_argument(
         "--on-error",
         help="Desired workflow behavior when a step fails. "
@@ -690,6 +758,14 @@ def arg_parser():  # type: () -> argparse.ArgumentParser
         type=str,
         default=None,
         help="Read process requirement overrides from file.")
+    parser.add_argument(
+        "--enable-step-fusion",
+        action="store_true",
+        default=False,
+        help="Run linear chains of steps sharing the same container image "
+        "and resources as a single TES task, keeping the intermediate files "
+        "on the node.",
+        dest="step_fusion")
     exgroup = parser.add_mutually_exclusive_group()
     exgroup.add_argument(
         "--parallel", action="store_true", default=True,
@@ -697,6 +773,26 @@ def arg_parser():  # type: () -> argparse.ArgumentParser
     exgroup.add_argument(
         "--serial", action="store_false", dest="parallel",
         help="Run jobs in parallel (the default)")
+    parser.add_argument(
+        "--concurrency-limit",
+        type=limit_value,
+        action="append",
+        help="Run at most N tasks of step or cwltool:ConcurrencyLimit tag "
+        "TAG at the same time, overriding the hint. May be provided "
+        "multiple times.",
+        metavar="TAG=N",
+        default=[],
+        dest="concurrency_limits")
+    parser.add_argument(
+        "--job-priority",
+        type=tag_value,
+        action="append",
+        help="Priority of the tasks of step or tag TAG when several are "
+        "waiting to start, higher first, overriding the hint. May be "
+        "provided multiple times.",
+        metavar="TAG=N",
+        default=[],
+        dest="job_priorities")
 
     parser.add_argument(
         "workflow",
@@ -28,12 +28,13 @@ from cwltool.command_line_tool import CommandLineTool
 from cwltool.context import RuntimeContext
 from cwltool.errors import WorkflowException, UnsupportedRequirement
 from cwltool.expression import JSON
-from cwltool.job import JobBase
+from cwltool.job import JobBase, JobBatch
 from cwltool.stdfsaccess import StdFsAccess
 from cwltool.pathmapper import (PathMapper, uri_file_path, MapperEnt,
-                                downloadHttpFile)
-from cwltool.utils import onWindows, convert_pathsep_to_unix
-from cwltool.workflow import default_make_tool
+                                downloadHttpFile, fused_path,
+                                is_fused_location)
+from cwltool.utils import onWindows, convert_pathsep_to_unix, visit_class
+from cwltool.workflow import SCATTER_BATCH, default_make_tool
 
 from .ftp import abspath
 
@@ -66,6 +67,15 @@ class TESCommandLineTool(CommandLineTool):
         return super(TESCommandLineTool, self).make_path_mapper(
             reffiles, stagedir, runtimeContext, separateDirs)
 
+    def job(self, job_order, output_callbacks, runtimeContext):
+        if self.get_requirement(SCATTER_BATCH)[0]:
+            # Members of a batch share the task filesystem, so each one
+            # needs its own working directory.
+            runtimeContext = runtimeContext.copy()
+            runtimeContext.docker_outdir = "/{}".format(uuid.uuid4().hex)
+        return super(TESCommandLineTool, self).job(
+            job_order, output_callbacks, runtimeContext)
+
     def make_job_runner(self, runtimeContext):
         if self.remote_storage_url:
             remote_storage_url = self.remote_storage_url + "/output_{}".format(
@@ -117,7 +127,12 @@ class TESPathMapper(PathMapper):
         elif obj["class"] == "File":
             path = obj["location"]
             abpath = abspath(path, basedir)
-            if "contents" in obj and obj["location"].startswith("_:"):
+            if is_fused_location(path):
+                # Produced by an earlier executor of the same task
+                container_path = fused_path(path)
+                self._pathmap[path] = MapperEnt(
+                    container_path, container_path, "File", False)
+            elif "contents" in obj and obj["location"].startswith("_:"):
                 self._pathmap[obj["location"]] = MapperEnt(
                     obj["contents"], tgt, "CreateFile", staged)
             else:
@@ -146,7 +161,247 @@ class TESPathMapper(PathMapper):
                         copy=copy, staged=staged)
 
 
-class TESTask(JobBase):
+class TESTaskMonitor(object):
+    """Submission and polling of a TES task.
+
+    Expects ``client``, ``name``, ``id``, ``state`` and ``exit_code``
+    attributes on the instance.
+    """
+
+    def submit(self, task):
+        log.info(
+            "[job %s] CREATED TASK MSG----------------------",
+            self.name
+        )
+        log.info(pformat(task))
+
+        try:
+            self.id = self.client.create_task(task)
+            log.info(
+                "[job %s] SUBMITTED TASK ----------------------",
+                self.name
+            )
+            log.info("[job %s] task id: %s ", self.name, self.id)
+        except Exception as e:
+            log.error(
+                "[job %s] Failed to submit task to TES service:\n%s",
+                self.name, e
+            )
+            raise WorkflowException(e)
+
+    def wait(self):
+        max_tries = 10
+        current_try = 1
+        self.exit_code = None
+        while not self.is_done():
+            delay = 1.5 * current_try**2
+            time.sleep(
+                random.randint(
+                    round(
+                        delay -
+                        0.5 *
+                        delay),
+                    round(
+                        delay +
+                        0.5 *
+                        delay)))
+            try:
+                task = self.client.get_task(self.id, "MINIMAL")
+                self.state = task.state
+                log.debug(
+                    "[job %s] POLLING %s, result: %s", self.name,
+                    pformat(self.id), task.state
+                )
+            except Exception as e:
+                log.error("[job %s] POLLING ERROR %s", self.name, e)
+                if current_try <= max_tries:
+                    current_try += 1
+                    continue
+                else:
+                    log.error("[job %s] MAX POLLING RETRIES EXCEEDED",
+                              self.name)
+                    break
+
+    def is_done(self):
+        terminal_states = ["COMPLETE", "CANCELED", "EXECUTOR_ERROR",
+                           "SYSTEM_ERROR"]
+        if self.state in terminal_states:
+            log.info(
+                "[job %s] FINAL JOB STATE: %s ------------------",
+                self.name, self.state
+            )
+            if self.state != "COMPLETE":
+                log.error(
+                    "[job %s] task id: %s", self.name, self.id
+                )
+                logs = self.client.get_task(self.id, "FULL").logs
+                log.error(
+                    "[job %s] logs: %s",
+                    self.name, logs
+                )
+                if isinstance(logs, MutableSequence):
+                    last_log = logs[-1]
+                    if isinstance(last_log, tes.TaskLog) and last_log.logs:
+                        self.exit_code = last_log.logs[-1].exit_code
+            return True
+        return False
+
+
+class TESTaskBatch(TESTaskMonitor, JobBatch):
+    """Several TESTasks run as the executors of a single TES task.
+
+    Used for scatters carrying the cwltool:ScatterBatch hint. Each member
+    keeps its own working directory and output URLs; once the combined task
+    is COMPLETE every member collects its own outputs and reports them to
+    its own callback. As TES stops at the first failing executor, a batch
+    that does not complete falls back to running each member as a task of
+    its own so that every scatter element gets its own status.
+    """
+
+    def __init__(self, jobs):  # type: (List[TESTask]) -> None
+        super(TESTaskBatch, self).__init__(jobs)
+        self.client = jobs[0].client
+        self.id = None
+        self.state = "UNKNOWN"
+        self.exit_code = None
+
+    def create_task_msg(self):
+        inputs = []
+        seen = set()
+        outputs = []
+        executors = []
+        for job in self.jobs:
+            for parameter in job.get_inputs():
+                if parameter.path not in seen:
+                    seen.add(parameter.path)
+                    inputs.append(parameter)
+            outputs.extend(job.get_outputs())
+            executors.append(job.create_executor())
+        resources = [job.get_resources() for job in self.jobs]
+        return tes.Task(
+            name=self.name,
+            description=self.jobs[0].spec.get("doc", ""),
+            executors=executors,
+            inputs=inputs,
+            outputs=outputs,
+            resources=tes.Resources(
+                cpu_cores=max(r.cpu_cores for r in resources),
+                ram_gb=max(r.ram_gb for r in resources),
+                disk_gb=sum(r.disk_gb for r in resources)
+            ),
+            tags={"CWLDocumentId": self.jobs[0].spec.get("id"),
+                  "CWLScatterBatch": str(len(self.jobs))}
+        )
+
+    def run(self,
+            runtimeContext,   # type: RuntimeContext
+            tmpdir_lock=None  # type: Optional[threading.Lock]
+            ):  # type: (...) -> None
+        for job in self.jobs:
+            if not job.successCodes:
+                job.successCodes = [0]
+        self.submit(self.create_task_msg())
+        self.wait()
+        if self.state != "COMPLETE":
+            log.warning(
+                "[job %s] batch ended in state %s, running its %d "
+                "members separately", self.name, self.state, len(self.jobs))
+            for job in self.jobs:
+                job.run(runtimeContext, tmpdir_lock)
+            return
+        for job in self.jobs:
+            job.id = self.id
+            job.state = self.state
+            job.exit_code = 0
+            job.finish(runtimeContext)
+
+
+class TESFusedTask(TESTaskMonitor, JobBatch):
+    """A chain of fused steps run as the executors of a single TES task.
+
+    The output directories of all but the last member are task volumes, so
+    intermediate files are shared between executors and never uploaded.
+    Only the last member's outputs leave the node; the earlier members
+    report the outputs that were predicted when the chain was built, which
+    only the next member uses (see cwltool.fusion).
+    """
+
+    def __init__(self, jobs, predicted_outputs):
+        # type: (List[TESTask], List[Dict[Text, Any]]) -> None
+        super(TESFusedTask, self).__init__(jobs)
+        self.predicted_outputs = predicted_outputs
+        self.client = jobs[-1].client
+        self.id = None
+        self.state = "UNKNOWN"
+        self.exit_code = None
+
+    def create_task_msg(self):
+        inputs = []
+        seen = set()
+        for job in self.jobs:
+            for parameter in job.get_inputs():
+                if parameter.path not in seen:
+                    seen.add(parameter.path)
+                    inputs.append(parameter)
+        last = self.jobs[-1]
+        return tes.Task(
+            name=self.name,
+            description=last.spec.get("doc", ""),
+            executors=[job.create_executor() for job in self.jobs],
+            inputs=inputs,
+            outputs=last.get_outputs(),
+            resources=last.get_resources(),
+            volumes=[job.builder.outdir for job in self.jobs[:-1]],
+            tags={"CWLDocumentId": last.spec.get("id"),
+                  "CWLFusedSteps": ",".join(
+                      job.name for job in self.jobs)}
+        )
+
+    def run(self,
+            runtimeContext,   # type: RuntimeContext
+            tmpdir_lock=None  # type: Optional[threading.Lock]
+            ):  # type: (...) -> None
+        for job in self.jobs:
+            if not job.successCodes:
+                job.successCodes = [0]
+        self.submit(self.create_task_msg())
+        self.wait()
+        status = "success" if self.state == "COMPLETE" else "permanentFail"
+        for job, outputs in zip(self.jobs, self.predicted_outputs):
+            job.outputs = outputs if status == "success" else {}
+            with runtimeContext.workflow_eval_lock:
+                job.output_callback(job.outputs, status)
+            job.cleanup(runtimeContext.rm_tmpdir)
+        last = self.jobs[-1]
+        last.id = self.id
+        last.state = self.state
+        last.exit_code = self.exit_code
+        last.output_callback = functools.partial(
+            self.check_outputs, last.output_callback)
+        last.finish(runtimeContext)
+
+    def check_outputs(self, output_callback, outputs, status):
+        # type: (Callable[[Any, Any], Any], Dict[Text, Any], Text) -> None
+        """Fail the chain if its outputs refer to files kept on the node.
+
+        fusion.fusible_chains() should not let that happen; those files
+        are never uploaded, so whoever received them could not use them.
+        """
+        kept = []  # type: List[Text]
+
+        def check(obj):  # type: (Dict[Text, Any]) -> None
+            if is_fused_location(obj.get("location", "")):
+                kept.append(obj["location"])
+        visit_class(outputs, ("File", "Directory"), check)
+        if kept:
+            log.error(
+                "[job %s] outputs refer to files that stay inside the fused "
+                "task: %s", self.name, ", ".join(kept))
+            outputs, status = {}, "permanentFail"
+        output_callback(outputs, status)
+
+
+class TESTask(TESTaskMonitor, JobBase):
     JobOrderType = Dict[Text, Union[Dict[Text, Any], List, Text]]
 
     def __init__(self,
@@ -220,7 +475,9 @@ class TESTask(JobBase):
 
     def parse_job_order(self, k, v, inputs):
         if isinstance(v, MutableMapping):
-            if all([i in v for i in ["location", "path", "class"]]):
+            if is_fused_location(v.get("location", "")):
+                pass
+            elif all([i in v for i in ["location", "path", "class"]]):
                 inputs.append(self.create_input(k, v))
 
                 if "secondaryFiles" in v:
@@ -306,8 +563,7 @@ class TESTask(JobBase):
             else self.builder.tmpdir
         return env
 
-    def create_task_msg(self):
-        input_parameters = self.get_inputs()
+    def get_outputs(self):
         output_parameters = []
 
         if self.stdout is not None:
@@ -336,6 +592,31 @@ class TESTask(JobBase):
                 type="DIRECTORY"
             )
         )
+
+        docker_req, _ = self.get_requirement("DockerRequirement")
+        if docker_req and hasattr(docker_req, "dockerOutputDirectory"):
+            output_parameters.append(
+                tes.Output(
+                    name="dockerOutputDirectory",
+                    url=self.output2url(""),
+                    path=docker_req.dockerOutputDirectory,
+                    type="DIRECTORY"
+                )
+            )
+        return output_parameters
+
+    def get_resources(self):
+        res_reqs = self.builder.resources
+        ram = res_reqs['ram'] / 953.674
+        disk = (res_reqs['outdirSize'] + res_reqs['tmpdirSize']) / 953.674
+        cpus = res_reqs['cores']
+        return tes.Resources(
+            cpu_cores=cpus,
+            ram_gb=ram,
+            disk_gb=disk
+        )
+
+    def create_executor(self):
         requirement, _ = self.get_requirement("HelmRequirement")
         chartrepo = None
         chartversion = None
@@ -350,46 +631,27 @@ class TESTask(JobBase):
             print("333. DOCKER")
             container = self.get_container()
 
-        res_reqs = self.builder.resources
-        ram = res_reqs['ram'] / 953.674
-        disk = (res_reqs['outdirSize'] + res_reqs['tmpdirSize']) / 953.674
-        cpus = res_reqs['cores']
-
-        docker_req, _ = self.get_requirement("DockerRequirement")
-        if docker_req and hasattr(docker_req, "dockerOutputDirectory"):
-            output_parameters.append(
-                tes.Output(
-                    name="dockerOutputDirectory",
-                    url=self.output2url(""),
-                    path=docker_req.dockerOutputDirectory,
-                    type="DIRECTORY"
-                )
-            )
+        return tes.Executor(
+            command=self.command_line,
+            image=container,
+            chartrepo=chartrepo,
+            chartversion=chartversion,
+            chartname=chartname,
+            workdir=self.builder.outdir,
+            stdout=self.output2path(self.stdout),
+            stderr=self.output2path(self.stderr),
+            stdin=self.stdin,
+            env=self.get_envvars()
+        )
 
+    def create_task_msg(self):
         create_body = tes.Task(
             name=self.name,
             description=self.spec.get("doc", ""),
-            executors=[
-                tes.Executor(
-                    command=self.command_line,
-                    image=container,
-                    chartrepo=chartrepo,
-                    chartversion=chartversion,
-                    chartname=chartname,
-                    workdir=self.builder.outdir,
-                    stdout=self.output2path(self.stdout),
-                    stderr=self.output2path(self.stderr),
-                    stdin=self.stdin,
-                    env=self.get_envvars()
-                )
-            ],
-            inputs=input_parameters,
-            outputs=output_parameters,
-            resources=tes.Resources(
-                cpu_cores=cpus,
-                ram_gb=ram,
-                disk_gb=disk
-            ),
+            executors=[self.create_executor()],
+            inputs=self.get_inputs(),
+            outputs=self.get_outputs(),
+            resources=self.get_resources(),
             tags={"CWLDocumentId": self.spec.get("id")}
         )
         return create_body
@@ -406,59 +668,12 @@ class TESTask(JobBase):
         if not self.successCodes:
             self.successCodes = [0]
 
-        task = self.create_task_msg()
-
-        log.info(
-            "[job %s] CREATED TASK MSG----------------------",
-            self.name
-        )
-        log.info(pformat(task))
-
-        try:
-            self.id = self.client.create_task(task)
-            log.info(
-                "[job %s] SUBMITTED TASK ----------------------",
-                self.name
-            )
-            log.info("[job %s] task id: %s ", self.name, self.id)
-        except Exception as e:
-            log.error(
-                "[job %s] Failed to submit task to TES service:\n%s",
-                self.name, e
-            )
-            raise WorkflowException(e)
-        max_tries = 10
-        current_try = 1
-        self.exit_code = None
-        while not self.is_done():
-            delay = 1.5 * current_try**2
-            time.sleep(
-                random.randint(
-                    round(
-                        delay -
-                        0.5 *
-                        delay),
-                    round(
-                        delay +
-                        0.5 *
-                        delay)))
-            try:
-                task = self.client.get_task(self.id, "MINIMAL")
-                self.state = task.state
-                log.debug(
-                    "[job %s] POLLING %s, result: %s", self.name,
-                    pformat(self.id), task.state
-                )
-            except Exception as e:
-                log.error("[job %s] POLLING ERROR %s", self.name, e)
-                if current_try <= max_tries:
-                    current_try += 1
-                    continue
-                else:
-                    log.error("[job %s] MAX POLLING RETRIES EXCEEDED",
-                              self.name)
-                    break
+        self.submit(self.create_task_msg())
+        self.wait()
+        self.finish(runtimeContext)
 
+    def finish(self, runtimeContext):  # type: (RuntimeContext) -> None
+        """Collect the outputs of the finished task and report them."""
         try:
             process_status = None
             if self.state != "COMPLETE" \
@@ -509,30 +724,6 @@ class TESTask(JobBase):
             self.cleanup(self.runtime_context.rm_tmpdir)
         return
 
-    def is_done(self):
-        terminal_states = ["COMPLETE", "CANCELED", "EXECUTOR_ERROR",
-                           "SYSTEM_ERROR"]
-        if self.state in terminal_states:
-            log.info(
-                "[job %s] FINAL JOB STATE: %s ------------------",
-                self.name, self.state
-            )
-            if self.state != "COMPLETE":
-                log.error(
-                    "[job %s] task id: %s", self.name, self.id
-                )
-                logs = self.client.get_task(self.id, "FULL").logs
-                log.error(
-                    "[job %s] logs: %s",
-                    self.name, logs
-                )
-                if isinstance(logs, MutableSequence):
-                    last_log = logs[-1]
-                    if isinstance(last_log, tes.TaskLog) and last_log.logs:
-                        self.exit_code = last_log.logs[-1].exit_code
-            return True
-        return False
-
     def cleanup(self, rm_tmpdir):
         log.debug(
             "[job %s] STARTING CLEAN UP ------------------",
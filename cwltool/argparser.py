@@ -4,7 +4,7 @@ from __future__ import absolute_import, print_function
 import argparse
 import os
 from typing import (Any, AnyStr, Dict, List, MutableMapping, MutableSequence,
-                    Optional, Sequence, Union, cast)
+                    Optional, Sequence, Tuple, Union, cast)
 
 from schema_salad.ref_resolver import file_uri
 from typing_extensions import Text  # pylint: disable=unused-import
@@ -17,6 +17,27 @@ from .software_requirements import SOFTWARE_REQUIREMENTS_ENABLED
 from .utils import DEFAULT_TMP_PREFIX
 
 
+def tag_value(value):  # type: (Text) -> Tuple[Text, int]
+    """Parse a TAG=N command line value."""
+    tag, sep, number = value.rpartition("=")
+    try:
+        if sep and tag:
+            return (tag, int(number))
+    except ValueError:
+        pass
+    raise argparse.ArgumentTypeError(
+        "expected TAG=N with an integer N, got '%s'" % value)
+
+
+def limit_value(value):  # type: (Text) -> Tuple[Text, int]
+    """Parse a TAG=N command line value with N at least 1."""
+    tag, number = tag_value(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(
+            "expected TAG=N with N at least 1, got '%s'" % value)
+    return (tag, number)
+
+
 def arg_parser():  # type: () -> argparse.ArgumentParser
     parser = argparse.ArgumentParser(
         description='Reference executor for Common Workflow Language standards.')
@@ -26,6 +47,17 @@ def arg_parser():  # type: () -> argparse.ArgumentParser
 
     parser.add_argument("--parallel", action="store_true", default=False,
                         help="[experimental] Run jobs in parallel. ")
+    parser.add_argument("--concurrency-limit", type=limit_value, action="append",
+                        help="Run at most N jobs of step or "
+                        "cwltool:ConcurrencyLimit tag TAG at the same time "
+                        "with --parallel, overriding the hint. May be "
+                        "provided multiple times.", metavar="TAG=N",
+                        default=[], dest="concurrency_limits")
+    parser.add_argument("--job-priority", type=tag_value, action="append",
+                        help="Priority of the jobs of step or tag TAG when "
+                        "several are waiting to start, higher first, "
+                        "overriding the hint. May be provided multiple times.",
+                        metavar="TAG=N", default=[], dest="job_priorities")
     envgroup = parser.add_mutually_exclusive_group()
     envgroup.add_argument("--preserve-environment", type=Text, action="append",
                           help="Preserve specific environment variable when "
@@ -118,6 +150,29 @@ def arg_parser():  # type: () -> argparse.ArgumentParser
                         help="Time to wait for a Javascript expression to evaluate before giving an error, default 20s.",
                         type=float,
                         default=20)
+    parser.add_argument("--js-workers",
+                        help="Number of Javascript engine processes to start "
+                        "before running the workflow. Engine processes are "
+                        "kept and shared between jobs in any case.",
+                        type=int,
+                        default=0)
+    parser.add_argument("--js-engine-cache",
+                        help="File in which to remember the Node.js engine "
+                        "found on this system, to skip looking for it on "
+                        "later runs.",
+                        type=Text,
+                        default=None)
+    parser.add_argument("--js-engine",
+                        help="How to evaluate Javascript expressions: with a "
+                        "Node.js process (default), or inside cwltool with "
+                        "the quickjs or py_mini_racer module.",
+                        choices=("node", "quickjs", "mini_racer"),
+                        default="node")
+    parser.add_argument("--profile-expressions",
+                        help="Time the evaluation of every expression and "
+                        "write a JSON report to this file at exit.",
+                        type=Text,
+                        default=None)
 
     provgroup = parser.add_argument_group("Options for recording provenance "
                                           "information of the execution")
@@ -182,6 +237,10 @@ def arg_parser():  # type: () -> argparse.ArgumentParser
 
     parser.add_argument("--skip-schemas", action="store_true",
             help="Skip loading of schemas", default=False, dest="skip_schemas")
+    parser.add_argument("--document-cache", metavar="DIR", type=Text,
+                        help="Directory in which to keep loaded and validated "
+                        "CWL documents, so they are not parsed and validated "
+                        "again while their files are unchanged.")
 
     exgroup = parser.add_mutually_exclusive_group()
     exgroup.add_argument("--verbose", action="store_true", help="Default logging")
@@ -203,6 +262,9 @@ def arg_parser():  # type: () -> argparse.ArgumentParser
                         type=Text,
                         help="File of options to pass to jshint."
                         "This includes the added option \"includewarnings\". ")
+    parser.add_argument("--js-hint-cache", metavar="DIR", type=Text,
+                        help="Directory in which to keep jshint results, "
+                        "so unchanged expressions are not checked again.")
     dockergroup = parser.add_mutually_exclusive_group()
     dockergroup.add_argument("--user-space-docker-cmd", metavar="CMD",
                         help="(Linux/OS X only) Specify a user space docker "
@@ -276,6 +338,12 @@ def arg_parser():  # type: () -> argparse.ArgumentParser
     parser.add_argument("--add-ga4gh-tool-registry", action="append", help="Add a GA4GH tool registry endpoint to use for resolution, default %s" % ga4gh_tool_registries,
                         dest="ga4gh_tool_registries", default=[])
 
+    parser.add_argument("--scatter-spill-threshold", type=int, default=None,
+                        help="Number of scatter results kept in memory per "
+                        "step before the rest are spilled to a temporary "
+                        "file, default is to keep them all in memory.",
+                        dest="scatter_spill_threshold")
+
     parser.add_argument("--on-error",
                         help="Desired workflow behavior when a step fails.  One of 'stop' (do not submit any more steps) or "
                         "'continue' (may submit other steps that are not downstream from the error). Default is 'stop'.",
@@ -1,6 +1,5 @@
 from __future__ import absolute_import
 
-import copy
 import os
 import logging
 from typing import (Any, Callable, Dict, List, MutableMapping, MutableSequence,
@@ -17,7 +16,7 @@ from schema_salad.schema import Names, convert_to_dict
 from schema_salad.avro.schema import make_avsc_object, Schema
 from schema_salad.sourceline import SourceLine
 from schema_salad.ref_resolver import uri_file_path
-from six import iteritems, string_types
+from six import PY3, iteritems, string_types
 from future.utils import raise_from
 from typing import IO
 from typing_extensions import (TYPE_CHECKING,  # pylint: disable=unused-import
@@ -31,7 +30,8 @@ from .mutation import MutationManager  # pylint: disable=unused-import
 from .pathmapper import PathMapper  # pylint: disable=unused-import
 from .pathmapper import CONTENT_LIMIT, get_listing, normalizeFilesDirs, visit_class
 from .stdfsaccess import StdFsAccess  # pylint: disable=unused-import
-from .utils import aslist, docker_windows_path_adjust, json_dumps, onWindows
+from .utils import (aslist, bytes2str_in_dicts, docker_windows_path_adjust,
+                    json_dumps, onWindows)
 
 
 
@@ -183,6 +183,11 @@ class Builder(HasReqsHints):
         self.tmpdir = tmpdir
         self.stagedir = stagedir
 
+        # JSON encoding of self.job, once the inputs are final
+        self.inputs_json = None  # type: Optional[Text]
+        # expression.classify() of the expressions of the tool, by text
+        self.expression_kinds = {}  # type: Dict[Text, Text]
+
         self.pathmapper = None  # type: Optional[PathMapper]
         self.prov_obj = None  # type: Optional[ProvenanceProfile]
         self.find_default_container = None  # type: Optional[Callable[[], Text]]
@@ -243,7 +248,8 @@ class Builder(HasReqsHints):
                 if not avsc:
                     avsc = make_avsc_object(convert_to_dict(t), self.names)
                 if validate.validate(avsc, datum):
-                    schema = copy.deepcopy(schema)
+                    # only "type" differs, the rest is shared
+                    schema = dict(schema)
                     schema["type"] = t
                     if not value_from_expression:
                         return self.bind_input(schema, datum, lead_pos=lead_pos, tail_pos=tail_pos, discover_secondaryFiles=discover_secondaryFiles)
@@ -253,7 +259,7 @@ class Builder(HasReqsHints):
             if not bound_input:
                 raise validate.ValidationException(u"'%s' is not a valid union %s" % (datum, schema["type"]))
         elif isinstance(schema["type"], MutableMapping):
-            st = copy.deepcopy(schema["type"])
+            st = dict(schema["type"])
             if binding and "inputBinding" not in st\
                     and "type" in st\
                     and st["type"] == "array"\
@@ -281,7 +287,9 @@ class Builder(HasReqsHints):
                 for n, item in enumerate(datum):
                     b2 = None
                     if binding:
-                        b2 = copy.deepcopy(binding)
+                        # not a deep copy, which would copy the whole array
+                        # (the datum of binding) for each item
+                        b2 = CommentedMap(binding.items())
                         b2["datum"] = item
                     itemschema = {
                         u"type": schema["items"],
@@ -307,16 +315,13 @@ class Builder(HasReqsHints):
                 if "secondaryFiles" in schema:
                     if "secondaryFiles" not in datum:
                         datum["secondaryFiles"] = []
-                    for sf in aslist(schema["secondaryFiles"]):
-                        if 'required' in sf:
-                            sf_required = self.do_eval(sf['required'], context=datum)
-                        else:
-                            sf_required = True
-
-
-                        if "$(" in sf["pattern"] or "${" in sf["pattern"]:
-                            sfpath = self.do_eval(sf["pattern"], context=datum)
-                        else:
+                    sfs = aslist(schema["secondaryFiles"])
+                    sf_evaluated = self.do_eval_batch(
+                        [sf.get("required", True) for sf in sfs]
+                        + [sf["pattern"] for sf in sfs], context=datum)
+                    for sf, sf_required, sfpath in zip(
+                            sfs, sf_evaluated, sf_evaluated[len(sfs):]):
+                        if not expression.needs_parsing(sf["pattern"]):
                             sfpath = substitute(datum["basename"], sf["pattern"])
 
                         for sfname in aslist(sfpath):
@@ -430,6 +435,16 @@ class Builder(HasReqsHints):
 
         return [a for a in args if a is not None]
 
+    def freeze_inputs(self):  # type: () -> None
+        """Encode the job inputs once for all the following evaluations.
+
+        Only call this once nothing will modify ``self.job`` anymore, i.e.
+        after the input files have been mapped to their runtime paths.
+        """
+        if PY3:
+            bytes2str_in_dicts(self.job)
+        self.inputs_json = json_dumps(self.job)
+
     def do_eval(self, ex, context=None, recursive=False, strip_whitespace=True):
         # type: (Union[Dict[Text, Text], Text], Any, bool, bool) -> Any
         if recursive:
@@ -440,6 +455,16 @@ class Builder(HasReqsHints):
                 return [self.do_eval(v, context, recursive)
                         for v in ex]
 
+        if not isinstance(ex, string_types) or not expression.needs_parsing(ex):
+            return ex
+        if self.expression_kinds.get(ex) == expression.PARAMETER:
+            try:
+                return expression.do_eval_parameters(
+                    ex, self.job, self.outdir, self.tmpdir, self.resources,
+                    context=context, strip_whitespace=strip_whitespace,
+                    inputs_json=self.inputs_json)
+            except WorkflowException:
+                pass  # Javascript or the full error message
         return expression.do_eval(ex, self.job, self.requirements,
                                   self.outdir, self.tmpdir,
                                   self.resources,
@@ -448,4 +473,19 @@ class Builder(HasReqsHints):
                                   debug=self.debug,
                                   js_console=self.js_console,
                                   force_docker_pull=self.force_docker_pull,
-                                  strip_whitespace=strip_whitespace)
+                                  strip_whitespace=strip_whitespace,
+                                  inputs_json=self.inputs_json)
+
+    def do_eval_batch(self, exprs, context=None, strip_whitespace=True):
+        # type: (List[Any], Any, bool) -> List[Any]
+        """Evaluate several expressions in a single Javascript request."""
+        return expression.do_eval_batch(exprs, self.job, self.requirements,
+                                        self.outdir, self.tmpdir,
+                                        self.resources,
+                                        context=context,
+                                        timeout=self.timeout,
+                                        debug=self.debug,
+                                        js_console=self.js_console,
+                                        force_docker_pull=self.force_docker_pull,
+                                        strip_whitespace=strip_whitespace,
+                                        inputs_json=self.inputs_json)
@@ -13,7 +13,8 @@ import tempfile
 import threading
 from functools import cmp_to_key, partial
 from typing import (Any, Callable, Dict, Generator, IO, List, Mapping,
-                    MutableMapping, MutableSequence, Optional, Set, Union, cast)
+                    MutableMapping, MutableSequence, Optional, Set, Tuple,
+                    Union, cast)
 
 from typing_extensions import Text, Type, TYPE_CHECKING  # pylint: disable=unused-import
 # move to a regular typing import when Python 3.3-3.6 is no longer supported
@@ -35,8 +36,8 @@ from .builder import (Builder, content_limit_respected_read_bytes, # pylint: dis
                       substitute)
 from .context import LoadingContext  # pylint: disable=unused-import
 from .context import RuntimeContext, getdefault
-from .docker import DockerCommandLineJob
 from .errors import WorkflowException
+from .expression import needs_parsing
 from .flatten import flatten
 from .job import CommandLineJob, JobBase  # pylint: disable=unused-import
 from .loghandler import _logger
@@ -46,10 +47,9 @@ from .pathmapper import (PathMapper, adjustDirObjs, adjustFileObjs,
 from .process import (Process, UnsupportedRequirement,
                       _logger_validation_warnings, compute_checksums,
                       normalizeFilesDirs, shortname, uniquename)
-from .singularity import SingularityCommandLineJob
 from .software_requirements import (  # pylint: disable=unused-import
     DependenciesConfiguration)
-from .stdfsaccess import StdFsAccess  # pylint: disable=unused-import
+from .stdfsaccess import ListingCache, StdFsAccess  # pylint: disable=unused-import
 from .utils import (aslist, convert_pathsep_to_unix,
                     docker_windows_path_adjust, json_dumps, onWindows,
                     random_outdir, windows_default_container_id,
@@ -272,7 +272,9 @@ class CommandLineTool(Process):
 
         if dockerReq is not None and runtimeContext.use_container:
             if runtimeContext.singularity:
+                from .singularity import SingularityCommandLineJob
                 return SingularityCommandLineJob
+            from .docker import DockerCommandLineJob
             return DockerCommandLineJob
         for t in reversed(self.requirements):
             if t["class"] == "DockerRequirement":
@@ -306,7 +308,8 @@ class CommandLineTool(Process):
         workReuse, _ = self.get_requirement("WorkReuse")
         enableReuse = workReuse.get("enableReuse", True) if workReuse else True
 
-        jobname = uniquename(runtimeContext.name or shortname(self.tool.get("id", "job")))
+        stepname = runtimeContext.name or shortname(self.tool.get("id", "job"))
+        jobname = uniquename(stepname)
         if runtimeContext.cachedir and enableReuse:
 
             cachecontext = runtimeContext.copy()
@@ -429,12 +432,14 @@ class CommandLineTool(Process):
 
         builder = self._init_job(job_order, runtimeContext)
 
-        reffiles = copy.deepcopy(builder.files)
+        # the path mapper only reads the files
+        reffiles = list(builder.files)
 
         j = self.make_job_runner(runtimeContext)(
             builder, builder.job, self.make_path_mapper, self.requirements,
             self.hints, jobname)
         j.prov_obj = self.prov_obj
+        j.step_name = stepname
 
         j.successCodes = self.tool.get("successCodes", [])
         j.temporaryFailCodes = self.tool.get("temporaryFailCodes", [])
@@ -506,6 +511,8 @@ class CommandLineTool(Process):
                 self.updatePathmap(builder.outdir, builder.pathmapper, l)
             visit_class([builder.files, builder.bindings], ("File", "Directory"), _check_adjust)
 
+        builder.freeze_inputs()
+
         if debug:
             _logger.debug(u"[job %s] path mappings is %s", j.name,
                           json_dumps({p: builder.pathmapper.mapper(p)
@@ -793,19 +800,20 @@ class CommandLineTool(Process):
 
             if "secondaryFiles" in schema:
                 with SourceLine(schema, "secondaryFiles", WorkflowException, debug):
+                    # expand the patterns for every primary first, then
+                    # check the candidates against one listing per directory
+                    candidates = []  # type: List[Tuple[MutableMapping[Text, Any], Dict[Text, Any], bool]]
+                    sfs = aslist(schema["secondaryFiles"])
                     for primary in aslist(r):
                         if isinstance(primary, MutableMapping):
                             primary.setdefault("secondaryFiles", [])
                             pathprefix = primary["path"][0:primary["path"].rindex("/")+1]
-                            for sf in aslist(schema["secondaryFiles"]):
-                                if 'required' in sf:
-                                    sf_required = builder.do_eval(sf['required'], context=primary)
-                                else:
-                                    sf_required = False
-
-                                if "$(" in sf["pattern"] or "${" in sf["pattern"]:
-                                    sfpath = builder.do_eval(sf["pattern"], context=primary)
-                                else:
+                            sf_evaluated = builder.do_eval_batch(
+                                [sf.get("required", False) for sf in sfs]
+                                + [sf["pattern"] for sf in sfs], context=primary)
+                            for sf, sf_required, sfpath in zip(
+                                    sfs, sf_evaluated, sf_evaluated[len(sfs):]):
+                                if not needs_parsing(sf["pattern"]):
                                     sfpath = substitute(primary["basename"], sf["pattern"])
 
                                 for sfitem in aslist(sfpath):
@@ -813,18 +821,20 @@ class CommandLineTool(Process):
                                         continue
                                     if isinstance(sfitem, string_types):
                                         sfitem = {"path": pathprefix+sfitem}
-                                    if not fs_access.exists(sfitem['path']) and sf_required:
-                                        raise WorkflowException(
-                                            "Missing required secondary file '%s'" % (
-                                                sfitem["path"]))
-                                    if "path" in sfitem and "location" not in sfitem:
-                                        revmap(sfitem)
-                                    if fs_access.isfile(sfitem["location"]):
-                                        sfitem["class"] = "File"
-                                        primary["secondaryFiles"].append(sfitem)
-                                    elif fs_access.isdir(sfitem["location"]):
-                                        sfitem["class"] = "Directory"
-                                        primary["secondaryFiles"].append(sfitem)
+                                    candidates.append((primary, sfitem, sf_required))
+
+                    listings = ListingCache(fs_access)
+                    for primary, sfitem, sf_required in candidates:
+                        if sf_required and not listings.exists(sfitem['path']):
+                            raise WorkflowException(
+                                "Missing required secondary file '%s'" % (
+                                    sfitem["path"]))
+                        if "path" in sfitem and "location" not in sfitem:
+                            revmap(sfitem)
+                        sf_class = listings.classify(sfitem["location"])
+                        if sf_class is not None:
+                            sfitem["class"] = sf_class
+                            primary["secondaryFiles"].append(sfitem)
 
             if "format" in schema:
                 for primary in aslist(r):
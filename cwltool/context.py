@@ -2,7 +2,7 @@
 import copy
 import threading  # pylint: disable=unused-import
 from typing import (Any, Callable, Dict, Iterable, List, MutableMapping,
-                    Optional)
+                    Optional, Tuple)
 
 from schema_salad import schema
 from schema_salad.ref_resolver import (ContextType,  # pylint: disable=unused-import
@@ -19,6 +19,7 @@ from .stdfsaccess import StdFsAccess
 from .utils import DEFAULT_TMP_PREFIX
 
 if TYPE_CHECKING:
+    from .job import JobBase, JobBatch  # pylint: disable=unused-import
     from .process import Process
     from .provenance import (ResearchObject,  # pylint: disable=unused-import
                              ProvenanceProfile)
@@ -52,6 +53,10 @@ class LoadingContext(ContextBase):
         self.avsc_names = None             # type: Optional[schema.Names]
         self.disable_js_validation = False  # type: bool
         self.js_hint_options_file = None
+        self.js_hint_cache = None          # type: Optional[Text]
+        self.document_cache = None         # type: Optional[Text]
+        self.cached_document = None        # type: Any
+        self.processed_documents = None    # type: Optional[Dict[Text, Any]]
         self.do_validate = True            # type: bool
         self.enable_dev = False            # type: bool
         self.strict = True                 # type: bool
@@ -120,9 +125,18 @@ class RuntimeContext(ContextBase):
         self.job_script_provider = None  # type: Optional[DependenciesConfiguration]
         self.select_resources = None    # type: Optional[select_resources_callable]
         self.eval_timeout = 20          # type: float
+        self.js_workers = 0             # type: int
+        self.js_engine_cache = None     # type: Optional[Text]
+        self.js_engine = "node"         # type: Text
         self.postScatterEval = None     # type: Optional[Callable[[MutableMapping[Text, Any]], Dict[Text, Any]]]
         self.on_error = "stop"          # type: Text
         self.strict_memory_limit = False  # type: bool
+        self.scatter_spill_threshold = None  # type: Optional[int]
+        self.make_job_batch = None      # type: Optional[Callable[[List[JobBase]], JobBatch]]
+        self.step_fusion = False        # type: bool
+        self.make_fused_job = None      # type: Optional[Callable[[List[JobBase], List[Dict[Text, Any]]], JobBatch]]
+        self.concurrency_limits = []    # type: List[Tuple[Text, int]]
+        self.job_priorities = []        # type: List[Tuple[Text, int]]
 
         self.cidfile_dir = None
         self.cidfile_prefix = None
@@ -0,0 +1,147 @@
+"""On-disk cache of resolved, validated and updated CWL documents."""
+from __future__ import absolute_import
+
+import errno
+import hashlib
+import os
+import sys
+import tempfile
+from typing import Any, Dict, MutableMapping, Optional, Set
+
+from schema_salad.ref_resolver import uri_file_path
+from six.moves import cPickle, urllib
+from typing_extensions import Text  # pylint: disable=unused-import
+# move to a regular typing import when Python 3.3-3.6 is no longer supported
+
+from . import process
+from .loghandler import _logger
+from .utils import json_dumps
+
+# Bump when what is stored in the cache entries changes.
+DOCUMENT_CACHE_FORMAT = 1
+
+
+class PendingDocument(object):
+    """A document freshly read from a file, to be cached once processed."""
+
+    def __init__(self, key, fileuri, uri, idx_before):
+        # type: (Text, Text, Text, Set[Text]) -> None
+        """Remember which index entries already existed before the fetch."""
+        self.key = key
+        self.fileuri = fileuri
+        self.uri = uri
+        self.idx_before = idx_before
+        self.fetched = set([fileuri])  # type: Set[Text]
+
+
+class CachedDocument(object):
+    """A processed document restored from the cache."""
+
+    def __init__(self, uri, resolved_uri, cwl_version, metadata):
+        # type: (Text, Text, Text, MutableMapping[Text, Any]) -> None
+        """Record what resolve_and_validate_document would have returned."""
+        self.uri = uri
+        self.resolved_uri = resolved_uri
+        self.cwl_version = cwl_version
+        self.metadata = metadata
+
+
+def file_digest(url):  # type: (Text) -> Optional[Text]
+    """Hash the contents of a file: URL, None if it cannot be read."""
+    if not url.startswith("file:"):
+        return None
+    checksum = hashlib.sha256()
+    try:
+        with open(uri_file_path(str(url)), "rb") as handle:
+            for block in iter(lambda: handle.read(1024 * 1024), b""):
+                checksum.update(block)
+    except (IOError, OSError):
+        return None
+    return checksum.hexdigest()
+
+
+class DocumentCache(object):
+    """Processed CWL documents kept in a directory between runs.
+
+    An entry holds every loader index entry that loading a document added
+    (the document itself and everything it references), pickled with
+    their line and column information.  It is keyed by the document URI
+    and the loading options, and is only used while the content of every
+    file read to build it is unchanged.
+    """
+
+    def __init__(self, directory):  # type: (Text) -> None
+        """Keep the entries in ``directory``."""
+        self.directory = directory
+
+    def key(self, uri, loadingContext):  # type: (Text, Any) -> Text
+        custom = sorted(
+            (version, name, hashlib.sha256(text.encode("utf-8")).hexdigest())
+            for version, (name, text) in process.custom_schemas.items())
+        return hashlib.sha256(json_dumps([
+            DOCUMENT_CACHE_FORMAT, list(sys.version_info[:2]), uri,
+            loadingContext.do_validate, loadingContext.strict,
+            loadingContext.do_update, loadingContext.enable_dev,
+            loadingContext.metadata, custom], sort_keys=True).encode("utf-8")
+        ).hexdigest()
+
+    def _path(self, key):  # type: (Text) -> Text
+        return os.path.join(self.directory, key + ".pickle")
+
+    def load(self, key, idx):
+        # type: (Text, MutableMapping[Text, Any]) -> Optional[CachedDocument]
+        """Restore the entry ``key`` into ``idx`` if it is still current."""
+        try:
+            with open(self._path(key), "rb") as handle:
+                header = cPickle.load(handle)
+                for url, digest in header["dependencies"].items():
+                    if file_digest(url) != digest:
+                        _logger.debug(u"Document cache entry for %s is stale, "
+                                      u"%s changed", header["uri"], url)
+                        return None
+                entries = cPickle.load(handle)
+        except Exception:  # pylint: disable=broad-except
+            # missing, unreadable or written by an incompatible version
+            return None
+        idx.update(entries)
+        _logger.debug(u"Loaded %s from the document cache", header["uri"])
+        return CachedDocument(header["uri"], header["resolved_uri"],
+                              header["cwl_version"], header["metadata"])
+
+    def store(self,
+              pending,       # type: PendingDocument
+              idx,           # type: MutableMapping[Text, Any]
+              resolved_uri,  # type: Text
+              cwl_version,   # type: Text
+              metadata       # type: MutableMapping[Text, Any]
+             ):  # type: (...) -> None
+        """Save the index entries added while processing ``pending``."""
+        entries = dict((key, value) for key, value in idx.items()
+                       if key not in pending.idx_before)
+        dependencies = {}  # type: Dict[Text, Optional[Text]]
+        for url in pending.fetched | set(
+                urllib.parse.urldefrag(key)[0] for key in entries
+                if "://" in key):
+            dependencies[url] = file_digest(url)
+            if dependencies[url] is None:
+                # only documents made entirely of local files are cached
+                return
+        try:
+            try:
+                os.makedirs(self.directory)
+            except OSError as err:
+                if err.errno != errno.EEXIST:
+                    raise
+            # write then rename, so concurrent runs never read a partial file
+            handle_fd, tmp = tempfile.mkstemp(dir=self.directory)
+            with os.fdopen(handle_fd, "wb") as handle:
+                cPickle.dump({"uri": pending.uri,
+                              "resolved_uri": resolved_uri,
+                              "cwl_version": cwl_version,
+                              "metadata": metadata,
+                              "dependencies": dependencies}, handle, 2)
+                cPickle.dump(entries, handle, 2)
+            os.rename(tmp, self._path(pending.key))
+        except Exception as err:  # pylint: disable=broad-except
+            _logger.debug(u"Could not cache %s in %s: %s",
+                          pending.uri, self.directory, Text(err))
@@ -1,6 +1,8 @@
 # -*- coding: utf-8 -*-
 """ Single and multi-threaded executors."""
+import bisect
 import datetime
+import itertools
 import os
 import tempfile
 import threading
@@ -9,8 +11,8 @@ from threading import Lock
 from abc import ABCMeta, abstractmethod
 from typing import Any, Dict, Iterable, List, Optional, Set, Tuple, Union
 
-import psutil
 from six import string_types, with_metaclass
+from six.moves import queue
 from typing_extensions import Text  # pylint: disable=unused-import
 from future.utils import raise_from
 from schema_salad.validate import ValidationException
@@ -19,15 +21,14 @@ from .builder import Builder  # pylint: disable=unused-import
 from .context import (RuntimeContext,  # pylint: disable=unused-import
                       getdefault)
 from .errors import WorkflowException
-from .job import JobBase  # pylint: disable=unused-import
+from .job import JobBase, JobBatch
 from .loghandler import _logger
 from .mutation import MutationManager
 from .process import Process  # pylint: disable=unused-import
 from .process import cleanIntermediate, relocateOutputs
-from .provenance import ProvenanceProfile
 from .utils import DEFAULT_TMP_PREFIX
 from .workflow import Workflow, WorkflowJob, WorkflowJobStep
-from .command_line_tool import CallbackJob
+from .command_line_tool import CallbackJob, ExpressionTool
 
 TMPDIR_LOCK = Lock()
 
@@ -152,6 +153,7 @@ class SingleJobExecutor(JobExecutor):
         # define provenance profile for single commandline tool
         if not isinstance(process, Workflow) \
                 and runtime_context.research_obj is not None:
+            from .provenance import ProvenanceProfile
             process.provenance_object = ProvenanceProfile(
                 runtime_context.research_obj,
                 full_name=runtime_context.cwl_full_name,
@@ -172,6 +174,8 @@ class SingleJobExecutor(JobExecutor):
                         job.builder = runtime_context.builder
                     if job.outdir is not None:
                         self.output_dirs.add(job.outdir)
+                    if isinstance(job, JobBatch):
+                        self.output_dirs.update(job.output_dirs())
                     if runtime_context.research_obj is not None:
                         if not isinstance(process, Workflow):
                             prov_obj = process.provenance_object
@@ -198,6 +202,20 @@ class SingleJobExecutor(JobExecutor):
             raise_from(WorkflowException(Text(err)), err)
 
 
+CONCURRENCY_LIMIT = "http://commonwl.org/cwltool#ConcurrencyLimit"
+
+# Jobs that only start a workflow, run on the calling thread.
+INLINE_JOBS = (WorkflowJob,)
+# Jobs that evaluate an expression or collect cached outputs in this
+# process: a thread each would cost more than the job itself, so a few
+# long-lived workers run them.  Not on the calling thread, which holds the
+# workflow evaluation lock, as expressions run user Javascript for up to
+# the evaluation timeout.
+POOLED_JOBS = (ExpressionTool.ExpressionJob, CallbackJob)
+# Number of those workers.
+POOL_WORKERS = 4
+
+
 class MultithreadedJobExecutor(JobExecutor):
     """
     Experimental multi-threaded CWL executor.
@@ -205,6 +223,11 @@ class MultithreadedJobExecutor(JobExecutor):
     Does simple resource accounting, will not start a job unless it
     has cores / ram available, but does not make any attempt to
     optimize usage.
+
+    Jobs can also be throttled with the cwltool:ConcurrencyLimit hint or
+    --concurrency-limit: at most ``maxConcurrent`` jobs sharing a ``tag``
+    (the step name when not given) run at the same time.  Waiting jobs are
+    started in order of ``priority``, highest first.
     """
 
     def __init__(self):  # type: () -> None
@@ -213,12 +236,50 @@ class MultithreadedJobExecutor(JobExecutor):
         self.threads = set()  # type: Set[threading.Thread]
         self.exceptions = []  # type: List[WorkflowException]
         self.pending_jobs = []  # type: List[Union[JobBase, WorkflowJob]]
+        # (-priority, arrival) of each pending job, in the same order
+        self.pending_order = []  # type: List[Tuple[int, int]]
+        self.arrivals = itertools.count()
         self.pending_jobs_lock = threading.Lock()
 
+        import psutil
         self.max_ram = int(psutil.virtual_memory().available / 2**20)
         self.max_cores = psutil.cpu_count()
         self.allocated_ram = 0
         self.allocated_cores = 0
+        self.admission = {}  # type: Dict[Any, Tuple[Optional[Text], Optional[int], int]]
+        self.running_tags = {}  # type: Dict[Text, int]
+        self.pool = None  # type: Optional[queue.Queue]
+        self.pool_workers = []  # type: List[threading.Thread]
+        self.pooled = 0  # jobs queued or running in the pool
+
+    def job_limits(self, job, runtime_context):
+        # type: (Any, RuntimeContext) -> Tuple[Optional[Text], Optional[int], int]
+        """Concurrency tag, limit on that tag and priority of a job."""
+        if isinstance(job, JobBatch):
+            job = job.jobs[0]
+        if not isinstance(job, JobBase):
+            return (None, None, 0)
+        hint = job.get_requirement(CONCURRENCY_LIMIT)[0] or {}
+        tag = hint.get("tag") or job.step_name
+        limit = dict(runtime_context.concurrency_limits).get(
+            tag, hint.get("maxConcurrent"))
+        priority = dict(runtime_context.job_priorities).get(
+            tag, hint.get("priority", 0))
+        return (tag, limit, priority)
+
+    @staticmethod
+    def job_resources(job):  # type: (Any) -> Optional[Dict[str, int]]
+        """Cores and ram held by a job while it runs, None if not counted."""
+        if isinstance(job, JobBase):
+            return job.builder.resources
+        if isinstance(job, JobBatch):
+            # the members run one after the other, as one TES task
+            # requests the largest of them
+            return {"ram": max(member.builder.resources["ram"]
+                               for member in job.jobs),
+                    "cores": max(member.builder.resources["cores"]
+                                 for member in job.jobs)}
+        return None
 
     def select_resources(self, request, runtime_context):  # pylint: disable=unused-argument
         # type: (Dict[str, int], RuntimeContext) -> Dict[str, int]
@@ -240,8 +301,8 @@ class MultithreadedJobExecutor(JobExecutor):
 
         return result
 
-    def _runner(self, job, runtime_context, TMPDIR_LOCK):
-        # type: (Union[JobBase, WorkflowJob, CallbackJob], RuntimeContext, threading.Lock) -> None
+    def _runner(self, job, runtime_context, TMPDIR_LOCK, tag=None):
+        # type: (Union[JobBase, WorkflowJob, CallbackJob], RuntimeContext, threading.Lock, Optional[Text]) -> None
         """Job running thread."""
 
         try:
@@ -257,48 +318,131 @@ class MultithreadedJobExecutor(JobExecutor):
             if runtime_context.workflow_eval_lock:
                 with runtime_context.workflow_eval_lock:
                     self.threads.remove(threading.current_thread())
-                    if isinstance(job, JobBase):
-                        self.allocated_ram -= job.builder.resources["ram"]
-                        self.allocated_cores -= job.builder.resources["cores"]
+                    resources = self.job_resources(job)
+                    if resources is not None:
+                        self.allocated_ram -= resources["ram"]
+                        self.allocated_cores -= resources["cores"]
+                    if tag is not None:
+                        self.running_tags[tag] -= 1
+                    runtime_context.workflow_eval_lock.notifyAll()
+
+    def _run_inline(self, job, runtime_context):
+        # type: (Union[ExpressionTool.ExpressionJob, CallbackJob, WorkflowJob], RuntimeContext) -> None
+        """Execute a cheap in-process job on the current thread."""
+        try:
+            job.run(runtime_context, TMPDIR_LOCK)
+        except WorkflowException as err:
+            _logger.exception("Got workflow error")
+            self.exceptions.append(err)
+        except Exception as err:  # pylint: disable=broad-except
+            _logger.exception("Got workflow error")
+            self.exceptions.append(WorkflowException(Text(err)))
+
+    def _pool_worker(self, pool):  # type: (queue.Queue) -> None
+        """Run pooled jobs until told to stop with None."""
+        while True:
+            item = pool.get()
+            if item is None:
+                return
+            job, runtime_context = item
+            try:
+                self._run_inline(job, runtime_context)
+            finally:
+                with runtime_context.workflow_eval_lock:
+                    self.pooled -= 1
                     runtime_context.workflow_eval_lock.notifyAll()
 
+    def _run_pooled(self, job, runtime_context):
+        # type: (Union[ExpressionTool.ExpressionJob, CallbackJob], RuntimeContext) -> None
+        """Hand a cheap in-process job to the worker pool."""
+        if self.pool is None:
+            self.pool = queue.Queue()
+            for _ in range(POOL_WORKERS):
+                worker = threading.Thread(target=self._pool_worker,
+                                          args=(self.pool,))
+                worker.daemon = True
+                worker.start()
+                self.pool_workers.append(worker)
+        # the job runs without the lock, its outputs are taken with it
+        output_callback = job.output_callback
+
+        def locked_output_callback(outputs, status):  # type: (Any, Text) -> None
+            with runtime_context.workflow_eval_lock:
+                output_callback(outputs, status)
+        job.output_callback = locked_output_callback
+        self.pooled += 1
+        self.pool.put((job, runtime_context))
+
+    def _stop_pool(self):  # type: () -> None
+        if self.pool is not None:
+            for _ in self.pool_workers:
+                self.pool.put(None)
+        self.pool = None
+        self.pool_workers = []
+
     def run_job(self,
                 job,             # type: Union[JobBase, WorkflowJob, None]
                 runtime_context  # type: RuntimeContext
                ):  # type: (...) -> None
-        """Execute a single Job in a seperate thread."""
+        """Execute a single Job in a seperate thread.
+
+        Workflow start jobs are run directly on the calling thread, which
+        holds the workflow evaluation lock; expression and cache hit jobs
+        by the worker pool.
+        """
+        if isinstance(job, INLINE_JOBS):
+            self._run_inline(job, runtime_context)
+            job = None
+        elif isinstance(job, POOLED_JOBS):
+            self._run_pooled(job, runtime_context)
+            job = None
         if job is not None:
             with self.pending_jobs_lock:
-                self.pending_jobs.append(job)
+                self.admission[job] = self.job_limits(job, runtime_context)
+                key = (-self.admission[job][2], next(self.arrivals))
+                index = bisect.bisect(self.pending_order, key)
+                self.pending_order.insert(index, key)
+                self.pending_jobs.insert(index, job)
         with self.pending_jobs_lock:
             n = 0
             while (n+1) <= len(self.pending_jobs):
                 job = self.pending_jobs[n]
-                if isinstance(job, JobBase):
-                    if ((job.builder.resources["ram"])
+                tag, limit, _ = self.admission[job]
+                if limit is not None \
+                        and self.running_tags.get(tag, 0) >= limit:
+                    _logger.debug(
+                        'Job "%s" cannot run yet, %d jobs tagged "%s" are '
+                        'already running', job.name, limit, tag)
+                    n += 1
+                    continue
+                resources = self.job_resources(job)
+                if resources is not None:
+                    if ((resources["ram"])
                         > self.max_ram
-                        or (job.builder.resources["cores"])
+                        or (resources["cores"])
                         > self.max_cores):
                         _logger.error(
                             'Job "%s" cannot be run, requests more resources (%s) '
                             'than available on this host (max ram %d, max cores %d',
-                            job.name, job.builder.resources,
+                            job.name, resources,
                             self.allocated_ram,
                             self.allocated_cores,
                             self.max_ram,
                             self.max_cores)
-                        self.pending_jobs.remove(job)
+                        del self.pending_jobs[n]
+                        del self.pending_order[n]
+                        del self.admission[job]
                         return
 
-                    if ((self.allocated_ram + job.builder.resources["ram"])
+                    if ((self.allocated_ram + resources["ram"])
                         > self.max_ram
-                        or (self.allocated_cores + job.builder.resources["cores"])
+                        or (self.allocated_cores + resources["cores"])
                         > self.max_cores):
                         _logger.debug(
                             'Job "%s" cannot run yet, resources (%s) are not '
                             'available (already allocated ram is %d, allocated cores is %d, '
                             'max ram %d, max cores %d',
-                            job.name, job.builder.resources,
+                            job.name, resources,
                             self.allocated_ram,
                             self.allocated_cores,
                             self.max_ram,
@@ -306,14 +450,20 @@ class MultithreadedJobExecutor(JobExecutor):
                         n += 1
                         continue
 
-                thread = threading.Thread(target=self._runner, args=(job, runtime_context, TMPDIR_LOCK))
+                if limit is None:
+                    tag = None
+                thread = threading.Thread(target=self._runner, args=(job, runtime_context, TMPDIR_LOCK, tag))
                 thread.daemon = True
                 self.threads.add(thread)
-                if isinstance(job, JobBase):
-                    self.allocated_ram += job.builder.resources["ram"]
-                    self.allocated_cores += job.builder.resources["cores"]
+                if resources is not None:
+                    self.allocated_ram += resources["ram"]
+                    self.allocated_cores += resources["cores"]
+                if tag is not None:
+                    self.running_tags[tag] = self.running_tags.get(tag, 0) + 1
                 thread.start()
-                self.pending_jobs.remove(job)
+                del self.pending_jobs[n]
+                del self.pending_order[n]
+                del self.admission[job]
 
     def wait_for_next_completion(self, runtime_context):
         # type: (RuntimeContext) -> None
@@ -331,6 +481,12 @@ class MultithreadedJobExecutor(JobExecutor):
                 ):  # type: (...) -> None
 
 
+        for tag, limit in runtime_context.concurrency_limits:
+            if limit < 1:
+                raise WorkflowException(
+                    "The concurrency limit of '%s' must be at least 1, got %s"
+                    % (tag, limit))
+
         jobiter = process.job(job_order_object, self.output_callback,
                               runtime_context)
 
@@ -339,26 +495,31 @@ class MultithreadedJobExecutor(JobExecutor):
                 "runtimeContext.workflow_eval_lock must not be None")
 
         runtime_context.workflow_eval_lock.acquire()
+        try:
+            for job in jobiter:
+                if job is not None:
+                    if isinstance(job, JobBase):
+                        job.builder = runtime_context.builder or job.builder
+                        if job.outdir is not None:
+                            self.output_dirs.add(job.outdir)
+                    elif isinstance(job, JobBatch):
+                        self.output_dirs.update(job.output_dirs())
 
-        for job in jobiter:
-            if job is not None:
-                if isinstance(job, JobBase):
-                    job.builder = runtime_context.builder or job.builder
-                    if job.outdir is not None:
-                        self.output_dirs.add(job.outdir)
-
-            self.run_job(job, runtime_context)
+                self.run_job(job, runtime_context)
 
-            if job is None:
-                if self.threads:
-                    self.wait_for_next_completion(runtime_context)
-                else:
-                    logger.error("Workflow cannot make any more progress.")
-                    break
+                if job is None:
+                    if self.threads or self.pooled:
+                        self.wait_for_next_completion(runtime_context)
+                    else:
+                        logger.error("Workflow cannot make any more progress.")
+                        break
 
-        self.run_job(None, runtime_context)
-        while self.threads:
-            self.wait_for_next_completion(runtime_context)
             self.run_job(None, runtime_context)
-
-        runtime_context.workflow_eval_lock.release()
+            while self.threads or self.pooled:
+                self.wait_for_next_completion(runtime_context)
+                self.run_job(None, runtime_context)
+        finally:
+            runtime_context.workflow_eval_lock.release()
+            self._stop_pool()
+        if self.exceptions:
+            raise self.exceptions[0]
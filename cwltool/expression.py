@@ -1,10 +1,10 @@
 """Parse CWL expressions."""
 from __future__ import absolute_import
 
-import copy
 import re
-from typing import (Any, Dict, List, Mapping, MutableMapping, MutableSequence, Optional,
-                    Union)
+import time
+from typing import (Any, Dict, Iterator, List, Mapping, MutableMapping,
+                    MutableSequence, Optional, Tuple, Union)
 
 import six
 from six import string_types, u
@@ -12,19 +12,23 @@ from future.utils import raise_from
 from typing_extensions import Text  # pylint: disable=unused-import
 # move to a regular typing import when Python 3.3-3.6 is no longer supported
 
-from .sandboxjs import default_timeout, execjs, JavascriptException
+from . import expression_profiler
+from .sandboxjs import (default_timeout, execjs, execjs_batch,
+                       JavascriptException)
 from .errors import WorkflowException
 from .utils import bytes2str_in_dicts, docker_windows_path_adjust, json_dumps
 
 
-def jshead(engine_config, rootvars):
-    # type: (List[Text], Dict[Text, Any]) -> Text
+def jshead(engine_config, rootvars, encoded=None):
+    # type: (List[Text], Dict[Text, Any], Optional[Dict[Text, Text]]) -> Text
 
     # make sure all the byte strings are converted
     # to str in `rootvars` dict.
 
+    encoded = encoded or {}
     return u"\n".join(
-        engine_config + [u"var {} = {};".format(k, json_dumps(v, indent=4))
+        engine_config + [u"var {} = {};".format(
+            k, encoded[k] if k in encoded else json_dumps(v, indent=4))
                          for k, v in rootvars.items()])
 
 
@@ -166,6 +170,124 @@ def next_seg(parsed_string, remaining_string, current_value):  # type: (Text, Te
         return current_value
 
 
+class ParameterReference(object):
+    """A parameter reference such as ``(inputs.reads[0].basename)``, parsed.
+
+    Resolving it gives the same values and errors as next_seg(), without
+    matching the regular expressions again.
+    """
+
+    __slots__ = ("first_symbol", "segments")
+
+    def __init__(self, first_symbol, remaining_string):  # type: (Text, Text) -> None
+        """Split ``remaining_string`` into the keys to look up."""
+        self.first_symbol = first_symbol
+        # (parsed string for error messages, key, is the last segment)
+        self.segments = []  # type: List[Tuple[Text, Union[Text, int], bool]]
+        parsed_string = first_symbol
+        while remaining_string:
+            m = segment_re.match(remaining_string)
+            if not m:
+                break
+            next_segment_str = m.group(0)
+            key = None  # type: Optional[Union[Text, int]]
+            if next_segment_str[0] == '.':
+                key = next_segment_str[1:]
+            elif next_segment_str[1] in ("'", '"'):
+                key = next_segment_str[2:-2].replace("\\'", "'").replace('\\"', '"')
+            else:
+                key = int(next_segment_str[1:-1])
+            self.segments.append(
+                (parsed_string, key, not remaining_string[m.end(0):]))
+            parsed_string += remaining_string
+            remaining_string = remaining_string[m.end(0):]
+
+    def resolve(self, obj):  # type: (Dict[Text, Any]) -> JSON
+        if obj.get(self.first_symbol) is None:
+            raise WorkflowException("%s is not defined" % self.first_symbol)
+        current_value = obj[self.first_symbol]
+        for parsed_string, key, last in self.segments:
+            if isinstance(key, int):
+                if not isinstance(current_value, MutableSequence):
+                    raise WorkflowException("%s is a %s, cannot index on int '%s'" % (parsed_string, type(current_value).__name__, key))
+                if key >= len(current_value):
+                    raise WorkflowException("%s list index %i out of range" % (parsed_string, key))
+            else:
+                if isinstance(current_value, MutableSequence) and key == "length" and last:
+                    return len(current_value)
+                if not isinstance(current_value, MutableMapping):
+                    raise WorkflowException("%s is a %s, cannot index on string '%s'" % (parsed_string, type(current_value).__name__, key))
+                if key not in current_value:
+                    raise WorkflowException("%s does not contain key '%s'" % (parsed_string, key))
+            if isinstance(current_value, Mapping) \
+                    or (isinstance(current_value, list) and isinstance(key, int)):
+                current_value = current_value[key]
+            else:
+                raise WorkflowException("%s doesn't have property %s" % (parsed_string, key))
+        return current_value
+
+
+# Parsed forms of the expression strings seen so far; the same few strings
+# are evaluated for every job of a scatter.
+_CACHE_LIMIT = 10000
+_parameter_references = {}  # type: Dict[Text, Optional[ParameterReference]]
+_interpolations = {}  # type: Dict[Text, Tuple[Tuple[Text, ...], Tuple[int, ...]]]
+
+
+def _remember(cache, key, value):
+    # type: (Dict[Text, Any], Text, Any) -> Any
+    if len(cache) >= _CACHE_LIMIT:
+        cache.clear()
+    cache[key] = value
+    return value
+
+
+def compile_param_reference(ex):  # type: (Text) -> Optional[ParameterReference]
+    """Parse ``ex`` if it is a parameter reference, or return None."""
+    try:
+        return _parameter_references[ex]
+    except KeyError:
+        pass
+    match = param_re.match(ex)
+    ref = None
+    if match is not None:
+        ref = ParameterReference(match.group(1), ex[match.end(1):-1])
+    return _remember(_parameter_references, ex, ref)
+
+
+def param_reference(ex, obj):
+    # type: (Text, Dict[Text, Any]) -> Tuple[bool, JSON, Optional[WorkflowException]]
+    """Try to evaluate ``ex`` as a parameter reference without Javascript.
+
+    Returns whether that succeeded, the value, and the error if ``ex`` looked
+    like a parameter reference but could not be resolved.
+    """
+    ref = compile_param_reference(ex)
+    if ref is None:
+        return (False, None, None)
+
+    if not ref.segments and ref.first_symbol == "null":
+        return (True, None, None)
+    try:
+        return (True, ref.resolve(obj), None)
+    except WorkflowException as werr:
+        return (False, None, werr)
+
+
+def param_reference_error(ex, expression_parse_exception):
+    # type: (Text, Optional[WorkflowException]) -> JavascriptException
+    if expression_parse_exception is not None:
+        return JavascriptException(
+            "Syntax error in parameter reference '%s': %s. This could be "
+            "due to using Javascript code without specifying "
+            "InlineJavascriptRequirement." % \
+                (ex[1:-1], expression_parse_exception))
+    return JavascriptException(
+        "Syntax error in parameter reference '%s'. This could be due "
+        "to using Javascript code without specifying "
+        "InlineJavascriptRequirement." % ex)
+
+
 def evaluator(ex,                       # type: Text
               jslib,                    # type: Text
               obj,                      # type: Dict[Text, Any]
@@ -176,43 +298,94 @@ def evaluator(ex,                       # type: Text
               js_console=False          # type: bool
              ):
     # type: (...) -> JSON
-    match = param_re.match(ex)
-
-    expression_parse_exception = None
-    expression_parse_succeeded = False
-
-    if match is not None:
-        first_symbol = match.group(1)
-        first_symbol_end = match.end(1)
-
-        if first_symbol_end + 1 == len(ex) and first_symbol == "null":
-            return None
-        try:
-            if obj.get(first_symbol) is None:
-                raise WorkflowException("%s is not defined" % first_symbol)
+    return evaluate_all([ex], jslib, obj, timeout, fullJS=fullJS,
+                        force_docker_pull=force_docker_pull, debug=debug,
+                        js_console=js_console)[0]
+
+
+def evaluate_all(expressions,              # type: List[Text]
+                 jslib,                    # type: Text
+                 obj,                      # type: Dict[Text, Any]
+                 timeout,                  # type: float
+                 fullJS=False,             # type: bool
+                 force_docker_pull=False,  # type: bool
+                 debug=False,              # type: bool
+                 js_console=False          # type: bool
+                ):
+    # type: (...) -> List[JSON]
+    """Evaluate a list of expressions, the ``(...)`` or ``{...}`` of each.
+
+    Parameter references are resolved directly; all the others are sent
+    to the Javascript engine together in a single request.
+    """
+    results = []  # type: List[JSON]
+    javascript = []  # type: List[int]
+    for ex in expressions:
+        succeeded, value, werr = param_reference(ex, obj)
+        if not succeeded:
+            if not fullJS:
+                raise param_reference_error(ex, werr)
+            javascript.append(len(results))
+        results.append(value)
+
+    if len(javascript) == 1:
+        results[javascript[0]] = execjs(
+            expressions[javascript[0]], jslib, timeout,
+            force_docker_pull=force_docker_pull, debug=debug,
+            js_console=js_console)
+    elif javascript:
+        values = execjs_batch(
+            [expressions[i] for i in javascript], jslib, timeout,
+            force_docker_pull=force_docker_pull, debug=debug,
+            js_console=js_console)
+        for i, value in zip(javascript, values):
+            results[i] = value
+    return results
+
+
+def split_interpolation(scan):
+    # type: (Text) -> Tuple[Tuple[Text, ...], Tuple[int, ...]]
+    """Split a string into literal text and the expressions it contains.
+
+    Returns the parts of the string and the positions of the expressions
+    among them.  Results are cached by string.
+    """
+    try:
+        return _interpolations[scan]
+    except KeyError:
+        pass
+    original = scan
+    parts = []  # type: List[Text]
+    slots = []  # type: List[int]
+    w = scanner(scan)
+    while w:
+        parts.append(scan[0:w[0]])
 
-            return next_seg(first_symbol, ex[first_symbol_end:-1], obj[first_symbol])
-        except WorkflowException as werr:
-            expression_parse_exception = werr
-        else:
-            expression_parse_succeeded = True
+        if scan[w[0]] == '$':
+            slots.append(len(parts))
+            parts.append(scan[w[0] + 1:w[1]])
+        elif scan[w[0]] == '\\':
+            e = scan[w[1] - 1]
+            parts.append(e)
 
-    if fullJS and not expression_parse_succeeded:
-        return execjs(
-            ex, jslib, timeout, force_docker_pull=force_docker_pull,
-            debug=debug, js_console=js_console)
-    else:
-        if expression_parse_exception is not None:
-            raise JavascriptException(
-                "Syntax error in parameter reference '%s': %s. This could be "
-                "due to using Javascript code without specifying "
-                "InlineJavascriptRequirement." % \
-                    (ex[1:-1], expression_parse_exception))
-        else:
-            raise JavascriptException(
-                "Syntax error in parameter reference '%s'. This could be due "
-                "to using Javascript code without specifying "
-                "InlineJavascriptRequirement." % ex)
+        scan = scan[w[1]:]
+        w = scanner(scan)
+    parts.append(scan)
+    return _remember(_interpolations, original, (tuple(parts), tuple(slots)))
+
+
+def fill_interpolation(parts, slots, values):
+    # type: (Tuple[Text, ...], Tuple[int, ...], Iterator[JSON]) -> JSON
+    """Substitute the values of the expressions of split_interpolation()."""
+    if slots == (1,) and len(parts) == 3 and not parts[0] and not parts[2]:
+        return next(values)
+    parts = list(parts)
+    for slot in slots:
+        leaf = json_dumps(next(values), sort_keys=True)
+        if leaf[0] == '"':
+            leaf = leaf[1:-1]
+        parts[slot] = leaf
+    return ''.join(parts)
 
 
 def interpolate(scan,                     # type: Text
@@ -227,34 +400,91 @@ def interpolate(scan,                     # type: Text
                ):  # type: (...) -> JSON
     if strip_whitespace:
         scan = scan.strip()
-    parts = []
-    w = scanner(scan)
-    while w:
-        parts.append(scan[0:w[0]])
-
-        if scan[w[0]] == '$':
-            e = evaluator(scan[w[0] + 1:w[1]], jslib, rootvars, timeout,
-                          fullJS=fullJS, force_docker_pull=force_docker_pull,
-                          debug=debug, js_console=js_console)
-            if w[0] == 0 and w[1] == len(scan) and len(parts) <= 1:
-                return e
-            leaf = json_dumps(e, sort_keys=True)
-            if leaf[0] == '"':
-                leaf = leaf[1:-1]
-            parts.append(leaf)
-        elif scan[w[0]] == '\\':
-            e = scan[w[1] - 1]
-            parts.append(e)
-
-        scan = scan[w[1]:]
-        w = scanner(scan)
-    parts.append(scan)
-    return ''.join(parts)
+    parts, slots = split_interpolation(scan)
+    values = evaluate_all([parts[slot] for slot in slots], jslib, rootvars,
+                          timeout, fullJS=fullJS,
+                          force_docker_pull=force_docker_pull, debug=debug,
+                          js_console=js_console)
+    return fill_interpolation(parts, slots, iter(values))
 
 def needs_parsing(snippet):  # type: (Any) -> bool
     return isinstance(snippet, string_types) \
         and ("$(" in snippet or "${" in snippet)
 
+
+def _rootvars(jobinput, resources, outdir, tmpdir, context, inputs_json=None):
+    # type: (Dict[Text, JSON], Dict[str, int], Optional[Text], Optional[Text], Any, Optional[Text]) -> Dict[Text, Any]
+    runtime = dict(resources)  # type: Dict[str, Any]
+    runtime["tmpdir"] = docker_windows_path_adjust(tmpdir) if tmpdir else None
+    runtime["outdir"] = docker_windows_path_adjust(outdir) if outdir else None
+
+    # TODO: need to make sure the `rootvars dict`
+    # contains no bytes type in the first place.
+    if six.PY3:
+        if inputs_json is None:
+            jobinput = bytes2str_in_dicts(jobinput)  # type: ignore
+        context = bytes2str_in_dicts(context)
+
+    return {
+        u"inputs": jobinput,
+        u"self": context,
+        u"runtime": runtime}
+
+
+def _javascript(requirements, rootvars, inputs_json=None):
+    # type: (List[Dict[Text, Any]], Dict[Text, Any], Optional[Text]) -> Tuple[bool, Text]
+    for r in reversed(requirements):
+        if r["class"] == "InlineJavascriptRequirement":
+            encoded = {u"inputs": inputs_json} if inputs_json is not None else None
+            return True, jshead(r.get("expressionLib", []), rootvars, encoded)
+    return False, u""
+
+
+LITERAL = "literal"
+PARAMETER = "parameter"
+JAVASCRIPT = "javascript"
+
+
+def classify(value):  # type: (Any) -> Text
+    """Whether ``value`` is a literal, only parameter references, or Javascript."""
+    if not needs_parsing(value):
+        return LITERAL
+    try:
+        parts, slots = split_interpolation(value.strip())
+    except SubstitutionError:
+        return JAVASCRIPT
+    return evaluation_path(parts, slots, True)
+
+
+def classify_expressions(document):
+    # type: (Any) -> Dict[Text, Text]
+    """Classify every string of ``document`` that contains an expression.
+
+    Only PARAMETER and JAVASCRIPT strings are returned, by text; literal
+    strings are everything else.  This also fills the parsing caches.
+    """
+    kinds = {}  # type: Dict[Text, Text]
+    stack = [document]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, MutableMapping):
+            stack.extend(node.values())
+        elif isinstance(node, MutableSequence):
+            stack.extend(node)
+        elif needs_parsing(node) and node not in kinds:
+            kinds[node] = classify(node)
+    return kinds
+
+
+def evaluation_path(parts, slots, fullJS):
+    # type: (Tuple[Text, ...], Tuple[int, ...], bool) -> Text
+    """Whether expressions are resolved as "parameter" references or with "javascript"."""
+    if fullJS and any(compile_param_reference(parts[slot]) is None
+                      for slot in slots):
+        return JAVASCRIPT
+    return PARAMETER
+
+
 def do_eval(ex,                       # type: Union[Text, Dict[Text, Text]]
             jobinput,                 # type: Dict[Text, JSON]
             requirements,             # type: List[Dict[Text, Any]]
@@ -266,31 +496,30 @@ def do_eval(ex,                       # type: Union[Text, Dict[Text, Text]]
             force_docker_pull=False,  # type: bool
             debug=False,              # type: bool
             js_console=False,         # type: bool
-            strip_whitespace=True     # type: bool
+            strip_whitespace=True,    # type: bool
+            inputs_json=None          # type: Optional[Text]
            ):  # type: (...) -> Any
+    """Evaluate ``ex`` if it contains expressions.
 
-    runtime = copy.deepcopy(resources)  # type: Dict[str, Any]
-    runtime["tmpdir"] = docker_windows_path_adjust(tmpdir) if tmpdir else None
-    runtime["outdir"] = docker_windows_path_adjust(outdir) if outdir else None
-
-    rootvars = {
-        u"inputs": jobinput,
-        u"self": context,
-        u"runtime": runtime}
-
-    # TODO: need to make sure the `rootvars dict`
-    # contains no bytes type in the first place.
-    if six.PY3:
-        rootvars = bytes2str_in_dicts(rootvars)  # type: ignore
+    ``inputs_json`` is the JSON encoding of ``jobinput`` when the caller
+    keeps one for inputs that no longer change; it is then used as is for
+    the Javascript engine and ``jobinput`` is not scanned for byte strings.
+    """
 
     if isinstance(ex, string_types) and needs_parsing(ex):
-        fullJS = False
-        jslib = u""
-        for r in reversed(requirements):
-            if r["class"] == "InlineJavascriptRequirement":
-                fullJS = True
-                jslib = jshead(r.get("expressionLib", []), rootvars)
-                break
+        profiler = expression_profiler.profiler
+        start = time.time()
+        rootvars = _rootvars(jobinput, resources, outdir, tmpdir, context,
+                             inputs_json)
+        fullJS, jslib = _javascript(requirements, rootvars, inputs_json)
+        path = JAVASCRIPT if fullJS else PARAMETER
+        if profiler is not None:
+            try:
+                parts, slots = split_interpolation(
+                    ex.strip() if strip_whitespace else ex)
+                path = evaluation_path(parts, slots, fullJS)
+            except SubstitutionError:
+                pass  # reported by interpolate() below
 
         try:
             return interpolate(ex,
@@ -305,5 +534,97 @@ def do_eval(ex,                       # type: Union[Text, Dict[Text, Text]]
 
         except Exception as e:
             raise_from(WorkflowException("Expression evaluation error:\n%s" % Text(e)), e)
+        finally:
+            if profiler is not None:
+                profiler.record(ex, path, time.time() - start)
     else:
         return ex
+
+
+def do_eval_parameters(ex,                   # type: Text
+                       jobinput,             # type: Dict[Text, JSON]
+                       outdir,               # type: Optional[Text]
+                       tmpdir,               # type: Optional[Text]
+                       resources,            # type: Dict[str, int]
+                       context=None,         # type: Any
+                       strip_whitespace=True,  # type: bool
+                       inputs_json=None      # type: Optional[Text]
+                      ):  # type: (...) -> Any
+    """Evaluate a string classified as PARAMETER, without Javascript.
+
+    Raises WorkflowException when a reference cannot be resolved; with
+    InlineJavascriptRequirement the caller should then evaluate ``ex``
+    with do_eval(), as Javascript may still give it a value.
+    """
+    profiler = expression_profiler.profiler
+    start = time.time()
+    scan = ex.strip() if strip_whitespace else ex
+    parts, slots = split_interpolation(scan)
+    rootvars = _rootvars(jobinput, resources, outdir, tmpdir, context,
+                         inputs_json)
+    values = [param_reference(parts[slot], rootvars) for slot in slots]
+    for succeeded, _, werr in values:
+        if not succeeded:
+            raise WorkflowException(
+                "Expression evaluation error:\n%s" % Text(werr))
+    # only successes: on failure the caller evaluates ``ex`` with do_eval(),
+    # which records it
+    result = fill_interpolation(parts, slots, iter(v[1] for v in values))
+    if profiler is not None:
+        profiler.record(ex, PARAMETER, time.time() - start)
+    return result
+
+
+def do_eval_batch(exprs,                    # type: List[Any]
+                  jobinput,                 # type: Dict[Text, JSON]
+                  requirements,             # type: List[Dict[Text, Any]]
+                  outdir,                   # type: Optional[Text]
+                  tmpdir,                   # type: Optional[Text]
+                  resources,                # type: Dict[str, int]
+                  context=None,             # type: Any
+                  timeout=default_timeout,  # type: float
+                  force_docker_pull=False,  # type: bool
+                  debug=False,              # type: bool
+                  js_console=False,         # type: bool
+                  strip_whitespace=True,    # type: bool
+                  inputs_json=None          # type: Optional[Text]
+                 ):  # type: (...) -> List[Any]
+    """Evaluate several expressions with the same inputs and ``self``.
+
+    Like do_eval() for each item of ``exprs``, but the Javascript fragments
+    of all of them are evaluated in a single request to the engine.
+    """
+    results = list(exprs)
+    templates = []  # type: List[Tuple[int, Tuple[Text, ...], Tuple[int, ...]]]
+    fragments = []  # type: List[Text]
+    for i, ex in enumerate(exprs):
+        if isinstance(ex, string_types) and needs_parsing(ex):
+            parts, slots = split_interpolation(
+                ex.strip() if strip_whitespace else ex)
+            templates.append((i, parts, slots))
+            fragments.extend(parts[slot] for slot in slots)
+    if not templates:
+        return results
+
+    profiler = expression_profiler.profiler
+    start = time.time()
+    rootvars = _rootvars(jobinput, resources, outdir, tmpdir, context,
+                         inputs_json)
+    fullJS, jslib = _javascript(requirements, rootvars, inputs_json)
+    try:
+        values = iter(evaluate_all(fragments, jslib, rootvars, timeout,
+                                   fullJS=fullJS,
+                                   force_docker_pull=force_docker_pull,
+                                   debug=debug, js_console=js_console))
+        for i, parts, slots in templates:
+            results[i] = fill_interpolation(parts, slots, values)
+    except Exception as e:
+        raise_from(WorkflowException("Expression evaluation error:\n%s" % Text(e)), e)
+    finally:
+        if profiler is not None:
+            # the batch is shared evenly between its expressions
+            share = (time.time() - start) / len(templates)
+            for i, parts, slots in templates:
+                profiler.record(exprs[i], evaluation_path(parts, slots, fullJS),
+                                share)
+    return results
@@ -0,0 +1,148 @@
+"""Opt-in profiling of CWL expression evaluation."""
+from __future__ import absolute_import
+
+import json
+import random
+import threading
+from typing import Any, Dict, List, MutableMapping, MutableSequence, Optional
+
+from schema_salad.sourceline import SourceLine
+from six import iteritems, string_types
+from typing_extensions import Text  # pylint: disable=unused-import
+# move to a regular typing import when Python 3.3-3.6 is no longer supported
+
+# Latency samples kept per expression to estimate the 99th percentile.
+MAX_SAMPLES = 10000
+
+
+class _Timings(object):
+    __slots__ = ("count", "total", "samples")
+
+    def __init__(self):  # type: () -> None
+        self.count = 0
+        self.total = 0.0
+        self.samples = []  # type: List[float]
+
+    def add(self, seconds):  # type: (float) -> None
+        self.count += 1
+        self.total += seconds
+        if len(self.samples) < MAX_SAMPLES:
+            self.samples.append(seconds)
+        else:
+            # reservoir sampling keeps a uniform sample of all calls
+            index = random.randint(0, self.count - 1)
+            if index < MAX_SAMPLES:
+                self.samples[index] = seconds
+
+    def summary(self):  # type: () -> Dict[Text, Any]
+        samples = sorted(self.samples)
+        return {"count": self.count,
+                "total_seconds": self.total,
+                "p99_seconds": samples[max(int(len(samples) * 0.99) - 1, 0)]
+                               if samples else None}
+
+
+class ExpressionProfiler(object):
+    """Count and time expression evaluations.
+
+    Evaluations are keyed by expression text and by how they were computed:
+    "parameter" when every fragment was a parameter reference resolved
+    without Javascript, "javascript" otherwise.  The time spent in the
+    Javascript engine itself is recorded per engine.
+    """
+
+    def __init__(self):  # type: () -> None
+        """Initialize."""
+        self.expressions = {}  # type: Dict[Any, _Timings]
+        self.engines = {}  # type: Dict[Text, _Timings]
+        self._lock = threading.Lock()
+
+    def record(self, expression, path, seconds):
+        # type: (Text, Text, float) -> None
+        """Record one evaluation of ``expression``."""
+        with self._lock:
+            timings = self.expressions.get((expression, path))
+            if timings is None:
+                timings = self.expressions[(expression, path)] = _Timings()
+            timings.add(seconds)
+
+    def record_engine(self, engine, seconds):  # type: (Text, float) -> None
+        """Record one request to a Javascript engine."""
+        with self._lock:
+            timings = self.engines.get(engine)
+            if timings is None:
+                timings = self.engines[engine] = _Timings()
+            timings.add(seconds)
+
+    def report(self, documents=()):
+        # type: (Any) -> Dict[Text, Any]
+        """Summarize the recorded evaluations, most expensive first.
+
+        Expressions are located in ``documents`` (loaded CWL documents
+        that keep their line numbers) by their text.
+        """
+        locations = find_locations(documents)
+        with self._lock:
+            expressions = []
+            for (expression, path), timings in iteritems(self.expressions):
+                entry = timings.summary()
+                entry.update({
+                    "expression": expression,
+                    "path": path,
+                    "locations": locations.get(expression.strip(), [])})
+                expressions.append(entry)
+            engines = dict((engine, timings.summary())
+                           for engine, timings in iteritems(self.engines))
+        expressions.sort(key=lambda e: e["total_seconds"], reverse=True)
+        return {"expressions": expressions, "engines": engines}
+
+    def dump(self, path, documents=()):  # type: (Text, Any) -> None
+        """Write the report as JSON to ``path``."""
+        with open(path, "w") as handle:
+            json.dump(self.report(documents), handle, indent=4)
+
+
+def find_locations(documents):
+    # type: (Any) -> Dict[Text, List[Text]]
+    """Map the text of every expression in ``documents`` to where it is."""
+    locations = {}  # type: Dict[Text, List[Text]]
+    seen = set()  # type: set
+
+    def visit(node):  # type: (Any) -> None
+        if id(node) in seen:
+            return
+        seen.add(id(node))
+        if isinstance(node, MutableMapping):
+            items = list(iteritems(node))
+        elif isinstance(node, MutableSequence):
+            items = list(enumerate(node))
+        else:
+            return
+        for key, value in items:
+            if isinstance(value, string_types):
+                lc = getattr(node, "lc", None)
+                if ("$(" in value or "${" in value) and lc is not None \
+                        and lc.data is not None and key in lc.data:
+                    lead = SourceLine(node, key).makeLead()
+                    # "test" is what cmap() names documents built in memory
+                    if lead and not lead.startswith("test:"):
+                        where = locations.setdefault(value.strip(), [])
+                        if lead.rstrip(":") not in where:
+                            where.append(lead.rstrip(":"))
+            else:
+                visit(value)
+
+    for document in documents:
+        visit(document)
+    return locations
+
+
+profiler = None  # type: Optional[ExpressionProfiler]
+
+
+def enable():  # type: () -> ExpressionProfiler
+    """Start profiling expression evaluation in this process."""
+    global profiler  # pylint: disable=global-statement
+    if profiler is None:
+        profiler = ExpressionProfiler()
+    return profiler
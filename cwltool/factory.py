@@ -10,6 +10,7 @@ from typing_extensions import Text  # pylint: disable=unused-import
 from . import load_tool
 from .context import LoadingContext, RuntimeContext
 from .executors import SingleJobExecutor
+from .incremental import IncrementalLoader
 from .process import Process
 
 
@@ -55,10 +56,18 @@ class Factory(object):
             self.runtime_context = RuntimeContext()
         else:
             self.runtime_context = runtime_context
+        # documents are loaded again only where their files changed, unless
+        # the caller manages the loader
+        self.incremental_loader = None  # type: Optional[IncrementalLoader]
+        if self.loading_context.loader is None:
+            self.incremental_loader = IncrementalLoader(self.loading_context)
 
     def make(self, cwl):  # type: (Union[Text, Dict[Text, Any]]) -> Callable
         """Instantiate a CWL object from a CWl document."""
-        load = load_tool.load_tool(cwl, self.loading_context)
+        if self.incremental_loader is not None:
+            load = self.incremental_loader.load_tool(cwl)
+        else:
+            load = load_tool.load_tool(cwl, self.loading_context)
         if isinstance(load, int):
             raise Exception("Error loading tool")
         return Callable(load, self)
@@ -0,0 +1,160 @@
+"""Detection of workflow steps that can be fused into a single job.
+
+A chain of steps A -> B -> ... is fusible when each link passes only
+File outputs with a predictable name from one step to the next, so the
+downstream job can be built before the upstream one has run and both
+can be executed back to back on the same node.
+
+The files passed along a chain only exist inside the fused job, under
+fused: locations, so no step outside the chain nor workflow output may
+see them: the outputs of all but the last step must be used by the next
+step only, and the steps after the first may not hand their inputs on as
+outputs.
+"""
+from __future__ import absolute_import
+
+import glob
+import posixpath
+from typing import Any, Dict, List, MutableMapping, Optional
+
+from six import string_types
+from typing_extensions import Text  # pylint: disable=unused-import
+# move to a regular typing import when Python 3.3-3.6 is no longer supported
+
+from .pathmapper import fused_location
+from .process import Process, shortname  # pylint: disable=unused-import
+from .utils import aslist
+
+_UNFUSIBLE_REQUIREMENTS = (
+    "HelmRequirement",
+    "InitialWorkDirRequirement",
+    "InplaceUpdateRequirement",
+    "http://commonwl.org/cwltool#InplaceUpdateRequirement",
+    "http://commonwl.org/cwltool#ScatterBatch")
+
+
+def _container_key(step):  # type: (Process) -> Optional[Any]
+    """What must be equal for two steps to share a task, or None."""
+    tool = step.embedded_tool
+    if tool.tool["class"] != "CommandLineTool" or "scatter" in step.tool:
+        return None
+    for feature in _UNFUSIBLE_REQUIREMENTS:
+        if tool.get_requirement(feature)[0]:
+            return None
+    docker_req = tool.get_requirement("DockerRequirement")[0]
+    if docker_req is None or "dockerOutputDirectory" in docker_req:
+        return None
+    image = docker_req.get("dockerPull", docker_req.get("dockerImageId"))
+    if image is None:
+        return None
+    resources = tool.get_requirement("ResourceRequirement")[0]
+    return (image, sorted(resources.items()) if resources else None)
+
+
+def _predictable_output(param):  # type: (MutableMapping[Text, Any]) -> bool
+    binding = param.get("outputBinding")
+    if param.get("type") != "File" or not binding \
+            or set(binding) != {"glob"} or "secondaryFiles" in param:
+        return False
+    pattern = binding["glob"]
+    return bool(isinstance(pattern, string_types) and pattern
+                and "$(" not in pattern and "${" not in pattern
+                and not glob.has_magic(pattern)
+                and not posixpath.isabs(pattern)
+                and ".." not in pattern.split("/"))
+
+
+def _keeps_inputs_inside(param):  # type: (MutableMapping[Text, Any]) -> bool
+    """Whether an output cannot be made of the step's input files.
+
+    Those may be fused: locations, which mean nothing outside the chain.
+    """
+    binding = param.get("outputBinding") or {}
+    if "outputEval" in binding:
+        return False
+    return not any(isinstance(pattern, string_types) and "inputs" in pattern
+                   and ("$(" in pattern or "${" in pattern)
+                   for pattern in aslist(binding.get("glob", [])))
+
+
+def fusible_chains(workflow):
+    # type: (Any) -> Dict[Text, List[Text]]
+    """Find the linear chains of steps of ``workflow`` that can be fused.
+
+    Returns a mapping from the id of the first step of each chain to the
+    ids of all the steps in the chain, in execution order.
+    """
+    workflow_inputs = set(i["id"] for i in workflow.tool["inputs"])
+    consumers = {}  # type: Dict[Text, List[Optional[Text]]]
+    for step in workflow.steps:
+        for inp in step.tool["inputs"]:
+            for src in aslist(inp.get("source", [])):
+                consumers.setdefault(src, []).append(step.id)
+    for out in workflow.tool["outputs"]:
+        for src in aslist(out.get("outputSource", [])):
+            consumers.setdefault(src, []).append(None)
+
+    producer = {}  # type: Dict[Text, Any]
+    for step in workflow.steps:
+        for out in step.tool["outputs"]:
+            producer[out["id"]] = step
+
+    def downstream(step):  # type: (Any) -> Optional[Any]
+        outputs = step.tool["outputs"]
+        if not outputs or not all(_predictable_output(o) for o in outputs):
+            return None
+        targets = set()
+        for out in outputs:
+            targets.update(consumers.get(out["id"], [None]))
+        if len(targets) != 1 or None in targets:
+            return None
+        target_id = targets.pop()
+        target = [s for s in workflow.steps if s.id == target_id][0]
+        if not all(_keeps_inputs_inside(o) for o in target.tool["outputs"]):
+            return None
+        for inp in target.tool["inputs"]:
+            if "valueFrom" in inp:
+                return None
+            for src in aslist(inp.get("source", [])):
+                if src in workflow_inputs:
+                    continue
+                if producer.get(src) is not step:
+                    return None
+                binding = inp.get("inputBinding") or {}
+                if "secondaryFiles" in inp or "format" in inp \
+                        or inp.get("loadContents") \
+                        or binding.get("loadContents"):
+                    return None
+        return target
+
+    links = {}  # type: Dict[Text, Text]
+    for step in workflow.steps:
+        key = _container_key(step)
+        if key is None:
+            continue
+        target = downstream(step)
+        if target is not None and _container_key(target) == key:
+            links[step.id] = target.id
+
+    chains = {}  # type: Dict[Text, List[Text]]
+    heads = set(links) - set(links.values())
+    for head in heads:
+        chain = [head]
+        while chain[-1] in links:
+            chain.append(links[chain[-1]])
+        chains[head] = chain
+    return chains
+
+
+def predict_outputs(step, builder):
+    # type: (Any, Any) -> Dict[Text, Dict[Text, Any]]
+    """File objects a fused step will produce in its output directory."""
+    outputs = {}
+    for param in step.tool["outputs"]:
+        pattern = param["outputBinding"]["glob"]
+        outputs[shortname(param["id"])] = {
+            "class": "File",
+            "location": fused_location(
+                posixpath.join(builder.outdir, pattern)),
+            "basename": posixpath.basename(pattern)}
+    return outputs
@@ -0,0 +1,170 @@
+"""Load CWL documents again in a long-lived process, redoing what changed."""
+from __future__ import absolute_import
+
+import os
+import threading
+from typing import (Any, Callable, Dict, Optional,  # pylint: disable=unused-import
+                    Set, Tuple, Union)
+
+import requests.sessions  # pylint: disable=unused-import
+from schema_salad.ref_resolver import (DefaultFetcher,  # pylint: disable=unused-import
+                                       Fetcher, uri_file_path)
+from six import string_types
+from six.moves import urllib
+from typing_extensions import Text  # pylint: disable=unused-import
+# move to a regular typing import when Python 3.3-3.6 is no longer supported
+
+from .context import LoadingContext  # pylint: disable=unused-import
+from .document_cache import file_digest
+from .load_tool import default_loader, load_tool, resolve_tool_uri
+from .loghandler import _logger
+from .process import Process  # pylint: disable=unused-import
+
+
+def file_stamp(url):  # type: (Text) -> Optional[Tuple[float, int]]
+    """Modification time and size of a file: URL, None if it cannot be read."""
+    if not url.startswith("file:"):
+        return None
+    try:
+        stat = os.stat(uri_file_path(str(url)))
+    except OSError:
+        return None
+    return stat.st_mtime, stat.st_size
+
+
+class IncrementalLoader(object):
+    """Loads CWL documents, reusing the work done for unchanged files.
+
+    One loader index is kept from a load to the next, and every file read
+    is remembered with its modification time, size and hash.  Before each
+    load, the files that changed are removed from the index together with
+    the documents that reference them, as recorded by Loader.prefetch, so
+    only those are read, resolved and validated again.  Loading a document
+    none of whose files changed returns the Process made the last time.
+    """
+
+    def __init__(self, loadingContext):  # type: (LoadingContext) -> None
+        """Load with the options of ``loadingContext``, as they are then."""
+        self.loadingContext = loadingContext
+        self.loader = None  # type: Any
+        # stamp and hash of each file read
+        self.files = {}  # type: Dict[Text, Tuple[Optional[Tuple[float, int]], Optional[Text]]]
+        # the Process made for each document, and the files it was made from
+        self.tools = {}  # type: Dict[Text, Tuple[Process, Set[Text]]]
+        # the documents resolved and validated, see load_tool.fetch_document
+        self.processed = {}  # type: Dict[Text, Any]
+        self.read = set()  # type: Set[Text]
+        self.lock = threading.Lock()
+
+    def _fetcher_constructor(self, cache, session):
+        # type: (Dict[Text, Union[Text, bool]], requests.sessions.Session) -> Fetcher
+        """Make the usual fetcher, noting which documents it reads."""
+        fetcher = (self.loadingContext.fetcher_constructor or DefaultFetcher)(
+            cache, session)
+        fetch_text = fetcher.fetch_text
+
+        def recording_fetch_text(url):  # type: (Text) -> Text
+            self.read.add(url)
+            return fetch_text(url)
+        fetcher.fetch_text = recording_fetch_text  # type: ignore
+        return fetcher
+
+    def reset(self):  # type: () -> None
+        """Forget every document."""
+        self.loader = None
+        self.files = {}
+        self.tools = {}
+        self.processed = {}
+
+    def _changed(self):  # type: () -> Set[Text]
+        """The files read before that differ now."""
+        changed = set()
+        for url, (stamp, digest) in list(self.files.items()):
+            new_stamp = file_stamp(url)
+            if new_stamp is not None and new_stamp == stamp:
+                continue
+            # touched files are only changed if their content is
+            new_digest = file_digest(url)
+            if new_digest is not None and new_digest == digest:
+                self.files[url] = (new_stamp, digest)
+                continue
+            changed.add(url)
+        return changed
+
+    def _forget(self, changed):  # type: (Set[Text]) -> None
+        """Remove the changed files and the documents that use them."""
+        referrers = {}  # type: Dict[Text, Set[Text]]
+        for url, references in self.loader.references.items():
+            for reference in references:
+                referrers.setdefault(reference, set()).add(url)
+        stale = set()  # type: Set[Text]
+        pending = list(changed)
+        while pending:
+            url = pending.pop()
+            if url in stale:
+                continue
+            if url not in referrers and url not in self.loader.references:
+                # read in some other way: what depends on it is unknown
+                _logger.debug(u"%s changed, reloading everything", url)
+                self.reset()
+                return
+            stale.add(url)
+            pending.extend(referrers.get(url, ()))
+        _logger.debug(u"Reloading %s", u", ".join(sorted(stale)))
+
+        idx = self.loader.idx
+        for key in list(idx):
+            if urllib.parse.urldefrag(key)[0] in stale:
+                del idx[key]
+        for url in stale:
+            self.loader.references.pop(url, None)
+            self.loader.prefetched.pop(url, None)
+            self.files.pop(url, None)
+        for uri in list(self.processed):
+            if urllib.parse.urldefrag(uri)[0] in stale:
+                del self.processed[uri]
+        for uri, (_, files) in list(self.tools.items()):
+            if files & stale:
+                del self.tools[uri]
+
+    def load_tool(self, argsworkflow):
+        # type: (Union[Text, Dict[Text, Any]]) -> Process
+        """Load a CWL document, as load_tool.load_tool does."""
+        loadingContext = self.loadingContext.copy()
+        # the documents are kept in memory here, not in the document cache
+        loadingContext.document_cache = None
+        if not isinstance(argsworkflow, string_types):
+            # not read from a file: nothing to reuse
+            loadingContext.loader = None
+            return load_tool(argsworkflow, loadingContext)
+
+        with self.lock:
+            if self.loader is None:
+                self.loader = default_loader(self._fetcher_constructor)
+            uri = resolve_tool_uri(argsworkflow,
+                                   resolver=loadingContext.resolver,
+                                   document_loader=self.loader)[0]
+            changed = self._changed()
+            if changed:
+                self._forget(changed)
+            if uri in self.tools:
+                _logger.debug(u"Reusing %s, unchanged", uri)
+                return self.tools[uri][0]
+            if self.loader is None:
+                self.loader = default_loader(self._fetcher_constructor)
+
+            loadingContext.loader = self.loader
+            loadingContext.fetcher_constructor = self._fetcher_constructor
+            loadingContext.processed_documents = self.processed
+            self.read = set()
+            try:
+                tool = load_tool(uri, loadingContext)
+            except Exception:
+                # the index may hold half processed documents
+                self.reset()
+                raise
+            for url in self.read:
+                self.files[url] = (file_stamp(url), file_digest(url))
+            self.tools[uri] = (
+                tool, self.read | set([urllib.parse.urldefrag(uri)[0]]))
+            return tool
@@ -19,9 +19,7 @@ from threading import Timer
 from typing import (IO, Any, AnyStr, Callable, Dict, Iterable, List, Tuple,
                     MutableMapping, MutableSequence, Optional, Union, cast)
 
-import psutil
 import shellescape
-from prov.model import PROV
 from schema_salad.sourceline import SourceLine
 from six import PY2, with_metaclass
 from future.utils import raise_from
@@ -185,6 +183,7 @@ class JobBase(with_metaclass(ABCMeta, HasReqsHints)):
         self.requirements = requirements
         self.hints = hints
         self.name = name
+        self.step_name = name
         self.command_line = []  # type: List[Text]
         self.pathmapper = PathMapper([], u"", u"")
         self.make_path_mapper = make_path_mapper
@@ -401,6 +400,7 @@ class JobBase(with_metaclass(ABCMeta, HasReqsHints)):
             shutil.rmtree(self.tmpdir, True)
 
     def process_monitor(self, sproc):  # type: (subprocess.Popen) -> None
+        import psutil
         monitor = psutil.Process(sproc.pid)
         memory_usage = [None]  # Value must be list rather than integer to utilise pass-by-reference in python
 
@@ -425,6 +425,33 @@ class JobBase(with_metaclass(ABCMeta, HasReqsHints)):
             _logger.debug(u"Could not collect memory usage, job ended before monitoring began.")
 
 
+class JobBatch(object):
+    """Several jobs handed to the executor as a single unit of work.
+
+    Built by ``RuntimeContext.make_job_batch`` for steps carrying the
+    cwltool:ScatterBatch hint. Every member keeps its own output callback.
+    """
+
+    def __init__(self, jobs):  # type: (List[JobBase]) -> None
+        """Initialize the batch."""
+        self.jobs = jobs
+        self.name = u"{}+{}".format(jobs[0].name, len(jobs) - 1)
+        self.builder = None  # type: Optional[Builder]
+        self.outdir = None  # type: Optional[Text]
+        self.prov_obj = None  # type: Optional[ProvenanceProfile]
+
+    def output_dirs(self):  # type: () -> List[Text]
+        return [job.outdir for job in self.jobs if job.outdir]
+
+    def run(self,
+            runtimeContext,   # type: RuntimeContext
+            tmpdir_lock=None  # type: Optional[threading.Lock]
+           ):  # type: (...) -> None
+        """Run the members one after the other."""
+        for job in self.jobs:
+            job.run(runtimeContext, tmpdir_lock)
+
+
 class CommandLineJob(JobBase):
     def run(self,
             runtimeContext,         # type: RuntimeContext
@@ -655,6 +682,7 @@ class ContainerCommandLineJob(with_metaclass(ABCMeta, JobBase)):
 
                 if self.prov_obj is not None and img_id is not None \
                         and runtimeContext.process_run_id is not None:
+                    from prov.model import PROV
                     container_agent = self.prov_obj.document.agent(
                         uuid.uuid4().urn,
                         {"prov:type": PROV["SoftwareAgent"],
@@ -715,6 +743,7 @@ class ContainerCommandLineJob(with_metaclass(ABCMeta, JobBase)):
                     cid = cidhandle.readline().strip()
             except (OSError, IOError):
                 cid = None
+        import psutil
         max_mem = psutil.virtual_memory().total
         tmp_dir, tmp_prefix = os.path.split(tmpdir_prefix)
         stats_file = tempfile.NamedTemporaryFile(prefix=tmp_prefix, dir=tmp_dir)
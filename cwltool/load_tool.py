@@ -23,6 +23,7 @@ from typing_extensions import Text  # pylint: disable=unused-import
 
 from . import process, update
 from .context import LoadingContext  # pylint: disable=unused-import
+from .document_cache import CachedDocument, DocumentCache, PendingDocument
 from .errors import WorkflowException
 from .loghandler import _logger
 from .process import (Process, get_schema,  # pylint: disable=unused-import
@@ -108,10 +109,27 @@ def fetch_document(argsworkflow,        # type: Union[Text, Dict[Text, Any]]
         if loadingContext.loader is None:
             loadingContext.loader = default_loader(loadingContext.fetcher_constructor)
 
+    loadingContext.cached_document = None
     if isinstance(argsworkflow, string_types):
         uri, fileuri = resolve_tool_uri(argsworkflow,
                                         resolver=loadingContext.resolver,
                                         document_loader=loadingContext.loader)
+        if loadingContext.processed_documents is not None \
+                and uri in loadingContext.processed_documents \
+                and fileuri in loadingContext.loader.idx:
+            # resolved and validated already, by an earlier load
+            loadingContext.cached_document = loadingContext.processed_documents[uri]
+            return loadingContext, loadingContext.loader.idx[fileuri], uri
+        if loadingContext.document_cache is not None \
+                and fileuri not in loadingContext.loader.idx:
+            document_cache = DocumentCache(loadingContext.document_cache)
+            key = document_cache.key(uri, loadingContext)
+            loadingContext.cached_document = document_cache.load(
+                key, loadingContext.loader.idx)
+            if loadingContext.cached_document is not None:
+                return loadingContext, loadingContext.loader.idx[fileuri], uri
+            loadingContext.cached_document = PendingDocument(
+                key, fileuri, uri, set(loadingContext.loader.idx.keys()))
         workflowobj = loadingContext.loader.fetch(fileuri)
         return loadingContext, workflowobj, uri
     if isinstance(argsworkflow, dict):
@@ -204,12 +222,25 @@ def resolve_and_validate_document(
         raise ValueError("loadingContext must have a loader.")
     else:
         loader = loadingContext.loader
+    cached = loadingContext.cached_document
     loadingContext = loadingContext.copy()
+    loadingContext.cached_document = None
 
     if not isinstance(workflowobj, MutableMapping):
         raise ValueError("workflowjobj must be a dict, got '{}': {}".format(
             type(workflowobj), workflowobj))
 
+    if isinstance(cached, CachedDocument) and cached.uri == uri:
+        # fetch_document restored the processed document from the cache
+        loadingContext.loader, loadingContext.avsc_names = _document_loader(
+            loadingContext, loader, cached.cwl_version, skip_schemas)
+        loadingContext.metadata = cached.metadata
+        return loadingContext, cached.resolved_uri
+    if not isinstance(cached, PendingDocument) or cached.uri != uri \
+            or preprocess_only:
+        cached = None
+    original_uri = uri
+
     jobobj = None
     if "cwl:tool" in workflowobj:
         jobobj, _ = loader.resolve_all(workflowobj, uri)
@@ -272,22 +303,26 @@ def resolve_and_validate_document(
                                               "requirements": jobobj["https://w3id.org/cwl/cwl#requirements"]})
         del jobobj["https://w3id.org/cwl/cwl#requirements"]
 
-    (sch_document_loader, avsc_names) = \
-        process.get_schema(cwlVersion)[:2]
+    processobj = None  # type: Union[CommentedMap, CommentedSeq, Text, None]
+    document_loader, avsc_names = _document_loader(
+        loadingContext, loader, cwlVersion, skip_schemas)
 
-    if isinstance(avsc_names, Exception):
-        raise avsc_names
+    if cached is not None and jobobj is None:
+        # remember every document read, so the cache entry can be checked
+        fetch_text = document_loader.fetch_text
 
-    processobj = None  # type: Union[CommentedMap, CommentedSeq, Text, None]
-    document_loader = Loader(sch_document_loader.ctx,
-                             schemagraph=sch_document_loader.graph,
-                             idx=loader.idx,
-                             cache=sch_document_loader.cache,
-                             fetcher_constructor=loadingContext.fetcher_constructor,
-                             skip_schemas=skip_schemas)
+        def recording_fetch_text(url):  # type: (Text) -> Text
+            cached.fetched.add(url)
+            return fetch_text(url)
+        document_loader.fetch_text = recording_fetch_text  # type: ignore
+    else:
+        cached = None
 
     if cwlVersion == "v1.0":
         _add_blank_ids(workflowobj)
+    # fetch the imported documents and the tools of the steps concurrently,
+    # instead of one by one as resolving and loading the steps needs them
+    document_loader.prefetch(workflowobj, fileuri, ("$import", "$mixin", "run"))
     processobj, metadata = document_loader.resolve_all(workflowobj, fileuri)
     if loadingContext.metadata:
         metadata = loadingContext.metadata
@@ -318,6 +353,16 @@ def resolve_and_validate_document(
     if jobobj is not None:
         loadingContext.jobdefaults = jobobj
 
+    if cached is not None:
+        document_loader.fetch_text = fetch_text  # type: ignore
+        if "$schemas" not in metadata:
+            DocumentCache(loadingContext.document_cache).store(
+                cached, loader.idx, uri, cwlVersion, metadata)
+
+    if loadingContext.processed_documents is not None and jobobj is None:
+        loadingContext.processed_documents[original_uri] = CachedDocument(
+            original_uri, uri, cwlVersion, metadata)
+
     loadingContext.loader = document_loader
     loadingContext.avsc_names = avsc_names
     loadingContext.metadata = metadata
@@ -325,6 +370,29 @@ def resolve_and_validate_document(
     return loadingContext, uri
 
 
+def _document_loader(loadingContext,  # type: LoadingContext
+                     loader,          # type: Loader
+                     cwlVersion,      # type: Text
+                     skip_schemas     # type: Optional[bool]
+                    ):  # type: (...) -> Tuple[Loader, schema.Names]
+    """Make the loader for a document of this CWL version."""
+    (sch_document_loader, avsc_names) = \
+        process.get_schema(cwlVersion)[:2]
+
+    if isinstance(avsc_names, Exception):
+        raise avsc_names
+
+    document_loader = Loader(sch_document_loader.ctx,
+                             schemagraph=sch_document_loader.graph,
+                             idx=loader.idx,
+                             cache=sch_document_loader.cache,
+                             fetcher_constructor=loadingContext.fetcher_constructor,
+                             skip_schemas=skip_schemas)
+    document_loader.prefetched = loader.prefetched
+    document_loader.references = loader.references
+    return document_loader, avsc_names
+
+
 def make_tool(uri,                # type: Union[Text, CommentedMap, CommentedSeq]
               loadingContext      # type: LoadingContext
              ):  # type: (...) -> Process
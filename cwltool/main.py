@@ -10,6 +10,7 @@ import logging
 import os
 import signal
 import sys
+import threading
 import time
 from codecs import StreamWriter, getwriter  # pylint: disable=unused-import
 from six.moves import urllib
@@ -17,12 +18,11 @@ from typing import (IO, Any, Callable, Dict, Iterable, List, Mapping,
                     MutableMapping, MutableSequence, Optional, TextIO, Tuple,
                     Union, cast)
 
-import pkg_resources  # part of setuptools
 from ruamel import yaml
 from ruamel.yaml.comments import CommentedMap, CommentedSeq
 from schema_salad import validate
 from schema_salad.ref_resolver import Fetcher, Loader, file_uri, uri_file_path
-from schema_salad.sourceline import strip_dup_lineno, cmap
+from schema_salad.sourceline import strip_dup_lineno, cmap, json_load
 from six import string_types, iteritems, PY3
 from typing_extensions import Text
 # move to a regular typing import when Python 3.3-3.6 is no longer supported
@@ -32,11 +32,10 @@ if PY3:
 else:  # Needed for Py3.8
   from collections import Iterable, Sequence, MutableSequence
 
-from . import command_line_tool, workflow
+from . import command_line_tool, expression_profiler, workflow
 from .argparser import arg_parser, generate_parser, get_default_args
 from .builder import HasReqsHints  # pylint: disable=unused-import
 from .context import LoadingContext, RuntimeContext, getdefault
-from .cwlrdf import printdot, printrdf
 from .errors import UnsupportedRequirement, WorkflowException
 from .executors import MultithreadedJobExecutor, SingleJobExecutor, JobExecutor
 from .load_tool import (FetcherConstructorType,  # pylint: disable=unused-import
@@ -45,15 +44,15 @@ from .load_tool import (FetcherConstructorType,  # pylint: disable=unused-import
                         resolve_and_validate_document, default_loader)
 from .loghandler import _logger, defaultStreamHandler
 from .mutation import MutationManager
-from .pack import pack
 from .pathmapper import adjustDirObjs, normalizeFilesDirs, trim_listing
 from .process import (Process, add_sizes,  # pylint: disable=unused-import
                       scandeps, shortname, use_custom_schema,
                       use_standard_schema, CWL_IANA)
 from .workflow import Workflow
 from .procgenerator import ProcessGenerator
-from .provenance import ResearchObject
 from .resolver import ga4gh_tool_registries, tool_resolver
+from .sandboxjs import (JavascriptException, find_node_engine,
+                        set_js_engine, warm_up_js_workers)
 from .secrets import SecretStore
 from .software_requirements import (DependenciesConfiguration,
                                     get_container_from_software_requirements)
@@ -62,7 +61,6 @@ from .update import ALLUPDATES, UPDATES
 from .utils import (DEFAULT_TMP_PREFIX, json_dumps, onWindows,
                     processes_to_kill, versionstring, visit_class,
                     windows_default_container_id)
-from .subgraph import get_subgraph
 
 import coloredlogs
 
@@ -246,7 +244,11 @@ def load_job_order(args,                 # type: argparse.Namespace
     if len(args.job_order) == 1 and args.job_order[0][0] != "-":
         job_order_file = args.job_order[0]
     elif len(args.job_order) == 1 and args.job_order[0] == "-":
-        job_order_object = yaml.round_trip_load(stdin)
+        job_order_text = stdin.read()
+        try:
+            job_order_object = json_load(job_order_text)
+        except ValueError:
+            job_order_object = yaml.round_trip_load(job_order_text)
         job_order_object, _ = loader.resolve_all(job_order_object, file_uri(os.getcwd()) + "/")
     else:
         job_order_file = None
@@ -464,6 +466,7 @@ def print_pack(document_loader,  # type: Loader
                metadata          # type: Dict[Text, Any]
               ):  # type: (...) -> Text
     """Return a CWL serialization of the CWL document in JSON."""
+    from .pack import pack
     packed = pack(document_loader, processobj, uri, metadata)
     if len(packed["$graph"]) > 1:
         return json_dumps(packed, indent=4)
@@ -509,6 +512,7 @@ def setup_schema(args,                    # type: argparse.Namespace
     if custom_schema_callback is not None:
         custom_schema_callback()
     elif args.enable_ext:
+        import pkg_resources  # part of setuptools
         res = pkg_resources.resource_stream(__name__, 'extensions.yml')
         use_custom_schema("v1.0", "http://commonwl.org/cwltool", res.read())
         res.close()
@@ -522,6 +526,7 @@ def setup_provenance(args,            # type: argparse.Namespace
     if not args.compute_checksum:
         _logger.error("--provenance incompatible with --no-compute-checksum")
         return 1
+    from .provenance import ResearchObject
     ro = ResearchObject(
         getdefault(runtimeContext.make_fs_access, StdFsAccess),
         temp_prefix_ro=args.tmpdir_prefix, orcid=args.orcid,
@@ -570,6 +575,9 @@ def setup_loadingContext(loadingContext,  # type: Optional[LoadingContext]
     loadingContext.resolver = getdefault(loadingContext.resolver, tool_resolver)
     if loadingContext.do_update is None:
         loadingContext.do_update = not (args.pack or args.print_subgraph)
+    if args.print_deps or args.print_pre or args.pack:
+        # these need the document as written, not as cached after processing
+        loadingContext.document_cache = None
 
     return loadingContext
 
@@ -594,6 +602,7 @@ def choose_target(args,           # type: argparse.Namespace
         raise Exception("loadingContext.loader cannot be None")
 
     if isinstance(tool, Workflow):
+        from .subgraph import get_subgraph
         url = urllib.parse.urlparse(tool.tool["id"])
         if url.fragment:
             extracted = get_subgraph([tool.tool["id"] + "/" + r for r in args.target], tool)
@@ -613,6 +622,19 @@ def choose_target(args,           # type: argparse.Namespace
 
     return tool
 
+def _warm_up_js_workers(runtimeContext):  # type: (RuntimeContext) -> None
+    find_node_engine(runtimeContext.js_engine_cache)
+    if runtimeContext.js_workers <= 0 or runtimeContext.js_engine != "node":
+        return
+    try:
+        warm_up_js_workers(runtimeContext.js_workers,
+                           timeout=runtimeContext.eval_timeout,
+                           force_docker_pull=runtimeContext.force_docker_pull)
+    except (JavascriptException, IOError, OSError) as err:
+        _logger.warning(u"Could not start Javascript engine processes: %s",
+                        Text(err))
+
+
 def check_working_directories(runtimeContext   # type: RuntimeContext
 ):  # type: (...) -> Optional[int]
     for dirprefix in ("tmpdir_prefix", "tmp_outdir_prefix", "cachedir"):
@@ -697,6 +719,9 @@ def main(argsl=None,                   # type: Optional[List[str]]
 
         configure_logging(args, stderr_handler, runtimeContext)
 
+        if args.profile_expressions:
+            expression_profiler.enable()
+
         if args.version:
             print(versionfunc())
             return 0
@@ -788,10 +813,12 @@ def main(argsl=None,                   # type: Optional[List[str]]
                 return 0
 
             if args.print_rdf:
+                from .cwlrdf import printrdf
                 stdout.write(printrdf(tool, loadingContext.loader.ctx, args.rdf_serializer))
                 return 0
 
             if args.print_dot:
+                from .cwlrdf import printdot
                 printdot(tool, loadingContext.loader.ctx, stdout)
                 return 0
 
@@ -855,6 +882,17 @@ def main(argsl=None,                   # type: Optional[List[str]]
         runtimeContext.secret_store = getdefault(runtimeContext.secret_store, SecretStore())
         runtimeContext.make_fs_access = getdefault(runtimeContext.make_fs_access, StdFsAccess)
 
+        try:
+            set_js_engine(runtimeContext.js_engine)
+        except JavascriptException as err:
+            _logger.error(Text(err))
+            return 1
+
+        warmup = threading.Thread(
+            target=_warm_up_js_workers, args=(runtimeContext,))
+        warmup.daemon = True
+        warmup.start()
+
         if not executor:
             if args.parallel:
                 temp_executor = MultithreadedJobExecutor()
@@ -998,6 +1036,16 @@ def main(argsl=None,                   # type: Optional[List[str]]
                 prov_log_handler.close()
             research_obj.close(args.provenance)
 
+        if args and args.profile_expressions \
+                and expression_profiler.profiler is not None:
+            documents = []  # type: List[Any]
+            if loadingContext and loadingContext.loader is not None:
+                documents = list(loadingContext.loader.idx.values())
+            expression_profiler.profiler.dump(args.profile_expressions,
+                                              documents)
+            _logger.info(u"Expression profile written to %s",
+                         args.profile_expressions)
+
         _logger.removeHandler(stderr_handler)
         _logger.addHandler(defaultStreamHandler)
 
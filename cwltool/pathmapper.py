@@ -52,6 +52,23 @@ def adjustDirObjs(rec, op):
     """Apply an update function to each Directory object in the object `rec`."""
     visit_class(rec, ("Directory",), op)
 
+FUSED_SCHEME = u"fused"
+
+
+def fused_location(path):  # type: (Text) -> Text
+    """Location of a File written at ``path`` by an earlier fused step."""
+    return u"{}://{}".format(FUSED_SCHEME, path)
+
+
+def is_fused_location(location):  # type: (Text) -> bool
+    return location.startswith(FUSED_SCHEME + u":")
+
+
+def fused_path(location):  # type: (Text) -> Text
+    """Inverse of fused_location()."""
+    return urllib.parse.urlparse(location).path
+
+
 def normalizeFilesDirs(job):
     # type: (Optional[Union[List[Dict[Text, Any]], MutableMapping[Text, Any], Directory]]) -> None
     def addLocation(d):  # type: (Dict[Text, Any]) -> None
@@ -284,7 +301,11 @@ class PathMapper(object):
         elif obj["class"] == "File":
             path = obj["location"]
             ab = abspath(path, basedir)
-            if "contents" in obj and obj["location"].startswith("_:"):
+            if is_fused_location(path):
+                # Written in place by an earlier step of the same fused job
+                self._pathmap[path] = MapperEnt(
+                    fused_path(path), fused_path(path), "File", False)
+            elif "contents" in obj and obj["location"].startswith("_:"):
                 self._pathmap[obj["location"]] = MapperEnt(
                     obj["contents"], tgt,
                     "CreateWritableFile" if copy else "CreateFile", staged)
@@ -8,8 +8,10 @@ import hashlib
 import json
 import logging
 import os
+import pkgutil
 import shutil
 import stat
+import sys
 import tempfile
 import textwrap
 import uuid
@@ -19,11 +21,10 @@ from typing import (Any, Callable, Dict, Generator, Iterator, List,
                     Mapping, MutableMapping, MutableSequence, Optional, Set, Tuple,
                     Type, Union, cast)
 
-from pkg_resources import resource_stream
 from rdflib import Graph  # pylint: disable=unused-import
 from ruamel.yaml.comments import CommentedMap, CommentedSeq
 from six import PY3, iteritems, itervalues, string_types, with_metaclass
-from six.moves import urllib
+from six.moves import cPickle, urllib
 from future.utils import raise_from
 from typing_extensions import (TYPE_CHECKING,  # pylint: disable=unused-import
                                Text)
@@ -46,7 +47,8 @@ from .software_requirements import (  # pylint: disable=unused-import
     DependenciesConfiguration)
 from .stdfsaccess import StdFsAccess
 from .utils import (DEFAULT_TMP_PREFIX, aslist, cmp_like_py2,
-                    copytree_with_merge, onWindows, random_outdir)
+                    copytree_with_merge, deepcopy_json, onWindows,
+                    random_outdir)
 from .validate_js import validate_js_expressions
 from .update import INTERNAL_VERSION
 
@@ -98,7 +100,9 @@ supportedProcessRequirements = ["DockerRequirement",
                                 "http://commonwl.org/cwltool#WorkReuse",
                                 "http://commonwl.org/cwltool#NetworkAccess",
                                 "http://commonwl.org/cwltool#LoadListingRequirement",
-                                "http://commonwl.org/cwltool#InplaceUpdateRequirement"]
+                                "http://commonwl.org/cwltool#InplaceUpdateRequirement",
+                                "http://commonwl.org/cwltool#ScatterBatch",
+                                "http://commonwl.org/cwltool#ConcurrencyLimit"]
 
 cwl_files = (
     "Workflow.yml",
@@ -139,6 +143,17 @@ SCHEMA_ANY = None  # type: Optional[Dict[Text, Any]]
 
 custom_schemas = {}  # type: Dict[Text, Tuple[Text, Text]]
 
+# Processed schemas are kept in this directory between runs; set to None to
+# disable.  Bump SCHEMA_CACHE_FORMAT when what is stored there changes.
+SCHEMA_CACHE_DIR = os.path.join(
+    os.environ.get("XDG_CACHE_HOME",
+                   os.path.join(os.path.expanduser("~"), ".cache")),
+    "cwltool", "schemas")  # type: Optional[Text]
+SCHEMA_CACHE_FORMAT = 1
+# The schema_salad modules defining the objects stored there; a change to
+# their source invalidates the cache as well.
+SCHEMA_CACHE_CODE = ("avro/schema.py", "schema.py", "ref_resolver.py")
+
 def use_standard_schema(version):
     # type: (Text) -> None
     if version in custom_schemas:
@@ -166,36 +181,94 @@ def get_schema(version):
     version = version.split("#")[-1]
     if '.dev' in version:
         version = ".".join(version.split(".")[:-1])
+    # pkgutil rather than pkg_resources, which is slow to import
     for f in cwl_files:
         try:
-            res = resource_stream(__name__, 'schemas/%s/%s' % (version, f))
-            cache["https://w3id.org/cwl/" + f] = res.read()
-            res.close()
+            cache["https://w3id.org/cwl/" + f] = pkgutil.get_data(
+                __name__, 'schemas/%s/%s' % (version, f))
         except IOError:
             pass
 
     for f in salad_files:
         try:
-            res = resource_stream(
-                __name__, 'schemas/{}/salad/schema_salad/metaschema/{}'.format(
-                    version, f))
             cache["https://w3id.org/cwl/salad/schema_salad/metaschema/"
-                  + f] = res.read()
-            res.close()
+                  + f] = pkgutil.get_data(
+                      __name__, 'schemas/{}/salad/schema_salad/metaschema/{}'.format(
+                          version, f))
         except IOError:
             pass
 
     if version in custom_schemas:
         cache[custom_schemas[version][0]] = custom_schemas[version][1]
-        SCHEMA_CACHE[version] = schema.load_schema(
-            custom_schemas[version][0], cache=cache)
+        SCHEMA_CACHE[version] = load_schema_cached(
+            custom_schemas[version][0], cache)
     else:
-        SCHEMA_CACHE[version] = schema.load_schema(
-            "https://w3id.org/cwl/CommonWorkflowLanguage.yml", cache=cache)
+        SCHEMA_CACHE[version] = load_schema_cached(
+            "https://w3id.org/cwl/CommonWorkflowLanguage.yml", cache)
 
     return SCHEMA_CACHE[version]
 
 
+def load_schema_cached(schema_ref, cache):
+    # type: (Text, Dict[Text, Any]) -> Tuple[Loader, Union[schema.Names, schema.SchemaParseException], Dict[Text, Any], Loader]
+    """Load a schema, reusing the result of an earlier run if possible.
+
+    The loaders themselves cannot be pickled, so their contexts are stored
+    together with the avro names, the schema metadata and the index of the
+    metaschema loader, under a hash of the schema files and of the
+    schema_salad code that defines the stored objects.
+    """
+    if SCHEMA_CACHE_DIR is None:
+        return schema.load_schema(schema_ref, cache=cache)
+
+    checksum = hashlib.sha256()
+    checksum.update(json.dumps([SCHEMA_CACHE_FORMAT, list(sys.version_info[:2]),
+                                schema_ref]).encode("utf-8"))
+    for name in SCHEMA_CACHE_CODE:
+        checksum.update(pkgutil.get_data("schema_salad", name) or b"")
+        checksum.update(b"\0")
+    for name in sorted(cache):
+        text = cache[name]
+        checksum.update(name.encode("utf-8") + b"\0")
+        checksum.update(text if isinstance(text, bytes) else text.encode("utf-8"))
+        checksum.update(b"\0")
+    cache_file = os.path.join(SCHEMA_CACHE_DIR, checksum.hexdigest() + ".pickle")
+
+    try:
+        with open(cache_file, "rb") as handle:
+            doc_ctx, avsc_names, schema_metadata, meta_ctx, meta_idx = \
+                cPickle.load(handle)
+    except Exception:  # pylint: disable=broad-except
+        # missing, unreadable or written by an incompatible version
+        pass
+    else:
+        metaschema_loader = Loader(meta_ctx, cache=dict(cache))
+        metaschema_loader.idx.update(meta_idx)
+        return (Loader(doc_ctx, cache=cache), avsc_names, schema_metadata,
+                metaschema_loader)
+
+    result = schema.load_schema(schema_ref, cache=cache)
+    document_loader, avsc_names, schema_metadata, metaschema_loader = result
+    if isinstance(avsc_names, schema.Names):
+        try:
+            try:
+                os.makedirs(SCHEMA_CACHE_DIR)
+            except OSError as err:
+                if err.errno != errno.EEXIST:
+                    raise
+            # write then rename, so concurrent runs never read a partial file
+            handle_fd, tmp = tempfile.mkstemp(dir=SCHEMA_CACHE_DIR)
+            with os.fdopen(handle_fd, "wb") as handle:
+                cPickle.dump((document_loader.ctx, avsc_names, schema_metadata,
+                              metaschema_loader.ctx,
+                              dict(metaschema_loader.idx)), handle, 2)
+            os.rename(tmp, cache_file)
+        except Exception as err:  # pylint: disable=broad-except
+            _logger.debug(u"Could not cache the schema in %s: %s",
+                          SCHEMA_CACHE_DIR, Text(err))
+    return result
+
+
 def shortname(inputid):
     # type: (Text) -> Text
     d = urllib.parse.urlparse(inputid)
@@ -405,7 +478,7 @@ def fill_in_defaults(inputs,   # type: List[Dict[Text, Text]]
             if job.get(fieldname) is not None:
                 pass
             elif job.get(fieldname) is None and u"default" in inp:
-                job[fieldname] = copy.deepcopy(inp[u"default"])
+                job[fieldname] = deepcopy_json(inp[u"default"])
             elif job.get(fieldname) is None and u"null" in aslist(inp[u"type"]):
                 job[fieldname] = None
             else:
@@ -523,6 +596,15 @@ class Process(with_metaclass(abc.ABCMeta, HasReqsHints)):
         self.validate_hints(loadingContext.avsc_names, self.tool.get("hints", []),
                             strict=getdefault(loadingContext.strict, False))
 
+        limit_req, _ = self.get_requirement(
+            "http://commonwl.org/cwltool#ConcurrencyLimit")
+        if limit_req is not None and limit_req.get("maxConcurrent") is not None:
+            with SourceLine(limit_req, "maxConcurrent", validate.ValidationException):
+                if limit_req["maxConcurrent"] < 1:
+                    raise validate.ValidationException(
+                        "maxConcurrent must be at least 1, got %s"
+                        % limit_req["maxConcurrent"])
+
         self.schemaDefs = {}  # type: Dict[Text,Dict[Text, Any]]
 
         sd, _ = self.get_requirement("SchemaDefRequirement")
@@ -593,7 +675,8 @@ class Process(with_metaclass(abc.ABCMeta, HasReqsHints)):
                 validate_js_expressions(
                     cast(CommentedMap, toolpath_object),
                     self.doc_schema.names[toolpath_object["class"]],
-                    validate_js_options)
+                    validate_js_options,
+                    loadingContext.js_hint_cache)
 
         dockerReq, is_req = self.get_requirement("DockerRequirement")
 
@@ -615,6 +698,11 @@ class Process(with_metaclass(abc.ABCMeta, HasReqsHints)):
         else:
             var_spool_cwl_detector(self.tool)
 
+        self.expression_kinds = expression.classify_expressions(self.tool)
+        # filled on the first job, see _command_line_template and evalResources
+        self._binding_template = None  # type: Optional[Tuple[List[MutableMapping[Text, Any]], List[Tuple[int, MutableMapping[Text, Any]]], List[Tuple[int, Any]]]]
+        self._resources = None  # type: Optional[Tuple[Any, Dict[str, int]]]
+
     def _init_job(self, joborder, runtime_context):
         # type: (Mapping[Text, Text], RuntimeContext) -> Builder
 
@@ -622,7 +710,7 @@ class Process(with_metaclass(abc.ABCMeta, HasReqsHints)):
             raise WorkflowException("Process object loaded with version '%s', must update to '%s' in order to execute." % (
                 self.metadata.get("cwlVersion"), INTERNAL_VERSION))
 
-        job = cast(Dict[Text, expression.JSON], copy.deepcopy(joborder))
+        job = cast(Dict[Text, expression.JSON], deepcopy_json(joborder))
 
         make_fs_access = getdefault(runtime_context.make_fs_access, StdFsAccess)
         fs_access = make_fs_access(runtime_context.basedir)
@@ -747,37 +835,83 @@ hints:
                           outdir,
                           tmpdir,
                           stagedir)
+        builder.expression_kinds = self.expression_kinds
 
-        bindings.extend(builder.bind_input(
+        input_bindings = builder.bind_input(
             self.inputs_record_schema, job,
-            discover_secondaryFiles=getdefault(runtime_context.toplevel, False)))
+            discover_secondaryFiles=getdefault(runtime_context.toplevel, False))
+        static_bindings, dynamic_arguments, argument_lines = \
+            self._command_line_template()
+
+        for index, lc in argument_lines:
+            bindings.lc.add_kv_line_col(len(input_bindings) + index, lc)
+        dynamic_bindings = []  # type: List[MutableMapping[Text, Any]]
+        for i, arg in dynamic_arguments:
+            arg = deepcopy_json(arg)
+            position = builder.do_eval(arg["position"])
+            if position is None:
+                position = 0
+            arg["position"] = [position, i]
+            dynamic_bindings.append(arg)
+
+        # use python2 like sorting of heterogeneous lists
+        # (containing str and int types),
+        if PY3:
+            key = functools.cmp_to_key(cmp_like_py2)
+        else:  # PY2
+            key = lambda d: d["position"]
+
+        # The sort is stable and the bindings are in the order they were
+        # made before, so equal positions keep the order they always had:
+        # inputs, then baseCommand, then arguments.  The static bindings
+        # are already sorted, which the sort notices.  "bindings" is only
+        # filled now since Builder expects it to be the same object.
+        bindings.extend(sorted(
+            input_bindings + static_bindings + dynamic_bindings, key=key))
+
+        if self.tool[u"class"] != 'Workflow':
+            builder.resources = self.evalResources(builder, runtime_context)
+        return builder
+
+    def _command_line_template(self):
+        # type: () -> Tuple[List[MutableMapping[Text, Any]], List[Tuple[int, MutableMapping[Text, Any]]], List[Tuple[int, Any]]]
+        """Bindings of baseCommand and arguments, made on the first job.
+
+        Returns the sorted bindings that are the same for every job, the
+        arguments whose position is an expression (with their index) and
+        the line and column of each argument, keyed by its index among the
+        baseCommand and arguments bindings.  The static bindings hold no
+        File or Directory, so the jobs share them and only read them.
+        """
+        if self._binding_template is not None:
+            return self._binding_template
+        static_bindings = []  # type: List[MutableMapping[Text, Any]]
+        dynamic_arguments = []  # type: List[Tuple[int, MutableMapping[Text, Any]]]
+        argument_lines = []  # type: List[Tuple[int, Any]]
 
         if self.tool.get("baseCommand"):
             for index, command in enumerate(aslist(self.tool["baseCommand"])):
-                bindings.append({
+                static_bindings.append({
                     "position": [-1000000, index],
                     "datum": command
                 })
 
         if self.tool.get("arguments"):
+            offset = len(static_bindings)
             for i, arg in enumerate(self.tool["arguments"]):
                 lc = self.tool["arguments"].lc.data[i]
                 filename = self.tool["arguments"].lc.filename
-                bindings.lc.add_kv_line_col(len(bindings), lc)
+                argument_lines.append((offset + i, lc))
                 if isinstance(arg, MutableMapping):
-                    arg = copy.deepcopy(arg)
-                    if arg.get("position"):
-                        position = arg.get("position")
-                        if isinstance(position, str):  # no need to test the
-                                                       # CWLVersion as the v1.0
-                                                       # schema only allows ints
-                            position = builder.do_eval(position)
-                            if position is None:
-                                position = 0
-                        arg["position"] = [position, i]
-                    else:
-                        arg["position"] = [0, i]
-                    bindings.append(arg)
+                    position = arg.get("position")
+                    if position and isinstance(position, str):
+                        # no need to test the CWLVersion as the v1.0
+                        # schema only allows ints
+                        dynamic_arguments.append((i, arg))
+                        continue
+                    arg = deepcopy_json(arg)
+                    arg["position"] = [position or 0, i]
+                    static_bindings.append(arg)
                 elif ("$(" in arg) or ("${" in arg):
                     cm = CommentedMap((
                         ("position", [0, i]),
@@ -785,7 +919,7 @@ hints:
                     ))
                     cm.lc.add_kv_line_col("valueFrom", lc)
                     cm.lc.filename = filename
-                    bindings.append(cm)
+                    static_bindings.append(cm)
                 else:
                     cm = CommentedMap((
                         ("position", [0, i]),
@@ -793,31 +927,21 @@ hints:
                     ))
                     cm.lc.add_kv_line_col("datum", lc)
                     cm.lc.filename = filename
-                    bindings.append(cm)
+                    static_bindings.append(cm)
 
-        # use python2 like sorting of heterogeneous lists
-        # (containing str and int types),
         if PY3:
             key = functools.cmp_to_key(cmp_like_py2)
         else:  # PY2
             key = lambda d: d["position"]
-
-        # This awkward construction replaces the contents of
-        # "bindings" in place (because Builder expects it to be
-        # mutated in place, sigh, I'm sorry) with its contents sorted,
-        # supporting different versions of Python and ruamel.yaml with
-        # different behaviors/bugs in CommentedSeq.
-        bindings_copy = copy.deepcopy(bindings)
-        del bindings[:]
-        bindings.extend(sorted(bindings_copy, key=key))
-
-        if self.tool[u"class"] != 'Workflow':
-            builder.resources = self.evalResources(builder, runtime_context)
-        return builder
-
-    def evalResources(self, builder, runtimeContext):
-        # type: (Builder, RuntimeContext) -> Dict[str, int]
-        resourceReq, _ = self.get_requirement("ResourceRequirement")
+        static_bindings.sort(key=key)
+        self._binding_template = (
+            static_bindings, dynamic_arguments, argument_lines)
+        return self._binding_template
+
+    def _resource_request(self, builder, resourceReq):
+        # type: (Builder, Optional[Dict[Text, Any]]) -> Dict[str, int]
+        """Evaluate ResourceRequirement, remembering it if it is constant."""
+        requirement = resourceReq
         if resourceReq is None:
             resourceReq = {}
         cwl_version = self.metadata.get(
@@ -836,12 +960,15 @@ hints:
             "outdirMin": 1024,
             "outdirMax": 1024
         }  # type: Dict[str, int]
+        constant = True
         for a in ("cores", "ram", "tmpdir", "outdir"):
             mn = None
             mx = None
             if resourceReq.get(a + "Min"):
+                constant = constant and not expression.needs_parsing(resourceReq[a + "Min"])
                 mn = eval_resource(builder, resourceReq[a + "Min"])
             if resourceReq.get(a + "Max"):
+                constant = constant and not expression.needs_parsing(resourceReq[a + "Max"])
                 mx = eval_resource(builder, resourceReq[a + "Max"])
             if mn is None:
                 mn = mx
@@ -852,6 +979,19 @@ hints:
                 request[a + "Min"] = cast(int, mn)
                 request[a + "Max"] = cast(int, mx)
 
+        if constant:
+            self._resources = (requirement, dict(request))
+        return request
+
+    def evalResources(self, builder, runtimeContext):
+        # type: (Builder, RuntimeContext) -> Dict[str, int]
+        resourceReq, _ = self.get_requirement("ResourceRequirement")
+        if self._resources is not None and self._resources[0] is resourceReq:
+            # no expressions: the same request as for the previous job
+            request = dict(self._resources[1])
+        else:
+            request = self._resource_request(builder, resourceReq)
+
         if runtimeContext.select_resources is not None:
             return runtimeContext.select_resources(request, runtimeContext)
         return {
@@ -8,23 +8,32 @@ import re
 import select
 import sys
 import threading
+import time
 from io import BytesIO
 from typing import cast, Any, Dict, List, Optional, Tuple, Union
 
 import six
 from future.utils import raise_from
-from pkg_resources import resource_stream
 from typing_extensions import Text  # pylint: disable=unused-import
 # move to a regular typing import when Python 3.3-3.6 is no longer supported
 
 from schema_salad.utils import json_dumps
 
+from . import expression_profiler
 from .loghandler import _logger
 from .utils import onWindows, processes_to_kill, subprocess
 try:
     import queue  # type: ignore
 except ImportError:
     import Queue as queue  # type: ignore
+try:
+    import quickjs  # type: ignore
+except ImportError:
+    quickjs = None  # type: ignore
+try:
+    import py_mini_racer  # type: ignore
+except ImportError:
+    py_mini_racer = None  # type: ignore
 
 
 class JavascriptException(Exception):
@@ -33,13 +42,29 @@ class JavascriptException(Exception):
 
 JSON = Union[Dict[Text, Any], List[Any], Text, int, float, bool, None]
 
-localdata = threading.local()
-
 default_timeout = 20
 have_node_slim = False
+docker_node_failed = False
 # minimum acceptable version of nodejs engine
 minimum_node_version_str = '0.10.26'
 
+trynodes = ("nodejs", "node")
+
+node_engine_lock = threading.Lock()
+# (command, version) of the Node.js engine found on the system, once probed
+node_engine = None  # type: Optional[Tuple[Text, Text]]
+node_engine_probed = False
+
+
+def js_version_ok(version_str):  # type: (Text) -> bool
+    """Compare a nodeJS version string with the allowed minimum version."""
+    # parse nodejs version into int Tuple: 'v4.2.6\n' -> [4, 2, 6]
+    current_version = [int(v) for v in version_str.strip().strip('v').split('.')]
+    minimum_node_version = [int(v) for v in minimum_node_version_str.split('.')]
+
+    return current_version >= minimum_node_version
+
+
 def check_js_threshold_version(working_alias):
     # type: (str) -> bool
     """
@@ -47,38 +72,98 @@ def check_js_threshold_version(working_alias):
 
     https://github.com/nodejs/node/blob/master/CHANGELOG.md#nodejs-changelog
     """
-    # parse nodejs version into int Tuple: 'v4.2.6\n' -> [4, 2, 6]
     current_version_str = subprocess.check_output(
         [working_alias, "-v"]).decode('utf-8')
 
-    current_version = [int(v) for v in current_version_str.strip().strip('v').split('.')]
-    minimum_node_version = [int(v) for v in minimum_node_version_str.split('.')]
-
-    return current_version >= minimum_node_version
-
+    return js_version_ok(current_version_str)
 
-def new_js_proc(js_text, force_docker_pull=False):
-    # type: (Text, bool) -> subprocess.Popen
 
-    required_node_version, docker = (False,)*2
-    nodejs = None
-    trynodes = ("nodejs", "node")
+def _probe_node():  # type: () -> Optional[Tuple[Text, Text]]
     for n in trynodes:
         try:
             if subprocess.check_output([n, "--eval", "process.stdout.write('t')"]).decode('utf-8') != "t":
                 continue
-            else:
-                nodejs = subprocess.Popen([n, "--eval", js_text],
-                                          stdin=subprocess.PIPE,
-                                          stdout=subprocess.PIPE,
-                                          stderr=subprocess.PIPE)
-                processes_to_kill.append(nodejs)
-                required_node_version = check_js_threshold_version(n)
-                break
+            version = subprocess.check_output([n, "-v"]).decode('utf-8')
+            return (n, version.strip())
         except (subprocess.CalledProcessError, OSError):
             pass
+    return None
+
+
+def _executable_stamp(command):  # type: (Text) -> Optional[List[Any]]
+    from distutils import spawn
+    executable = spawn.find_executable(command)
+    if executable is None:
+        return None
+    executable = os.path.realpath(executable)
+    stat = os.stat(executable)
+    return [executable, stat.st_size, stat.st_mtime]
+
+
+def _read_engine_cache(cache_file):
+    # type: (Text) -> Optional[Tuple[Text, Text]]
+    try:
+        with open(cache_file) as handle:
+            cached = json.load(handle)
+        if cached["stamp"] == _executable_stamp(cached["command"]):
+            return (cached["command"], cached["version"])
+    except (IOError, OSError, ValueError, KeyError, TypeError):
+        pass
+    return None
 
-    if nodejs is None or nodejs is not None and required_node_version is False:
+
+def _write_engine_cache(cache_file, engine):
+    # type: (Text, Tuple[Text, Text]) -> None
+    try:
+        cache_dir = os.path.dirname(cache_file)
+        if cache_dir and not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        with open(cache_file, "w") as handle:
+            json.dump({"command": engine[0], "version": engine[1],
+                       "stamp": _executable_stamp(engine[0])}, handle)
+    except (IOError, OSError) as err:
+        _logger.debug(u"Could not write Javascript engine cache %s: %s",
+                      cache_file, Text(err))
+
+
+def find_node_engine(cache_file=None):
+    # type: (Optional[Text]) -> Optional[Tuple[Text, Text]]
+    """Find the Node.js command on this system and its version.
+
+    The system is only probed once per process.  When ``cache_file`` is
+    given, the result is also kept there and reused for as long as the
+    executable it names is unchanged.
+    """
+    global node_engine, node_engine_probed  # pylint: disable=global-statement
+    with node_engine_lock:
+        if not node_engine_probed:
+            engine = _read_engine_cache(cache_file) if cache_file else None
+            if engine is None:
+                engine = _probe_node()
+                if engine is not None and cache_file:
+                    _write_engine_cache(cache_file, engine)
+            node_engine = engine
+            node_engine_probed = True
+        return node_engine
+
+
+def new_js_proc(js_text, force_docker_pull=False):
+    # type: (Text, bool) -> subprocess.Popen
+
+    required_node_version, docker = (False,)*2
+    nodejs = None
+    engine = find_node_engine()
+    if engine is not None:
+        nodejs = subprocess.Popen([engine[0], "--eval", js_text],
+                                  stdin=subprocess.PIPE,
+                                  stdout=subprocess.PIPE,
+                                  stderr=subprocess.PIPE)
+        processes_to_kill.append(nodejs)
+        required_node_version = js_version_ok(engine[1])
+
+    global docker_node_failed  # pylint: disable=global-statement
+    if (nodejs is None or nodejs is not None and required_node_version is False) \
+            and not docker_node_failed:
         try:
             nodeimg = "node:slim"
             global have_node_slim
@@ -100,11 +185,11 @@ def new_js_proc(js_text, force_docker_pull=False):
             docker = True
         except OSError as e:
             if e.errno == errno.ENOENT:
-                pass
+                docker_node_failed = True
             else:
                 raise
         except subprocess.CalledProcessError:
-            pass
+            docker_node_failed = True
 
     # docker failed and nodejs not on system
     if nodejs is None:
@@ -124,6 +209,214 @@ def new_js_proc(js_text, force_docker_pull=False):
 
 PROCESS_FINISHED_STR = "r1cepzbhUTxtykz5XTC4\n"
 
+
+class JSWorkerPool(object):
+    """Long-lived Node.js engine processes shared by all threads.
+
+    Idle workers are kept per engine script and context.  A thread checks a
+    worker out for the duration of one evaluation, so concurrent
+    evaluations are spread over as many node processes as there are
+    threads evaluating at the same time, and those processes are reused by
+    later jobs instead of being started again by every new job thread.
+    Workers that exited or were killed after a timeout are dropped.
+    """
+
+    def __init__(self):  # type: () -> None
+        """Initialize."""
+        self._idle = {}  # type: Dict[Any, List[subprocess.Popen]]
+        self._lock = threading.Lock()
+
+    def checkout(self, key):  # type: (Any) -> Optional[subprocess.Popen]
+        """Take a live idle worker for ``key``, if there is one."""
+        with self._lock:
+            idle = self._idle.get(key, [])
+            while idle:
+                nodejs = idle.pop()
+                if nodejs.poll() is None:
+                    return nodejs
+                _logger.debug(u"Discarding exited Javascript engine process "
+                              u"%s", nodejs.pid)
+        return None
+
+    def checkin(self, key, nodejs, healthy=True):
+        # type: (Any, subprocess.Popen, bool) -> None
+        """Return a worker after use, or dispose of it if it is unhealthy."""
+        # On windows a new instance of nodejs process is used for every
+        # evaluation due to problem with blocking on read operation
+        if healthy and nodejs.poll() is None and not onWindows():
+            with self._lock:
+                self._idle.setdefault(key, []).append(nodejs)
+        else:
+            try:
+                nodejs.kill()
+            except OSError:
+                pass
+
+    def size(self, key):  # type: (Any) -> int
+        """Number of idle workers for ``key``."""
+        with self._lock:
+            return len(self._idle.get(key, []))
+
+    def shutdown(self):  # type: () -> None
+        """Stop all the idle workers."""
+        with self._lock:
+            for idle in self._idle.values():
+                for nodejs in idle:
+                    try:
+                        nodejs.kill()
+                    except OSError:
+                        pass
+            self._idle.clear()
+
+
+worker_pool = JSWorkerPool()
+
+
+def warm_up_js_workers(count,                    # type: int
+                       timeout=default_timeout,  # type: float
+                       force_docker_pull=False   # type: bool
+                      ):  # type: (...) -> None
+    """Start ``count`` Javascript engine processes ahead of their first use.
+
+    Each new worker evaluates a trivial expression before it is added to the
+    pool, so the engine is known to be working when jobs start.
+    """
+    workers = []  # type: List[subprocess.Popen]
+    try:
+        for _ in range(count - worker_pool.size('cwlNodeEngine.js')):
+            nodejs = _start_js_engine('cwlNodeEngine.js', force_docker_pull)
+            returncode, stdout, _ = _communicate(
+                nodejs, json_dumps(code_fragment_to_js("1")) + "\n", timeout)
+            if returncode != 0 or stdout.strip() != "1":
+                raise JavascriptException(
+                    u"Javascript engine failed its health check")
+            workers.append(nodejs)
+    finally:
+        for nodejs in workers:
+            worker_pool.checkin('cwlNodeEngine.js', nodejs)
+    _logger.debug(u"Started %d Javascript engine processes", len(workers))
+
+
+def _start_js_engine(js_engine, force_docker_pull=False):
+    # type: (Text, bool) -> subprocess.Popen
+    from pkg_resources import resource_stream
+    res = resource_stream(__name__, js_engine)
+    js_engine_code = res.read().decode('utf-8')
+    return new_js_proc(js_engine_code, force_docker_pull=force_docker_pull)
+
+
+class EmbeddedTimeout(Exception):
+    pass
+
+
+class QuickJSEngine(object):
+    """Evaluate Javascript with the quickjs module, in a new context each time."""
+
+    name = "quickjs"
+
+    def eval(self, script, timeout):  # type: (Text, float) -> Any
+        context = quickjs.Context()
+        context.set_time_limit(timeout)
+        try:
+            return context.eval(script)
+        except quickjs.JSException as err:
+            if "interrupted" in Text(err):
+                raise EmbeddedTimeout()
+            raise JavascriptException(Text(err))
+
+
+class MiniRacerEngine(object):
+    """Evaluate Javascript with py_mini_racer, one V8 isolate per thread."""
+
+    name = "mini_racer"
+
+    def __init__(self):  # type: () -> None
+        """Initialize."""
+        self.local = threading.local()
+
+    def eval(self, script, timeout):  # type: (Text, float) -> Any
+        if not hasattr(self.local, "ctx"):
+            self.local.ctx = py_mini_racer.MiniRacer()
+        try:
+            return self.local.ctx.eval(script, timeout=int(timeout * 1000))
+        except py_mini_racer.JSTimeoutException:
+            raise EmbeddedTimeout()
+        except py_mini_racer.JSEvalException as err:
+            raise JavascriptException(Text(err))
+
+
+JS_ENGINES = ("node", "quickjs", "mini_racer")
+# engine used by execjs(); "node" runs a Node.js process
+js_engine = "node"
+embedded_engine = None  # type: Optional[Any]
+
+
+def set_js_engine(name):  # type: (Text) -> None
+    """Select how Javascript expressions are evaluated.
+
+    "quickjs" and "mini_racer" evaluate them inside this process and need
+    the quickjs or py_mini_racer module.  Javascript validation with jshint
+    always uses Node.js.
+    """
+    global js_engine, embedded_engine  # pylint: disable=global-statement
+    if name == "quickjs":
+        if quickjs is None:
+            raise JavascriptException(
+                u"The quickjs Javascript engine requires the quickjs module")
+        embedded_engine = QuickJSEngine()
+    elif name == "mini_racer":
+        if py_mini_racer is None:
+            raise JavascriptException(
+                u"The mini_racer Javascript engine requires the "
+                u"py_mini_racer module")
+        embedded_engine = MiniRacerEngine()
+    elif name == "node":
+        embedded_engine = None
+    else:
+        raise JavascriptException(
+            u"Unknown Javascript engine '{}', expected one of {}".format(
+                name, u", ".join(JS_ENGINES)))
+    js_engine = name
+
+
+# Runs a script produced by code_fragment_to_js() the way cwlNodeEngine.js
+# does, capturing console output like cwlNodeEngineJSConsole.js.
+EMBEDDED_TEMPLATE = u"""(function(){
+var log = [];
+function capture(kind) {
+  return function() {
+    log.push("[" + kind + "] " + Array.prototype.slice.call(arguments).join(" "));
+  };
+}
+var global = (0, eval)("this");
+global.console = {log: capture("log"), error: capture("err")};
+var result = (0, eval)(%s);
+return JSON.stringify([typeof result === "undefined" ? "undefined" : JSON.stringify(result), log]);
+})()"""
+
+
+def exec_js_inprocess(js_text,                  # type: Text
+                      timeout=default_timeout,  # type: float
+                      js_console=False          # type: bool
+                     ):  # type: (...) -> Tuple[int, Text, Text]
+    """Evaluate ``js_text`` with the embedded engine.
+
+    Returns the same (returncode, stdout, stderr) as exec_js_process().
+    """
+    if js_console:
+        _logger.warning(
+            "Running with support for javascript console in expressions (DO NOT USE IN PRODUCTION)")
+    try:
+        reply = embedded_engine.eval(EMBEDDED_TEMPLATE % json_dumps(js_text),
+                                     timeout)
+    except EmbeddedTimeout:
+        return -1, u"", u""
+    except JavascriptException as err:
+        return 1, u"", Text(err)
+    stdout, log = json.loads(reply)
+    return 0, stdout if stdout is not None else u"undefined", u"\n".join(log)
+
+
 def exec_js_process(js_text,                  # type: Text
                     timeout=default_timeout,  # type: float
                     js_console=False,         # type: bool
@@ -132,12 +425,18 @@ def exec_js_process(js_text,                  # type: Text
                    ):
     # type: (...) -> Tuple[int, Text, Text]
 
-    if not hasattr(localdata, "procs"):
-        localdata.procs = {}
-
     if js_console and context is not None:
         raise NotImplementedError("js_console=True and context not implemented")
 
+    profiler = expression_profiler.profiler
+    if embedded_engine is not None and context is None:
+        start = time.time()
+        try:
+            return exec_js_inprocess(js_text, timeout, js_console=js_console)
+        finally:
+            if profiler is not None:
+                profiler.record_engine(embedded_engine.name, time.time() - start)
+
     if js_console:
         js_engine = 'cwlNodeEngineJSConsole.js'
         _logger.warning(
@@ -147,30 +446,36 @@ def exec_js_process(js_text,                  # type: Text
     else:
         js_engine = 'cwlNodeEngine.js'
 
-    created_new_process = False
-
     if context is not None:
-        nodejs = localdata.procs.get((js_engine, context))
+        key = (js_engine, context)  # type: Any
     else:
-        nodejs = localdata.procs.get(js_engine)
-
-    if nodejs is None \
-            or nodejs.poll() is not None \
-            or onWindows():
-        res = resource_stream(__name__, js_engine)
-        js_engine_code = res.read().decode('utf-8')
+        key = js_engine
 
-        created_new_process = True
+    nodejs = worker_pool.checkout(key)
 
-        new_proc = new_js_proc(js_engine_code, force_docker_pull=force_docker_pull)
-
-        if context is None:
-            localdata.procs[js_engine] = new_proc
-            nodejs = new_proc
-        else:
-            localdata.procs[(js_engine, context)] = new_proc
-            nodejs = new_proc
+    stdin_text = u""
+    if nodejs is None:
+        nodejs = _start_js_engine(js_engine, force_docker_pull)
+        if context is not None:
+            stdin_text = json_dumps(context) + "\n"
+    stdin_text += json_dumps(js_text) + "\n"
 
+    returncode = -1
+    start = time.time()
+    try:
+        returncode, stdout, stderr = _communicate(nodejs, stdin_text, timeout)
+    finally:
+        worker_pool.checkin(key, nodejs, healthy=returncode == 0)
+        if profiler is not None:
+            profiler.record_engine("node", time.time() - start)
+    return returncode, stdout, stderr
+
+
+def _communicate(nodejs,      # type: subprocess.Popen
+                 stdin_text,  # type: Text
+                 timeout      # type: float
+                ):  # type: (...) -> Tuple[int, Text, Text]
+    """Send one request to a Javascript engine process and read its reply."""
     killed = []
 
     def terminate():  # type: () -> None
@@ -185,11 +490,6 @@ def exec_js_process(js_text,                  # type: Text
     timer.daemon = True
     timer.start()
 
-    stdin_text = u""
-    if created_new_process and context is not None:
-        stdin_text = json_dumps(context) + "\n"
-    stdin_text += json_dumps(js_text) + "\n"
-
     stdin_buf = BytesIO(stdin_text.encode('utf-8'))
     stdout_buf = BytesIO()
     stderr_buf = BytesIO()
@@ -297,19 +597,13 @@ def exec_js_process(js_text,                  # type: Text
     stdoutdata = stdout_buf.getvalue()[:-len(PROCESS_FINISHED_STR) - 1]
     stderrdata = stderr_buf.getvalue()[:-len(PROCESS_FINISHED_STR) - 1]
 
-    nodejs.poll()
-
-    if nodejs.poll() not in (None, 0):
-        if killed:
-            returncode = -1
-        else:
-            returncode = nodejs.returncode
+    # the process may not have been reaped yet right after a timeout kill
+    if killed:
+        returncode = -1
+    elif nodejs.poll() not in (None, 0):
+        returncode = nodejs.returncode
     else:
         returncode = 0
-        # On windows currently a new instance of nodejs process is used due to
-        # problem with blocking on read operation on windows
-        if onWindows():
-            nodejs.kill()
 
     return returncode, stdoutdata.decode('utf-8'), stderrdata.decode('utf-8')
 
@@ -380,3 +674,85 @@ def execjs(js,                       # type: Text
         raise_from(JavascriptException(
             u"{}\nscript was:\n{}\nstdout was: '{}'\nstderr was: '{}'\n".format(
                 err, fn_linenum(), stdout, stderr)), err)
+
+
+# Time allowed on top of the timeout for a batch request to reach the
+# engine and come back.
+BATCH_ALLOWANCE = 1.0
+
+
+def execjs_batch(fragments,                # type: List[Text]
+                 jslib,                    # type: Text
+                 timeout,                  # type: float
+                 force_docker_pull=False,  # type: bool
+                 debug=False,              # type: bool
+                 js_console=False          # type: bool
+                ):  # type: (...) -> List[JSON]
+    """Evaluate several code fragments sharing ``jslib`` in few requests.
+
+    ``jslib`` (and so the job inputs it declares) is sent to the engine
+    once per request, but runs again for each fragment in a new function
+    scope, so what a fragment does to ``inputs``, ``self`` or the
+    expressionLib does not reach the next one.
+
+    A request is killed after ``timeout`` (and BATCH_ALLOWANCE), and does
+    not start another fragment once half of that has passed; the fragments
+    left go in the next request.  A fragment that took longer than
+    ``timeout``, threw or evaluated to ``undefined`` is evaluated again on
+    its own with execjs(), as are, one after the other, the fragments of a
+    request that was killed, so the result or error is the same as
+    without batching.
+    """
+    bodies = []
+    for jscript in fragments:
+        if isinstance(jscript, six.string_types) \
+                and len(jscript) > 1 and jscript[0] == '{':
+            bodies.append(jscript)
+        else:
+            bodies.append(u"return (%s);" % jscript)
+
+    def evaluate(js):  # type: (Text) -> JSON
+        return execjs(js, jslib, timeout, force_docker_pull=force_docker_pull,
+                      debug=debug, js_console=js_console)
+
+    values = []  # type: List[JSON]
+    while len(values) < len(fragments):
+        first = len(values)
+        fn = (u"\"use strict\";\nvar _cwl_jslib = {};\nvar _cwl_limit = {};\n"
+              u"var _cwl_start = Date.now();\n[{}].map(function(body, i){{"
+              u"if(i>0&&Date.now()-_cwl_start>_cwl_limit/2){{return null;}}"
+              u"var start = Date.now();"
+              u"try{{var v=(new Function(_cwl_jslib + body))();"
+              u"return typeof v===\"undefined\"||Date.now()-start>_cwl_limit?"
+              u"[false]:[true,v];}}"
+              u"catch(e){{return [false];}}}})").format(
+                  json_dumps(u"\"use strict\";\n" + jslib + u"\n"),
+                  int(timeout * 1000),
+                  u",\n".join(json_dumps(body) for body in bodies[first:]))
+
+        returncode, stdout, stderr = exec_js_process(
+            fn, timeout + BATCH_ALLOWANCE, js_console=js_console,
+            force_docker_pull=force_docker_pull)
+
+        results = None  # type: Optional[List[Any]]
+        if returncode == 0:
+            try:
+                results = json.loads(stdout)
+            except ValueError:
+                pass
+        if not isinstance(results, list) \
+                or len(results) != len(fragments) - first:
+            # killed, or the engine failed: no results to trust
+            values.extend(evaluate(js) for js in fragments[first:])
+            break
+        if js_console and stderr:
+            _logger.info("Javascript console output:")
+            _logger.info("----------------------------------------")
+            _logger.info('\n'.join(re.findall(
+                r'^[[](?:log|err)[]].*$', stderr, flags=re.MULTILINE)))
+            _logger.info("----------------------------------------")
+        for js, result in zip(fragments[first:], results):
+            if result is None:
+                break  # not started, left for the next request
+            values.append(result[1] if result[0] else evaluate(js))
+    return values
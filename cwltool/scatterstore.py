@@ -0,0 +1,138 @@
+"""Compact storage for the outputs of scattered workflow steps."""
+from __future__ import absolute_import
+
+import tempfile
+import threading
+from typing import Any, Dict, List, MutableMapping, Optional, Tuple
+
+from six import iteritems, string_types
+from six.moves import cPickle as pickle
+from typing_extensions import Text  # pylint: disable=unused-import
+# move to a regular typing import when Python 3.3-3.6 is no longer supported
+
+from .utils import DEFAULT_TMP_PREFIX
+
+
+class ScatterOutputStore(object):
+    """Hold the per-index outputs of a scatter until they are all received.
+
+    Values are packed as they arrive: mappings become a shared tuple of keys
+    plus a tuple of values, and every key and string is interned in a table
+    local to the store, so thousands of File objects with the same fields
+    (``class``, ``location``, ``checksum``, ...) share their key storage.
+    Once more than ``spill_threshold`` entries are held in memory, further
+    entries are pickled to an anonymous temporary file.
+
+    The ``{output_id: [value, ...]}`` structure expected by the rest of the
+    workflow engine is only built by ``materialize()``, once the downstream
+    step actually needs it.  Results of inner scatters (nested crossproduct)
+    can be added with ``put_store()`` and stay packed until then.
+    """
+
+    def __init__(self,
+                 keys,                  # type: List[Text]
+                 total,                 # type: int
+                 spill_threshold=None,  # type: Optional[int]
+                 tmpdir_prefix=DEFAULT_TMP_PREFIX  # type: Text
+                ):  # type: (...) -> None
+        """Initialize."""
+        self._strings = {}  # type: Dict[Text, Text]
+        self._shapes = {}  # type: Dict[Tuple[Text, ...], Tuple[Text, ...]]
+        self.keys = [self._intern(k) for k in keys]
+        self._key_index = dict((k, i) for i, k in enumerate(self.keys))
+        self.total = total
+        self.spill_threshold = spill_threshold
+        self.tmpdir_prefix = tmpdir_prefix
+        self._entries = {}  # type: Dict[int, Any]
+        self._spilled = {}  # type: Dict[int, int]
+        self._spillfile = None  # type: Optional[Any]
+        self._lock = threading.Lock()
+
+    def _intern(self, value):  # type: (Text) -> Text
+        return self._strings.setdefault(value, value)
+
+    def _pack(self, value):  # type: (Any) -> Any
+        if isinstance(value, string_types):
+            return self._intern(value)
+        if isinstance(value, MutableMapping):
+            keys = tuple(self._intern(k) for k in value)
+            keys = self._shapes.setdefault(keys, keys)
+            return (keys, tuple(self._pack(v) for v in value.values()))
+        if isinstance(value, list):
+            return [self._pack(v) for v in value]
+        return value
+
+    def _unpack(self, value):  # type: (Any) -> Any
+        if isinstance(value, tuple):
+            return dict(zip(value[0], (self._unpack(v) for v in value[1])))
+        if isinstance(value, list):
+            return [self._unpack(v) for v in value]
+        return value
+
+    def _store(self, index, entry):  # type: (int, List[Any]) -> None
+        if self.spill_threshold is not None \
+                and len(self._entries) >= self.spill_threshold:
+            if self._spillfile is None:
+                self._spillfile = tempfile.TemporaryFile(
+                    prefix=self.tmpdir_prefix)
+            self._spillfile.seek(0, 2)
+            offset = self._spillfile.tell()
+            pickle.dump(entry, self._spillfile, pickle.HIGHEST_PROTOCOL)
+            self._spilled[index] = offset
+            self._entries.pop(index, None)
+        else:
+            self._entries[index] = entry
+            self._spilled.pop(index, None)
+
+    def _load(self, index):  # type: (int) -> Optional[List[Any]]
+        if index in self._entries:
+            return self._entries[index]
+        if index in self._spilled and self._spillfile is not None:
+            self._spillfile.seek(self._spilled[index])
+            return pickle.load(self._spillfile)
+        return None
+
+    def put(self, index, jobout):
+        # type: (int, MutableMapping[Text, Any]) -> None
+        """Record the outputs of the scatter element at ``index``."""
+        entry = [None] * len(self.keys)  # type: List[Any]
+        for key, val in iteritems(jobout):
+            entry[self._key_index[key]] = self._pack(val)
+        with self._lock:
+            self._store(index, entry)
+
+    def put_store(self, index, store):
+        # type: (int, ScatterOutputStore) -> None
+        """Record the still packed outputs of an inner scatter."""
+        with self._lock:
+            self._entries[index] = store
+            self._spilled.pop(index, None)
+
+    def materialize(self):  # type: () -> Dict[Text, List[Any]]
+        """Build the ``{output_id: [value, ...]}`` mapping."""
+        with self._lock:
+            output = dict(
+                (k, [None] * self.total) for k in self.keys
+            )  # type: Dict[Text, List[Any]]
+            for index in range(self.total):
+                entry = self._load(index)
+                if entry is None:
+                    continue
+                if isinstance(entry, ScatterOutputStore):
+                    inner = entry.materialize()
+                    entry.close()
+                    for key in self.keys:
+                        output[key][index] = inner.get(key)
+                    continue
+                for pos, val in enumerate(entry):
+                    output[self.keys[pos]][index] = self._unpack(val)
+            return output
+
+    def close(self):  # type: () -> None
+        """Drop the stored entries and any spill file."""
+        with self._lock:
+            self._entries.clear()
+            self._spilled.clear()
+            if self._spillfile is not None:
+                self._spillfile.close()
+                self._spillfile = None
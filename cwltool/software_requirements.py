@@ -18,15 +18,17 @@ from typing_extensions import Text  # pylint: disable=unused-import
 
 from .builder import Builder, HasReqsHints
 try:
-    from galaxy.tools.deps.requirements import ToolRequirement, ToolRequirements
-    from galaxy.tools import deps
-except ImportError:
-    ToolRequirement = None  # type: ignore
-    ToolRequirements = None  # type: ignore
-    deps = None  # type: ignore
+    from importlib.util import find_spec
+except ImportError:  # Python 2
+    from pkgutil import find_loader as find_spec  # type: ignore
 
+# galaxy-lib is slow to import, so it is only loaded once it is needed, by
+# ensure_galaxy_lib_available()
+ToolRequirement = None  # type: ignore
+ToolRequirements = None  # type: ignore
+deps = None  # type: ignore
 
-SOFTWARE_REQUIREMENTS_ENABLED = deps is not None
+SOFTWARE_REQUIREMENTS_ENABLED = find_spec("galaxy") is not None
 
 COMMAND_WITH_DEPENDENCIES_TEMPLATE = string.Template("""#!/bin/bash
 $handle_dependencies
@@ -125,5 +127,12 @@ def get_container_from_software_requirements(use_biocontainers, builder):
 
 def ensure_galaxy_lib_available():
     # type: () -> None
-    if not SOFTWARE_REQUIREMENTS_ENABLED:
+    global ToolRequirement, ToolRequirements, deps  # pylint: disable=global-statement
+    if SOFTWARE_REQUIREMENTS_ENABLED and deps is None:
+        try:
+            from galaxy.tools.deps.requirements import ToolRequirement, ToolRequirements
+            from galaxy.tools import deps
+        except ImportError:
+            pass
+    if deps is None:
         raise Exception("Optional Python library galaxy-lib not available, it is required for this configuration.")
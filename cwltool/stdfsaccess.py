@@ -4,7 +4,7 @@ from __future__ import absolute_import
 import glob
 import os
 from io import open
-from typing import IO, Any, List
+from typing import IO, Any, Dict, List, Optional, Set
 
 from schema_salad.ref_resolver import file_uri, uri_file_path
 from six.moves import urllib
@@ -57,6 +57,26 @@ class StdFsAccess(object):
     def listdir(self, fn):  # type: (Text) -> List[Text]
         return [abspath(urllib.parse.quote(str(l)), fn) for l in os.listdir(self._abs(fn))]
 
+    def listdir_classes(self, fn):  # type: (Text) -> Dict[Text, Optional[Text]]
+        """The names in directory ``fn``, with "File", "Directory" or None.
+
+        None is for entries whose type the listing does not tell.
+        """
+        if not hasattr(os, "scandir"):
+            return dict.fromkeys(os.listdir(self._abs(fn)))
+        classes = {}  # type: Dict[Text, Optional[Text]]
+        for entry in os.scandir(self._abs(fn)):  # type: ignore
+            try:
+                if entry.is_dir():
+                    classes[entry.name] = "Directory"
+                elif entry.is_file():
+                    classes[entry.name] = "File"
+                else:
+                    classes[entry.name] = None
+            except OSError:
+                classes[entry.name] = None
+        return classes
+
     def join(self, path, *paths):  # type: (Text, *Text) -> Text
         return os.path.join(path, *paths)
 
@@ -70,3 +90,55 @@ class StdFsAccess(object):
                 return path
             return '/'+path
         return self.realpath(path)
+
+
+class ListingCache(object):
+    """Answer existence and type checks from one listing per directory.
+
+    Checking many candidate files (such as secondaryFiles) one by one
+    costs a round trip each on remote file systems; listing their parent
+    directory once, with the type of each entry, answers all the checks
+    for that directory.
+    """
+
+    def __init__(self, fs_access):  # type: (StdFsAccess) -> None
+        """Check existence with ``fs_access``."""
+        self.fs_access = fs_access
+        self.listings = {}  # type: Dict[Text, Optional[Dict[Text, Optional[Text]]]]
+
+    def _classes(self, fn):  # type: (Text) -> Optional[Dict[Text, Optional[Text]]]
+        dirname, _, basename = fn.rstrip("/").rpartition("/")
+        if not dirname or not basename:
+            return None
+        if dirname not in self.listings:
+            try:
+                self.listings[dirname] = self.fs_access.listdir_classes(dirname)
+            except Exception:  # pylint: disable=broad-except
+                # not a listable directory, check entries individually
+                self.listings[dirname] = None
+        return self.listings[dirname]
+
+    @staticmethod
+    def _basename(fn):  # type: (Text) -> Text
+        return urllib.parse.unquote(fn.rstrip("/").rpartition("/")[2])
+
+    def exists(self, fn):  # type: (Text) -> bool
+        classes = self._classes(fn)
+        if classes is None:
+            return self.fs_access.exists(fn)
+        return self._basename(fn) in classes
+
+    def classify(self, fn):  # type: (Text) -> Optional[Text]
+        """The class of ``fn``, File or Directory, or None if it is missing."""
+        classes = self._classes(fn)
+        if classes is not None:
+            basename = self._basename(fn)
+            if basename not in classes:
+                return None
+            if classes[basename] is not None:
+                return classes[basename]
+        if self.fs_access.isfile(fn):
+            return "File"
+        if self.fs_access.isdir(fn):
+            return "Directory"
+        return None
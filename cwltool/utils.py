@@ -2,6 +2,7 @@
 from __future__ import absolute_import
 
 import collections
+import copy
 import os
 import platform
 import random
@@ -14,9 +15,10 @@ from typing import (IO, Any, AnyStr, Callable,  # pylint: disable=unused-import
                     Dict, Iterable, List, MutableMapping, MutableSequence,
                     Optional, Union)
 
-import pkg_resources
 from mypy_extensions import TypedDict
+from ruamel.yaml.comments import CommentedMap, CommentedSeq, LineCol
 from schema_salad.utils import json_dump, json_dumps  # pylint: disable=unused-import
+from six import integer_types, text_type
 from six.moves import urllib, zip_longest
 from typing_extensions import Deque, Text  # pylint: disable=unused-import
 # move to a regular typing import when Python 3.3-3.6 is no longer supported
@@ -45,6 +47,7 @@ processes_to_kill = collections.deque()  # type: Deque[subprocess.Popen]
 def versionstring():
     # type: () -> Text
     """Version of CWLtool used to execute the workflow."""
+    import pkg_resources  # part of setuptools
     pkg = pkg_resources.require("cwltool")
     if pkg:
         return u"%s %s" % (sys.argv[0], pkg[0].version)
@@ -211,6 +214,45 @@ def bytes2str_in_dicts(inp  # type: Union[MutableMapping[Text, Any], MutableSequ
     return inp
 
 
+_JSON_SCALARS = frozenset((type(None), bool, float, bytes, text_type)
+                          + integer_types)
+
+
+def deepcopy_json(value, memo=None):
+    # type: (Any, Optional[Dict[int, Any]]) -> Any
+    """
+    Copy JSON-like data (dicts, lists and scalars) as copy.deepcopy does.
+
+    Much faster than copy.deepcopy for such data.  The copies of ruamel's
+    CommentedMap and CommentedSeq share the line and column information of
+    the originals; other objects are copied with copy.deepcopy.
+    """
+    cls = type(value)
+    if cls in _JSON_SCALARS:
+        return value
+    if memo is None:
+        memo = {}
+    elif id(value) in memo:
+        return memo[id(value)]
+    if cls is dict or cls is CommentedMap:
+        result = cls()  # type: Any
+        memo[id(value)] = result
+        for key, item in value.items():
+            result[key] = item if type(item) in _JSON_SCALARS \
+                else deepcopy_json(item, memo)
+    elif cls is list or cls is CommentedSeq:
+        result = cls()
+        memo[id(value)] = result
+        for item in value:
+            result.append(item if type(item) in _JSON_SCALARS
+                          else deepcopy_json(item, memo))
+    else:
+        return copy.deepcopy(value, memo)
+    if cls is not dict and cls is not list and hasattr(value, LineCol.attrib):
+        setattr(result, LineCol.attrib, getattr(value, LineCol.attrib))
+    return result
+
+
 def visit_class(rec, cls, op):
     # type: (Any, Iterable[Any], Union[Callable[..., Any], partial[Any]]) -> None
     """Apply a function to with "class" in cls."""
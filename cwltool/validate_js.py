@@ -1,12 +1,16 @@
 import copy
+import errno
+import hashlib
 import itertools
 import json
 import logging
+import os
+import tempfile
+import threading
 from collections import namedtuple
 from typing import (cast, Any, Dict, List, MutableMapping, MutableSequence,
                     Optional, Tuple, Union)
 
-from pkg_resources import resource_stream
 from ruamel.yaml.comments import CommentedMap  # pylint: disable=unused-import
 from six import string_types
 from typing_extensions import Text  # pylint: disable=unused-import
@@ -87,9 +91,107 @@ def get_expressions(tool,             # type: Union[CommentedMap, Text]
 
 JSHintJSReturn = namedtuple("jshint_return", ["errors", "globals"])
 
+_jshint_lock = threading.Lock()
+_jshint_functions = []  # type: List[Text]
+
+
+def jshint_functions():  # type: () -> Text
+    """The jshint library and its wrapper, read once."""
+    with _jshint_lock:
+        if not _jshint_functions:
+            from pkg_resources import resource_stream
+            with resource_stream(__name__, "jshint/jshint.js") as file:
+                # NOTE: we need a global variable for lodash (which jshint depends on)
+                jshint_functions_text = "var global = this;" + file.read().decode('utf-8')
+
+            with resource_stream(__name__, "jshint/jshint_wrapper.js") as file:
+                # NOTE: we need to assign to ob, as the expression {validateJS: validateJS} as an expression
+                # is interpreted as a block with a label `validateJS`
+                jshint_functions_text += "\n" + file.read().decode('utf-8') + "\nvar ob = {validateJS: validateJS}; ob"
+            _jshint_functions.append(jshint_functions_text)
+        return _jshint_functions[0]
+
+
+class JSHintCache(object):
+    """jshint results, in memory and optionally in a directory.
+
+    Results are keyed by a hash of the jshint library, the code, the
+    globals and the options, so a cache directory can be shared between
+    runs and between users of different cwltool versions.
+    """
+
+    def __init__(self, directory=None):  # type: (Optional[Text]) -> None
+        """Initialize."""
+        self.directory = directory
+        self.results = {}  # type: Dict[Text, JSHintJSReturn]
+        self.jshint_digest = None  # type: Optional[Text]
+        self.lock = threading.Lock()
+
+    def key(self, js_text, globals, options):
+        # type: (Text, List[Text], Dict[Text, Any]) -> Text
+        if self.jshint_digest is None:
+            self.jshint_digest = hashlib.sha256(
+                jshint_functions().encode("utf-8")).hexdigest()
+        return hashlib.sha256(json_dumps(
+            [self.jshint_digest, js_text, globals, options],
+            sort_keys=True).encode("utf-8")).hexdigest()
+
+    def get(self, key):  # type: (Text) -> Optional[JSHintJSReturn]
+        with self.lock:
+            if key in self.results:
+                return self.results[key]
+        if self.directory is None:
+            return None
+        try:
+            with open(os.path.join(self.directory, key + ".json")) as handle:
+                errors, js_globals = json.load(handle)
+        except (IOError, OSError, ValueError):
+            return None
+        result = JSHintJSReturn(errors, js_globals)
+        with self.lock:
+            self.results[key] = result
+        return result
+
+    def put(self, key, result):  # type: (Text, JSHintJSReturn) -> None
+        with self.lock:
+            self.results[key] = result
+        if self.directory is None:
+            return
+        try:
+            try:
+                os.makedirs(self.directory)
+            except OSError as err:
+                if err.errno != errno.EEXIST:
+                    raise
+            # write then rename, so readers never see a partial file
+            handle, tmp = tempfile.mkstemp(dir=self.directory)
+            with os.fdopen(handle, "w") as tmpfile:
+                json.dump([result.errors, result.globals], tmpfile)
+            os.rename(tmp, os.path.join(self.directory, key + ".json"))
+        except (IOError, OSError) as err:
+            _logger.debug(u"Could not write jshint cache in %s: %s",
+                          self.directory, Text(err))
+
+
+_jshint_caches = {}  # type: Dict[Optional[Text], JSHintCache]
+
+
+def jshint_cache(directory=None):  # type: (Optional[Text]) -> JSHintCache
+    """The cache of jshint results kept in ``directory``, if any."""
+    with _jshint_lock:
+        if directory not in _jshint_caches:
+            _jshint_caches[directory] = JSHintCache(directory)
+        return _jshint_caches[directory]
+
+
+# Number of jshint runs to do at the same time for one tool.
+JSHINT_WORKERS = 4
+
+
 def jshint_js(js_text,       # type: Text
               globals=None,  # type: Optional[List[Text]]
-              options=None   # type: Optional[Dict[Text, Union[List[Text], Text, int]]]
+              options=None,  # type: Optional[Dict[Text, Union[List[Text], Text, int]]]
+              cache=None     # type: Optional[JSHintCache]
              ):  # type: (...) -> Tuple[List[Text], List[Text]]
     if globals is None:
         globals = []
@@ -103,14 +205,13 @@ def jshint_js(js_text,       # type: Text
             "esversion": 5
         }
 
-    with resource_stream(__name__, "jshint/jshint.js") as file:
-        # NOTE: we need a global variable for lodash (which jshint depends on)
-        jshint_functions_text = "var global = this;" + file.read().decode('utf-8')
+    if cache is not None:
+        key = cache.key(js_text, globals, options)
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
 
-    with resource_stream(__name__, "jshint/jshint_wrapper.js") as file:
-        # NOTE: we need to assign to ob, as the expression {validateJS: validateJS} as an expression
-        # is interpreted as a block with a label `validateJS`
-        jshint_functions_text += "\n" + file.read().decode('utf-8') + "\nvar ob = {validateJS: validateJS}; ob"
+    jshint_functions_text = jshint_functions()
 
     returncode, stdout, stderr = exec_js_process(
         "validateJS(%s)" % json_dumps({
@@ -151,7 +252,10 @@ def jshint_js(js_text,       # type: Text
         text += u"JSHINT: %s: %s" % (jshint_error_obj["code"], jshint_error_obj["reason"])
         jshint_errors.append(text)
 
-    return JSHintJSReturn(jshint_errors, jshint_json.get("globals", []))
+    result = JSHintJSReturn(jshint_errors, jshint_json.get("globals", []))
+    if cache is not None:
+        cache.put(key, result)
+    return result
 
 
 def print_js_hint_messages(js_hint_messages, source_line):
@@ -162,7 +266,8 @@ def print_js_hint_messages(js_hint_messages, source_line):
 
 def validate_js_expressions(tool,                # type: CommentedMap
                             schema,              # type: Schema
-                            jshint_options=None  # type: Optional[Dict[Text, Union[List[Text], Text, int]]]
+                            jshint_options=None,  # type: Optional[Dict[Text, Union[List[Text], Text, int]]]
+                            cache_dir=None        # type: Optional[Text]
                            ):  # type: (...) -> None
 
     if tool.get("requirements") is None:
@@ -179,15 +284,17 @@ def validate_js_expressions(tool,                # type: CommentedMap
     else:
         return
 
+    cache = jshint_cache(cache_dir)
     js_globals = copy.deepcopy(default_globals)
 
     for i, expression_lib_line in enumerate(expression_lib):
-        expression_lib_line_errors, expression_lib_line_globals = jshint_js(expression_lib_line, js_globals, jshint_options)
+        expression_lib_line_errors, expression_lib_line_globals = jshint_js(expression_lib_line, js_globals, jshint_options, cache)
         js_globals.extend(expression_lib_line_globals)
         print_js_hint_messages(expression_lib_line_errors, SourceLine(expression_lib, i))
 
     expressions = get_expressions(tool, schema)
 
+    fragments = []  # type: List[Tuple[Text, Optional[SourceLine]]]
     for expression, source_line in expressions:
         unscanned_str = expression.strip()
         try:
@@ -202,9 +309,39 @@ def validate_js_expressions(tool,                # type: CommentedMap
         while scan_slice:
             if unscanned_str[scan_slice[0]] == '$':
                 code_fragment = unscanned_str[scan_slice[0] + 1:scan_slice[1]]
-                code_fragment_js = code_fragment_to_js(code_fragment, "")
-                expression_errors, _ = jshint_js(code_fragment_js, js_globals, jshint_options)
-                print_js_hint_messages(expression_errors, source_line)
+                fragments.append((code_fragment_to_js(code_fragment, ""), source_line))
 
             unscanned_str = unscanned_str[scan_slice[1]:]
             scan_slice = scan_expression(unscanned_str)
+
+    # the fragments only depend on the expressionLib globals, so they are
+    # checked concurrently, each on its own Javascript engine process
+    results = [None] * len(fragments)  # type: List[Any]
+    pending = list(enumerate(fragments))
+    pending_lock = threading.Lock()
+    failures = []  # type: List[Exception]
+
+    def check_fragments():  # type: () -> None
+        while True:
+            with pending_lock:
+                if not pending or failures:
+                    return
+                index, (code_fragment_js, _) = pending.pop(0)
+            try:
+                results[index] = jshint_js(code_fragment_js, js_globals, jshint_options, cache)
+            except Exception as err:  # pylint: disable=broad-except
+                failures.append(err)
+
+    workers = [threading.Thread(target=check_fragments)
+               for _ in range(min(JSHINT_WORKERS, len(fragments)) - 1)]
+    for worker in workers:
+        worker.daemon = True
+        worker.start()
+    check_fragments()
+    for worker in workers:
+        worker.join()
+    if failures:
+        raise failures[0]
+
+    for (_, source_line), (expression_errors, _) in zip(fragments, results):
+        print_js_hint_messages(expression_errors, source_line)
@@ -13,18 +13,20 @@ from typing import (Any, Callable, Dict, Generator, Iterable, List,
 from uuid import UUID  # pylint: disable=unused-import
 
 import threading
+import uuid
 from ruamel.yaml.comments import CommentedMap
 from schema_salad import validate
-from schema_salad.sourceline import SourceLine
+from schema_salad.sourceline import SourceLine, set_start
 from six import string_types, iteritems
 from six.moves import range
 from future.utils import raise_from
-from typing_extensions import Text  # pylint: disable=unused-import
+from typing_extensions import (TYPE_CHECKING,  # pylint: disable=unused-import
+                               Text)
 # move to a regular typing import when Python 3.3-3.6 is no longer supported
 
-from . import command_line_tool, context, expression, procgenerator
+from . import command_line_tool, context, expression, fusion, procgenerator
 from .command_line_tool import CallbackJob, ExpressionTool
-from .job import JobBase
+from .job import JobBase, JobBatch
 from .builder import content_limit_respected_read
 from .checker import can_assign_src_to_sink, static_checker
 from .context import LoadingContext  # pylint: disable=unused-import
@@ -35,12 +37,17 @@ from .loghandler import _logger
 from .mutation import MutationManager  # pylint: disable=unused-import
 from .pathmapper import adjustDirObjs, get_listing
 from .process import Process, get_overrides, shortname, uniquename
-from .provenance import ProvenanceProfile
+from .scatterstore import ScatterOutputStore
 from .software_requirements import (  # pylint: disable=unused-import
     DependenciesConfiguration)
 from .stdfsaccess import StdFsAccess
 from .utils import DEFAULT_TMP_PREFIX, aslist, json_dumps
 
+if TYPE_CHECKING:
+    from .provenance import ProvenanceProfile  # pylint: disable=unused-import
+
+SCATTER_BATCH = "http://commonwl.org/cwltool#ScatterBatch"
+
 WorkflowStateItem = namedtuple('WorkflowStateItem', ['parameter', 'value', 'success'])
 
 
@@ -223,6 +230,16 @@ class WorkflowJob(object):
             self.parent_wf = workflow.parent_wf
         self.steps = [WorkflowJobStep(s) for s in workflow.steps]
         self.state = {}  # type: Dict[Text, Optional[WorkflowStateItem]]
+        self.fusion_chains = {}  # type: Dict[Text, List[Text]]
+        # provenance records the outputs of every step, including the
+        # fused: locations of the files kept inside a fused job
+        if runtimeContext.step_fusion and not runtimeContext.cachedir \
+                and runtimeContext.research_obj is None \
+                and runtimeContext.make_fused_job is not None:
+            self.fusion_chains = fusion.fusible_chains(workflow)
+            for chain in self.fusion_chains.values():
+                _logger.info(u"Fusing steps %s", u", ".join(
+                    shortname(s) for s in chain))
         self.processStatus = u""
         self.did_callback = False
         self.made_progress = None  # type: Optional[bool]
@@ -393,6 +410,13 @@ class WorkflowJob(object):
                 elif method == "flat_crossproduct":
                     jobs = flat_crossproduct_scatter(
                         step, inputobj, scatter, callback, runtimeContext)
+
+                (batch, _) = step.step.get_requirement(SCATTER_BATCH)
+                if batch and runtimeContext.make_job_batch is not None \
+                        and step.step.embedded_tool.tool["class"] == "CommandLineTool":
+                    batch_size = int(batch.get("batchSize", 1))
+                    if batch_size > 1:
+                        jobs = batch_scatter_jobs(jobs, batch_size, runtimeContext)
             else:
                 if _logger.isEnabledFor(logging.DEBUG):
                     _logger.debug(u"[job %s] job input %s", step.name,
@@ -403,7 +427,12 @@ class WorkflowJob(object):
                 if _logger.isEnabledFor(logging.DEBUG):
                     _logger.debug(u"[job %s] evaluated job input to %s",
                                   step.name, json_dumps(inputobj, indent=4))
-                jobs = step.job(inputobj, callback, runtimeContext)
+                if step.id in self.fusion_chains:
+                    jobs = self.fused_jobs(
+                        step, inputobj, callback, final_output_callback,
+                        runtimeContext)
+                else:
+                    jobs = step.job(inputobj, callback, runtimeContext)
 
             step.submitted = True
 
@@ -417,6 +446,77 @@ class WorkflowJob(object):
             step.completed = True
 
 
+    def fused_jobs(self,
+                   step,                   # type: WorkflowJobStep
+                   inputobj,               # type: Dict[Text, Any]
+                   callback,               # type: Callable[[Any, Any], Any]
+                   final_output_callback,  # type: Callable[[Any, Any], Any]
+                   runtimeContext          # type: RuntimeContext
+                  ):  # type: (...) -> Generator[Union[ExpressionTool.ExpressionJob, JobBase, JobBatch, CallbackJob, None], None, None]
+        """Build the jobs of a fusible chain starting at ``step``.
+
+        Each downstream job is made from the outputs its predecessor is
+        predicted to produce, and the whole chain is handed over as a single
+        job made by runtimeContext.make_fused_job.  The chain is cut short at
+        the first step that cannot be made that way.
+        """
+        assert runtimeContext.make_fused_job is not None  # nosec
+        supportsMultipleInput = bool(self.workflow.get_requirement(
+            "MultipleInputFeatureRequirement")[0])
+        steps_by_id = dict((s.id, s) for s in self.steps)
+
+        def member_context():  # type: () -> RuntimeContext
+            # Members share the node, so each one needs its own output
+            # directory.
+            context = runtimeContext.copy()
+            context.docker_outdir = u"/" + uuid.uuid4().hex
+            return context
+
+        jobs = step.job(inputobj, callback, member_context())
+        head = next(jobs, None)
+        if not isinstance(head, JobBase):
+            yield head
+            for j in jobs:
+                yield j
+            return
+
+        members = [head]  # type: List[JobBase]
+        predicted = []  # type: List[Dict[Text, Any]]
+        current = step
+        for next_id in self.fusion_chains[step.id][1:]:
+            following = steps_by_id[next_id]
+            if following.submitted:
+                break
+            outputs = fusion.predict_outputs(current.step, members[-1].builder)
+            state = dict(self.state)
+            for param in current.tool["outputs"]:
+                state[param["id"]] = WorkflowStateItem(
+                    param, outputs[shortname(param["id"])], "success")
+            following_input = object_from_state(
+                state, following.tool["inputs"], False,
+                supportsMultipleInput, "source")
+            if following_input is None:
+                break
+            following_job = next(following.job(
+                following_input,
+                functools.partial(self.receive_output, following,
+                                  following.tool["outputs"],
+                                  final_output_callback),
+                member_context()), None)
+            if not isinstance(following_job, JobBase):
+                raise WorkflowException(
+                    u"Cannot fuse step '%s' with '%s'" % (
+                        shortname(current.id), shortname(following.id)))
+            following.submitted = True
+            predicted.append(outputs)
+            members.append(following_job)
+            current = following
+
+        if len(members) == 1:
+            yield head
+        else:
+            yield runtimeContext.make_fused_job(members, predicted)
+
     def run(self,
             runtimeContext,   # type: RuntimeContext
             tmpdir_lock=None  # type: Optional[threading.Lock]
@@ -518,6 +618,7 @@ class Workflow(Process):
             if is_master:
                 run_uuid = loadingContext.research_obj.ro_uuid
 
+            from .provenance import ProvenanceProfile
             self.provenance_object = ProvenanceProfile(
                 loadingContext.research_obj,
                 full_name=loadingContext.cwl_full_name,
@@ -695,8 +796,7 @@ class WorkflowStep(Process):
                                         [shortname(tool_entry["id"]) for tool_entry in
                                          self.embedded_tool.tool['outputs']]))))
                 param["id"] = inputid
-                param.lc.line = toolpath_object[stepfield].lc.data[index][0]
-                param.lc.col = toolpath_object[stepfield].lc.data[index][1]
+                set_start(param, toolpath_object[stepfield].lc.data[index])
                 param.lc.filename = toolpath_object[stepfield].lc.filename
                 toolpath_object[toolfield].append(param)
 
@@ -822,21 +922,25 @@ class WorkflowStep(Process):
 class ReceiveScatterOutput(object):
     def __init__(self,
                  output_callback,  # type: Callable[..., Any]
-                 dest,             # type: Dict[Text, List[Optional[Text]]]
-                 total             # type: int
+                 store,            # type: ScatterOutputStore
+                 total,            # type: int
+                 materialize=True  # type: bool
                 ):  # type: (...) -> None
         """Initialize."""
-        self.dest = dest
+        self.store = store
         self.completed = 0
         self.processStatus = u"success"
         self.total = total
         self.output_callback = output_callback
+        self.materialize = materialize
         self.steps = []  # type: List[Optional[Generator[Union[ExpressionTool.ExpressionJob, JobBase, CallbackJob, None], None, None]]]
 
     def receive_scatter_output(self, index, jobout, processStatus):
-        # type: (int, Dict[Text, Text], Text) -> None
-        for key, val in jobout.items():
-            self.dest[key][index] = val
+        # type: (int, Union[Dict[Text, Text], ScatterOutputStore], Text) -> None
+        if isinstance(jobout, ScatterOutputStore):
+            self.store.put_store(index, jobout)
+        else:
+            self.store.put(index, jobout)
 
         # Release the iterable related to this step to
         # reclaim memory.
@@ -850,13 +954,72 @@ class ReceiveScatterOutput(object):
         self.completed += 1
 
         if self.completed == self.total:
-            self.output_callback(self.dest, self.processStatus)
+            self.do_output_callback()
 
     def setTotal(self, total, steps):  # type: (int, List[Optional[Generator[Union[ExpressionTool.ExpressionJob, JobBase, CallbackJob, None], None, None]]]) -> None
         self.total = total
+        self.store.total = total
         self.steps = steps
         if self.completed == self.total:
-            self.output_callback(self.dest, self.processStatus)
+            self.do_output_callback()
+
+    def do_output_callback(self):  # type: () -> None
+        """Hand the gathered outputs to the downstream callback.
+
+        Inner scatters of a nested crossproduct pass their still packed
+        store up to the enclosing one instead of building the lists.
+        """
+        if not self.materialize:
+            self.output_callback(self.store, self.processStatus)
+            return
+        output = self.store.materialize()
+        self.store.close()
+        self.output_callback(output, self.processStatus)
+
+
+def batch_scatter_jobs(jobs,           # type: Iterable[Union[ExpressionTool.ExpressionJob, JobBase, CallbackJob, None]]
+                       batch_size,     # type: int
+                       runtimeContext  # type: RuntimeContext
+                      ):  # type: (...) -> Generator[Union[ExpressionTool.ExpressionJob, JobBase, JobBatch, CallbackJob, None], None, None]
+    """Group the jobs of a scatter into batches of up to batch_size.
+
+    A partial batch is released as soon as the scatter cannot make any more
+    progress, so batching never holds back a job that is ready to run.
+    Each member keeps its own output callback, which demultiplexes the
+    outputs back into ReceiveScatterOutput by index.
+    """
+    assert runtimeContext.make_job_batch is not None  # nosec
+    pending = []  # type: List[JobBase]
+
+    def flush():  # type: () -> Union[JobBase, JobBatch]
+        if len(pending) == 1:
+            batch = pending[0]  # type: Union[JobBase, JobBatch]
+        else:
+            batch = runtimeContext.make_job_batch(list(pending))
+        del pending[:]
+        return batch
+
+    for j in jobs:
+        if isinstance(j, JobBase):
+            pending.append(j)
+            if len(pending) >= batch_size:
+                yield flush()
+            continue
+        if pending:
+            yield flush()
+        yield j
+    if pending:
+        yield flush()
+
+
+def make_scatter_store(process,        # type: WorkflowJobStep
+                       total,          # type: int
+                       runtimeContext  # type: RuntimeContext
+                      ):  # type: (...) -> ScatterOutputStore
+    return ScatterOutputStore(
+        [i["id"] for i in process.tool["outputs"]], total,
+        spill_threshold=runtimeContext.scatter_spill_threshold,
+        tmpdir_prefix=runtimeContext.tmpdir_prefix)
 
 
 def parallel_steps(steps, rc, runtimeContext):
@@ -904,11 +1067,9 @@ def dotproduct_scatter(process,           # type: WorkflowJobStep
     if jobl is None:
         raise Exception("Impossible codepath")
 
-    output = {}  # type: Dict[Text,List[Optional[Text]]]
-    for i in process.tool["outputs"]:
-        output[i["id"]] = [None] * jobl
-
-    rc = ReceiveScatterOutput(output_callback, output, jobl)
+    rc = ReceiveScatterOutput(
+        output_callback, make_scatter_store(process, jobl, runtimeContext),
+        jobl)
 
     steps = []  # type: List[Optional[Generator[Union[ExpressionTool.ExpressionJob, JobBase, CallbackJob, None], None, None]]]
     for index in range(0, jobl):
@@ -931,15 +1092,14 @@ def nested_crossproduct_scatter(process,          # type: WorkflowJobStep
                                 joborder,         # type: MutableMapping[Text, Any]
                                 scatter_keys,     # type: MutableSequence[Text]
                                 output_callback,  # type: Callable[..., Any]
-                                runtimeContext    # type: RuntimeContext
+                                runtimeContext,   # type: RuntimeContext
+                                materialize=True  # type: bool
                                ):  # type: (...) -> Generator[Union[ExpressionTool.ExpressionJob, JobBase, CallbackJob, None], None, None]
     scatter_key = scatter_keys[0]
     jobl = len(joborder[scatter_key])
-    output = {}  # type: Dict[Text, List[Optional[Text]]]
-    for i in process.tool["outputs"]:
-        output[i["id"]] = [None] * jobl
-
-    rc = ReceiveScatterOutput(output_callback, output, jobl)
+    rc = ReceiveScatterOutput(
+        output_callback, make_scatter_store(process, jobl, runtimeContext),
+        jobl, materialize=materialize)
 
     steps = []  # type: List[Optional[Generator[Union[ExpressionTool.ExpressionJob, JobBase, CallbackJob, None], None, None]]]
     for index in range(0, jobl):
@@ -956,7 +1116,7 @@ def nested_crossproduct_scatter(process,          # type: WorkflowJobStep
             steps.append(nested_crossproduct_scatter(
                 process, sjob, scatter_keys[1:],
                 functools.partial(rc.receive_scatter_output, index),
-                runtimeContext))
+                runtimeContext, materialize=False))
 
     rc.setTotal(jobl, steps)
     return parallel_steps(steps, rc, runtimeContext)
@@ -979,10 +1139,9 @@ def flat_crossproduct_scatter(process,          # type: WorkflowJobStep
                               output_callback,  # type: Callable[..., Any]
                               runtimeContext    # type: RuntimeContext
                              ):  # type: (...) -> Generator[Union[ExpressionTool.ExpressionJob, JobBase, CallbackJob, None], None, None]
-    output = {}  # type: Dict[Text, List[Optional[Text]]]
-    for i in process.tool["outputs"]:
-        output[i["id"]] = [None] * crossproduct_size(joborder, scatter_keys)
-    callback = ReceiveScatterOutput(output_callback, output, 0)
+    store = make_scatter_store(
+        process, crossproduct_size(joborder, scatter_keys), runtimeContext)
+    callback = ReceiveScatterOutput(output_callback, store, 0)
     (steps, total) = _flat_crossproduct_scatter(
         process, joborder, scatter_keys, callback, 0, runtimeContext)
     callback.setTotal(total, steps)
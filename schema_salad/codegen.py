@@ -139,3 +139,5 @@ def codegen(
     root_type.append({"type": "array", "items": document_roots})
 
     gen.epilogue(gen.type_loader(root_type))
+    if lang == "python" and target:
+        dest.close()
@@ -227,8 +227,9 @@ class PythonCodeGen(CodeGenBase):
         )
 
         self.out.write(
-            u"""        loadingOptions = copy.deepcopy(loadingOptions)
-        loadingOptions.original_doc = _doc
+            u"""        loadingOptions = LoadingOptions(
+            copyfrom=loadingOptions, original_doc=_doc
+        )
 """
         )
         self.out.write(u"        return cls(" + ", ".join(safe_inits) + ")\n")
@@ -95,7 +95,11 @@ class LoadingOptions(object):
         self.vocab = _vocab
         self.rvocab = _rvocab
 
-        if namespaces is not None:
+        if copyfrom is not None and namespaces is None:
+            # one set of options is made per record loaded, so share these
+            self.vocab = copyfrom.vocab
+            self.rvocab = copyfrom.rvocab
+        elif namespaces is not None:
             self.vocab = self.vocab.copy()
             self.rvocab = self.rvocab.copy()
             for k, v in iteritems(namespaces):
@@ -5,6 +5,7 @@ import logging
 import os
 import re
 import sys
+import threading
 import xml.sax
 from io import open
 from typing import Callable  # pylint: disable=unused-import
@@ -38,7 +39,7 @@ from ruamel import yaml
 from ruamel.yaml.comments import CommentedMap, CommentedSeq, LineCol
 
 from .exceptions import ValidationException, SchemaSaladException
-from .sourceline import SourceLine, add_lc_filename, relname
+from .sourceline import SourceLine, add_lc_filename, json_load, relname
 from .utils import aslist, onWindows
 
 # move to a regular typing import when Python 3.3-3.6 is no longer supported
@@ -50,6 +51,10 @@ DocumentType = TypeVar("DocumentType", CommentedSeq, CommentedMap)
 DocumentOrStrType = TypeVar("DocumentOrStrType", CommentedSeq, CommentedMap, Text)
 
 _re_drive = re.compile(r"/([a-zA-Z]):")
+_re_json_start = re.compile(r"\s*[\[{]")
+
+# Number of documents Loader.prefetch fetches at the same time.
+PREFETCH_WORKERS = 8
 
 
 def file_uri(path, split_frag=False):  # type: (str, bool) -> str
@@ -404,6 +409,10 @@ class Loader(object):
         self.fetcher = self.fetcher_constructor(self.cache, self.session)
         self.fetch_text = self.fetcher.fetch_text
         self.check_exists = self.fetcher.check_exists
+        # documents parsed by prefetch(), waiting for fetch()
+        self.prefetched = {}  # type: Dict[Text, Tuple[Any, Any]]
+        # the documents each document scanned by prefetch() references
+        self.references = {}  # type: Dict[Text, Set[Text]]
 
         if url_fields is None:
             self.url_fields = set()  # type: Set[Text]
@@ -1195,7 +1204,7 @@ class Loader(object):
                 )
 
         if checklinks:
-            all_doc_ids = {}  # type: Dict[Text, Text]
+            all_doc_ids = {}  # type: Dict[Text, SourceLine]
             loader.validate_links(
                 document,
                 u"",
@@ -1205,18 +1214,29 @@ class Loader(object):
 
         return document, metadata
 
+    def _parse(self, url, text):  # type: (Text, Text) -> Tuple[Any, Any]
+        """Parse a document, returning it and an iterator over its attachments."""
+        if isinstance(text, bytes):
+            text = text.decode("utf-8")
+        if _re_json_start.match(text):
+            # job orders and packed documents are usually JSON
+            try:
+                return json_load(text), iter(())
+            except ValueError:
+                pass
+        textIO = StringIO(text)
+        textIO.name = str(url)
+        attachments = yaml.round_trip_load_all(textIO, preserve_quotes=True)
+        return next(attachments), attachments
+
     def fetch(self, url, inject_ids=True):  # type: (Text, bool) -> Any
         if url in self.idx:
             return self.idx[url]
         try:
-            text = self.fetch_text(url)
-            if isinstance(text, bytes):
-                textIO = StringIO(text.decode("utf-8"))
+            if url in self.prefetched:
+                result, attachments = self.prefetched.pop(url)
             else:
-                textIO = StringIO(text)
-            textIO.name = str(url)
-            attachments = yaml.round_trip_load_all(textIO, preserve_quotes=True)
-            result = next(attachments)
+                result, attachments = self._parse(url, self.fetch_text(url))
 
             if self.allow_attachments is not None and self.allow_attachments(result):
                 i = 1
@@ -1236,6 +1256,87 @@ class Loader(object):
         self.idx[url] = result
         return result
 
+    def prefetch(self, document, base_url, fields, workers=PREFETCH_WORKERS):
+        # type: (Any, Text, Iterable[Text], int) -> None
+        """Fetch and parse the documents that ``document`` references.
+
+        Follows the string values of ``fields`` (e.g. ``$import``) in
+        ``document`` and, recursively, in the documents they reference,
+        fetching up to ``workers`` documents at the same time.  The parsed
+        documents are kept for fetch(), so resolving ``document`` afterwards
+        does not wait on each of them in turn.  Documents that cannot be
+        fetched or parsed are left for fetch() to report.
+
+        The documents referenced this way, or with ``$include`` and
+        ``$schemas``, are recorded in ``references``.
+        """
+        fields = set(fields)
+        pending = []  # type: List[Text]
+        seen = set()  # type: Set[Text]
+        condition = threading.Condition()
+        busy = [0]
+
+        def scan(node, base, references):
+            # type: (Any, Text, Set[Text]) -> None
+            if isinstance(node, MutableMapping):
+                for key, value in iteritems(node):
+                    if key in fields or key in ("$include", "$schemas"):
+                        for ref in aslist(value):
+                            if not isinstance(ref, string_types) or ref.startswith(
+                                ("#", "_:")
+                            ):
+                                continue
+                            url = urllib.parse.urldefrag(
+                                self.fetcher.urljoin(base, ref)
+                            )[0]
+                            references.add(url)
+                            if (
+                                key in fields
+                                and url not in seen
+                                and url not in self.idx
+                                and url not in self.prefetched
+                            ):
+                                seen.add(url)
+                                pending.append(url)
+                    scan(value, base, references)
+            elif isinstance(node, MutableSequence):
+                for value in node:
+                    scan(value, base, references)
+
+        def work():  # type: () -> None
+            while True:
+                with condition:
+                    while not pending and busy[0]:
+                        condition.wait()
+                    if not pending:
+                        condition.notify_all()
+                        return
+                    url = pending.pop(0)
+                    busy[0] += 1
+                try:
+                    parsed = self._parse(url, self.fetch_text(url))  # type: Any
+                except Exception:  # pylint: disable=broad-except
+                    parsed = None
+                with condition:
+                    busy[0] -= 1
+                    if parsed is not None:
+                        self.prefetched[url] = parsed
+                        self.references[url] = set()
+                        scan(parsed[0], url, self.references[url])
+                    condition.notify_all()
+
+        scan(document, base_url, self.references.setdefault(base_url, set()))
+        if not pending:
+            return
+        # referenced documents may reference more, so start every worker
+        threads = [threading.Thread(target=work) for _ in range(workers - 1)]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        work()
+        for thread in threads:
+            thread.join()
+
     FieldType = TypeVar("FieldType", Text, CommentedSeq, CommentedMap)
 
     def validate_scoped(self, field, link, docid):
@@ -1268,7 +1369,7 @@ class Loader(object):
         )
 
     def validate_link(self, field, link, docid, all_doc_ids):
-        # type: (Text, Loader.FieldType, Text, Dict[Text, Text]) -> Loader.FieldType
+        # type: (Text, Loader.FieldType, Text, Dict[Text, SourceLine]) -> Loader.FieldType
         if field in self.nolinkcheck:
             return link
         if isinstance(link, string_types):
@@ -1327,7 +1428,7 @@ class Loader(object):
         self,
         document,  # type: Union[CommentedMap, CommentedSeq, Text, None]
         base_url,  # type: Text
-        all_doc_ids,  # type: Dict[Text, Text]
+        all_doc_ids,  # type: Dict[Text, SourceLine]
         strict_foreign_properties=False,  # type: bool
     ):  # type: (...) -> None
         docid = self.getid(document)
@@ -1365,18 +1466,22 @@ class Loader(object):
                 ) in self.identifiers:  # validate that each id is defined uniquely
                     if identifier in document:
                         sl = SourceLine(document, identifier, Text)
+                        # the leads are only made for objects seen twice,
+                        # so that lazily located positions stay unlocated
+                        previous = all_doc_ids.get(document[identifier])
                         if (
-                            document[identifier] in all_doc_ids
-                            and sl.makeLead() != all_doc_ids[document[identifier]]
+                            previous is not None
+                            and previous.item is not document
+                            and sl.makeLead() != previous.makeLead()
                         ):
                             _logger.warning(
                                 "%s object %s `%s` previously defined",
-                                all_doc_ids[document[identifier]],
+                                previous.makeLead(),
                                 identifier,
                                 relname(document[identifier]),
                             )
                         else:
-                            all_doc_ids[document[identifier]] = sl.makeLead()
+                            all_doc_ids.setdefault(document[identifier], sl)
                             break
             except ValidationException as v:
                 errors.append(v.with_sourceline(sl))
@@ -20,7 +20,6 @@ from typing import (
 )
 
 from future.utils import raise_from
-from pkg_resources import resource_stream
 from six import iteritems, string_types
 from six.moves import urllib
 from typing_extensions import Text  # pylint: disable=unused-import
@@ -43,7 +42,7 @@ from .exceptions import (
 )
 from .avro.schema import Names, SchemaParseException, make_avsc_object
 from .ref_resolver import Loader
-from .sourceline import SourceLine, add_lc_filename, relname
+from .sourceline import SourceLine, add_lc_filename, relname, start_position
 
 SALAD_FILES = (
     "metaschema.yml",
@@ -176,6 +175,8 @@ def get_metaschema():  # type: () -> Tuple[Names, List[Dict[Text, Any]], Loader]
         }
     )
 
+    from pkg_resources import resource_stream
+
     for salad in SALAD_FILES:
         with resource_stream(__name__, "metaschema/" + salad) as stream:
             loader.cache["https://w3id.org/cwl/" + salad] = stream.read()
@@ -322,7 +323,7 @@ def validate_doc(
         vdoc = doc
     elif isinstance(doc, CommentedMap):
         vdoc = CommentedSeq([doc])
-        vdoc.lc.add_kv_line_col(0, [doc.lc.line, doc.lc.col])
+        vdoc.lc.add_kv_line_col(0, start_position(doc))
         vdoc.lc.filename = doc.lc.filename
     else:
         raise ValidationException("Document must be dict or list")
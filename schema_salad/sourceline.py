@@ -1,6 +1,7 @@
 from __future__ import absolute_import
 
 import itertools
+import json
 import os
 import re
 import traceback
@@ -23,7 +24,7 @@ from future.utils import raise_from
 from typing_extensions import Text  # pylint: disable=unused-import
 
 import ruamel.yaml
-from ruamel.yaml.comments import CommentedBase, CommentedMap, CommentedSeq
+from ruamel.yaml.comments import CommentedBase, CommentedMap, CommentedSeq, LineCol
 
 # move to a regular typing import when Python 3.3-3.6 is no longer supported
 
@@ -287,6 +288,196 @@ def cmap(
         return d
 
 
+class _JSONPositions(object):
+    """Where the nodes of a JSON document are, found by parsing it again.
+
+    JSON documents are loaded with the json module, which does not track
+    positions; the text is only parsed with the round-trip loader when a
+    line or column is first asked for, usually to report an error.
+    """
+
+    def __init__(self, text):  # type: (Text) -> None
+        self.text = text  # type: Optional[Text]
+        self.root = None  # type: Any
+
+    def __deepcopy__(self, memo):  # type: (Any) -> _JSONPositions
+        # shared by every copy of the document, never modified
+        return self
+
+    def position(self, path, key):
+        # type: (Tuple[Any, ...], Any) -> List[Any]
+        """The position of ``key`` in the node at ``path``, or of the node."""
+        if self.root is None:
+            try:
+                self.root = ruamel.yaml.round_trip_load(self.text, preserve_quotes=True)
+            except Exception:  # pylint: disable=broad-except
+                self.root = CommentedMap()
+            self.text = None
+        node = self.root
+        try:
+            for step in path:
+                node = node[step]
+            if key is None:
+                return [node.lc.line, node.lc.col, node.lc.line, node.lc.col]
+            return list(node.lc.data[key])
+        except (AttributeError, IndexError, KeyError, TypeError):
+            return [None, None, None, None]
+
+
+class _LazyPosition(object):
+    """A ``[line, col, value line, value col]`` entry, found on first use."""
+
+    def __init__(self, positions, path, key=None):
+        # type: (_JSONPositions, Tuple[Any, ...], Any) -> None
+        self.positions = positions  # type: Optional[_JSONPositions]
+        self.path = path
+        self.key = key
+        self.value = []  # type: List[Any]
+
+    def _locate(self):  # type: () -> List[Any]
+        if self.positions is not None:
+            self.value = self.positions.position(self.path, self.key)
+            self.positions = None
+        return self.value
+
+    def __getitem__(self, index):  # type: (Any) -> Any
+        return self._locate()[index]
+
+    def __iter__(self):  # type: () -> Any
+        return iter(self._locate())
+
+    def __len__(self):  # type: () -> int
+        return len(self._locate())
+
+    def __eq__(self, other):  # type: (Any) -> bool
+        return self._locate() == list(other)
+
+    def __ne__(self, other):  # type: (Any) -> bool
+        return not self == other
+
+    __hash__ = None  # type: ignore
+
+    def __repr__(self):  # type: () -> str
+        return repr(self._locate())
+
+    def __copy__(self):  # type: () -> _LazyPosition
+        return self
+
+    def __deepcopy__(self, memo):  # type: (Any) -> _LazyPosition
+        return self
+
+
+class LazyLineCol(LineCol):
+    """Line and column information that is only located when it is used."""
+
+    def __init__(self, start, data=None):
+        # type: (Any, Optional[Dict[Any, Any]]) -> None
+        self._start = start  # type: Any
+        self._line = None  # type: Any
+        self._col = None  # type: Any
+        self.data = data
+
+    def _locate(self):  # type: () -> None
+        if self._start is not None:
+            start, self._start = self._start, None
+            self._line, self._col = start[0], start[1]
+
+    def _get_line(self):  # type: () -> Any
+        self._locate()
+        return self._line
+
+    def _set_line(self, line):  # type: (Any) -> None
+        self._locate()
+        self._line = line
+
+    def _get_col(self):  # type: () -> Any
+        self._locate()
+        return self._col
+
+    def _set_col(self, col):  # type: (Any) -> None
+        self._locate()
+        self._col = col
+
+    line = property(_get_line, _set_line)
+    col = property(_get_col, _set_col)
+
+
+def set_start(item, position):  # type: (CommentedBase, Any) -> None
+    """Make ``position``, an entry of some ``lc.data``, where ``item`` starts.
+
+    Unlike assigning ``item.lc.line`` and ``item.lc.col``, this does not
+    locate a position that :func:`json_load` has not located yet.
+    """
+    if isinstance(position, _LazyPosition):
+        lc = LazyLineCol(position, item.lc.data)
+        if hasattr(item.lc, "filename"):
+            lc.filename = item.lc.filename
+        setattr(item, LineCol.attrib, lc)
+    else:
+        item.lc.line = position[0]
+        item.lc.col = position[1]
+
+
+def start_position(item):  # type: (CommentedBase) -> Any
+    """Where ``item`` starts, as an entry for some ``lc.data``.
+
+    The counterpart of :func:`set_start`, which also leaves a position
+    that has not been located yet alone.
+    """
+    lc = item.lc
+    if isinstance(lc, LazyLineCol) and lc._start is not None:
+        return lc._start
+    return [lc.line, lc.col]
+
+
+def _json_map(pairs):  # type: (List[Tuple[Text, Any]]) -> CommentedMap
+    cm = CommentedMap(pairs)
+    if len(cm) != len(pairs):
+        # let the round-trip loader report it, with its position
+        raise ValueError("duplicate key")
+    return cm
+
+
+def _add_lazy_lc(value, positions, path):
+    # type: (Any, _JSONPositions, Tuple[Any, ...]) -> Any
+    if isinstance(value, CommentedMap):
+        for key, item in list(six.iteritems(value)):
+            if isinstance(item, (CommentedMap, list)):
+                converted = _add_lazy_lc(item, positions, path + (key,))
+                if converted is not item:
+                    value[key] = converted
+        keys = list(value)  # type: List[Any]
+    elif isinstance(value, list):
+        value = CommentedSeq(
+            _add_lazy_lc(item, positions, path + (index,))
+            for index, item in enumerate(value)
+        )
+        keys = list(range(len(value)))
+    else:
+        return value
+    setattr(
+        value,
+        LineCol.attrib,
+        LazyLineCol(
+            _LazyPosition(positions, path),
+            dict((key, _LazyPosition(positions, path, key)) for key in keys),
+        ),
+    )
+    return value
+
+
+def json_load(text):  # type: (Text) -> Any
+    """Load a JSON document much faster than the round-trip loader does.
+
+    Returns the same CommentedMap and CommentedSeq structure; their line
+    and column information is only located when it is used.  Raises
+    ValueError if ``text`` is not JSON.
+    """
+    return _add_lazy_lc(
+        json.loads(text, object_pairs_hook=_json_map), _JSONPositions(text), ()
+    )
+
+
 class SourceLine(object):
     def __init__(
         self,
@@ -2,13 +2,18 @@ from __future__ import absolute_import
 
 import logging
 import pprint
+import weakref
 from typing import (  # noqa: F401
     Any,
+    Callable,
+    Dict,
+    FrozenSet,
     List,
     MutableMapping,
     MutableSequence,
     Optional,
     Set,
+    Tuple,
     Union,
 )
 
@@ -30,6 +35,11 @@ from .sourceline import SourceLine
 
 # move to a regular typing import when Python 3.3-3.6 is no longer supported
 
+if six.PY3:
+    from collections import abc as collections_abc
+else:
+    import collections as collections_abc
+
 
 _logger = logging.getLogger("salad")
 
@@ -82,6 +92,185 @@ def vpformat(datum):  # type: (Any) -> str
     return a
 
 
+# Compiled validators, per schema and per set of validation options.
+_compiled_validators = (
+    weakref.WeakKeyDictionary()
+)  # type: weakref.WeakKeyDictionary[Schema, Dict[Tuple[Any, ...], Callable[[Any], Optional[bool]]]]
+
+
+def _class_name(expected_schema):  # type: (Schema) -> Optional[Text]
+    """The ``class`` a record schema requires its data to have, if any."""
+    if isinstance(expected_schema, avro.schema.RecordSchema):
+        for f in expected_schema.fields:
+            if f.name in ("class",):
+                return expected_schema.name
+    return None
+
+
+def _compile(
+    expected_schema,  # type: Schema
+    options,  # type: Tuple[FrozenSet[Text], bool, FrozenSet[Text], bool, bool]
+    compiled,  # type: Dict[Tuple[int, Tuple[Any, ...]], Callable[[Any], Optional[bool]]]
+):  # type: (...) -> Callable[[Any], Optional[bool]]
+    """Specialize the checks validate_ex makes for ``expected_schema``.
+
+    The returned function returns True if _validate_ex() would accept the
+    datum without logging anything, False if it would reject it without
+    logging anything (when not raising), and None when only _validate_ex()
+    can tell, e.g. when it would warn about an unknown field.
+    """
+    key = (id(expected_schema), options)
+    if key in compiled:
+        return compiled[key]
+
+    schema_type = expected_schema.type
+    if schema_type == "null":
+        return lambda datum: datum is None
+    if schema_type == "boolean":
+        return lambda datum: isinstance(datum, bool)
+    if schema_type == "string":
+        return lambda datum: isinstance(datum, (six.string_types, bytes))
+    if schema_type == "int":
+        return lambda datum: (
+            isinstance(datum, six.integer_types)
+            and INT_MIN_VALUE <= datum <= INT_MAX_VALUE
+        )
+    if schema_type == "long":
+        return lambda datum: (
+            isinstance(datum, six.integer_types)
+            and LONG_MIN_VALUE <= datum <= LONG_MAX_VALUE
+        )
+    if schema_type in ("float", "double"):
+        return lambda datum: isinstance(datum, six.integer_types + (float,))
+
+    if isinstance(expected_schema, avro.schema.EnumSchema):
+        if expected_schema.name == "Any":
+            return lambda datum: datum is not None
+        if expected_schema.name == "Expression":
+            return lambda datum: isinstance(datum, six.string_types) and (
+                "$(" in datum or "${" in datum
+            )
+        symbols = frozenset(expected_schema.symbols)
+        return lambda datum: isinstance(datum, six.string_types) and datum in symbols
+
+    # named schemas can refer to themselves: compile those references to a
+    # forward reference that is filled in once the schema is compiled
+    forward = []  # type: List[Callable[[Any], Optional[bool]]]
+    compiled[key] = lambda datum: forward[0](datum)
+
+    if isinstance(expected_schema, avro.schema.ArraySchema):
+        items = _compile(expected_schema.items, options, compiled)
+
+        def validator(datum):  # type: (Any) -> Optional[bool]
+            if not isinstance(datum, collections_abc.MutableSequence):
+                return False
+            for item in datum:
+                result = items(item)
+                if result is not True:
+                    return result
+            return True
+
+    elif isinstance(expected_schema, avro.schema.UnionSchema):
+        # _validate_ex tries the alternatives without the foreign properties
+        identifiers, strict, _, strict_foreign, skip_foreign = options
+        alternatives = [
+            (
+                _class_name(alternative),
+                _compile(
+                    alternative,
+                    (identifiers, strict, frozenset(), strict_foreign, skip_foreign),
+                    compiled,
+                ),
+            )
+            for alternative in expected_schema.schemas
+        ]
+
+        def validator(datum):  # type: (Any) -> Optional[bool]
+            d = None
+            if isinstance(datum, collections_abc.MutableMapping):
+                d = datum.get("class")
+            for class_name, alternative in alternatives:
+                if class_name is not None and d != class_name:
+                    # a record of another class, which would just say no
+                    continue
+                result = alternative(datum)
+                if result is not False:
+                    return result
+            return False
+
+    elif isinstance(expected_schema, avro.schema.RecordSchema):
+        identifiers, strict, foreign_properties, strict_foreign, skip_foreign = options
+        class_name = _class_name(expected_schema)
+        fields = [
+            (f.name, f.default, _compile(f.type, options, compiled))
+            for f in expected_schema.fields
+            if f.name not in ("class",)
+        ]
+        field_names = frozenset(f.name for f in expected_schema.fields)
+        # names of unknown fields that _validate_ex accepts without a word
+        silent = identifiers | foreign_properties
+
+        def validator(datum):  # type: (Any) -> Optional[bool]
+            if not isinstance(datum, collections_abc.MutableMapping):
+                return False
+            if class_name is not None:
+                d = datum.get("class")
+                if not d or d != class_name:
+                    return False
+            for name, default, check in fields:
+                result = check(datum[name] if name in datum else default)
+                if result is not True:
+                    return result
+            for d in datum:
+                if d in field_names or d in silent:
+                    continue
+                if not isinstance(d, six.string_types) or not d:
+                    return None
+                if d[0] in ("@", "$"):
+                    continue
+                if urllib.parse.urlsplit(d).scheme and (
+                    skip_foreign
+                    or (not strict_foreign and not foreign_properties)
+                ):
+                    continue
+                return None
+            return True
+
+    else:
+
+        def validator(datum):  # type: (Any) -> Optional[bool]
+            return None
+
+    forward.append(validator)
+    compiled[key] = validator
+    return validator
+
+
+def compiled_validator(
+    expected_schema,  # type: Schema
+    identifiers,  # type: List[Text]
+    strict,  # type: bool
+    foreign_properties,  # type: Set[Text]
+    strict_foreign_properties,  # type: bool
+    skip_foreign_properties,  # type: bool
+):  # type: (...) -> Callable[[Any], Optional[bool]]
+    """The validator compiled for ``expected_schema`` with these options."""
+    options = (
+        frozenset(identifiers),
+        strict,
+        frozenset(foreign_properties),
+        strict_foreign_properties,
+        skip_foreign_properties,
+    )
+    try:
+        validators = _compiled_validators[expected_schema]
+    except KeyError:
+        validators = _compiled_validators.setdefault(expected_schema, {})
+    if options not in validators:
+        validators[options] = _compile(expected_schema, options, {})
+    return validators[options]
+
+
 def validate_ex(
     expected_schema,  # type: Schema
     datum,  # type: Any
@@ -92,6 +281,52 @@ def validate_ex(
     strict_foreign_properties=False,  # type: bool
     logger=_logger,  # type: logging.Logger
     skip_foreign_properties=False,  # type: bool
+):
+    # type: (...) -> bool
+    """Determine if a python datum is an instance of a schema.
+
+    Valid data is checked by a validator compiled once per schema; the
+    error messages and warnings for the rest come from walking the schema.
+    """
+    if not identifiers:
+        identifiers = []
+
+    if not foreign_properties:
+        foreign_properties = set()
+
+    result = compiled_validator(
+        expected_schema,
+        identifiers,
+        strict,
+        foreign_properties,
+        strict_foreign_properties,
+        skip_foreign_properties,
+    )(datum)
+    if result is True or (result is False and not raise_ex):
+        return result
+    return _validate_ex(
+        expected_schema,
+        datum,
+        identifiers,
+        strict=strict,
+        foreign_properties=foreign_properties,
+        raise_ex=raise_ex,
+        strict_foreign_properties=strict_foreign_properties,
+        logger=logger,
+        skip_foreign_properties=skip_foreign_properties,
+    )
+
+
+def _validate_ex(
+    expected_schema,  # type: Schema
+    datum,  # type: Any
+    identifiers=None,  # type: Optional[List[Text]]
+    strict=False,  # type: bool
+    foreign_properties=None,  # type: Optional[Set[Text]]
+    raise_ex=True,  # type: bool
+    strict_foreign_properties=False,  # type: bool
+    logger=_logger,  # type: logging.Logger
+    skip_foreign_properties=False,  # type: bool
 ):
     # type: (...) -> bool
     """Determine if a python datum is an instance of a schema."""
@@ -211,7 +446,7 @@ def validate_ex(
             for i, d in enumerate(datum):
                 try:
                     sl = SourceLine(datum, i, ValidationException)
-                    if not validate_ex(
+                    if not _validate_ex(
                         expected_schema.items,
                         d,
                         identifiers,
@@ -240,7 +475,7 @@ def validate_ex(
                 return False
     elif isinstance(expected_schema, avro.schema.UnionSchema):
         for s in expected_schema.schemas:
-            if validate_ex(
+            if _validate_ex(
                 s,
                 datum,
                 identifiers,
@@ -275,7 +510,7 @@ def validate_ex(
 
             checked.append(s)
             try:
-                validate_ex(
+                _validate_ex(
                     s,
                     datum,
                     identifiers,
@@ -352,7 +587,7 @@ def validate_ex(
 
             try:
                 sl = SourceLine(datum, f.name, six.text_type)
-                if not validate_ex(
+                if not _validate_ex(
                     f.type,
                     fieldval,
                     identifiers,